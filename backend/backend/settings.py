@@ -48,6 +48,8 @@ INSTALLED_APPS = [
     'corsheaders',
     'rangefilter',
     'smart_selects',
+    'document_sequence',
+    'reference_data',
     'category',
     'subcategory',
     'unit_of_measure',
@@ -180,4 +182,6 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'uploads')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-X_FRAME_OPTIONS = 'SAMEORIGIN'
\ No newline at end of file
+X_FRAME_OPTIONS = 'SAMEORIGIN'
+# Margen sobre el costo FIFO para productos sin precio activo en el historial de precios
+SALE_FIFO_MARKUP = os.getenv('SALE_FIFO_MARKUP', '1.20')
@@ -7,8 +7,9 @@ from django.utils.html import format_html
 from django.urls import reverse
 from .models import BuyOrder
 from buy_order_detail.models import BuyOrderDetail
+from reference_data.forms import ReferenceChoicesMixin
 
-class BuyOrderDetailInline(admin.TabularInline):
+class BuyOrderDetailInline(ReferenceChoicesMixin, admin.TabularInline):
     model = BuyOrderDetail
     fields = ('product', 'unit', 'quantity', 'price', 'is_received')
     readonly_fields = ('product', 'unit', 'quantity', 'price')
@@ -0,0 +1,21 @@
+from django.contrib import admin
+from .models import DocumentSequence
+
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ('prefix', 'period', 'last_value', 'updated_at')
+    list_filter = ('prefix',)
+    search_fields = ('prefix', 'period')
+
+    # Los correlativos solo se mueven al emitir documentos
+    def get_readonly_fields(self, request, obj=None):
+        return [f.name for f in self.model._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
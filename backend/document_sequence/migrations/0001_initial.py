@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(help_text='Ej: SLE, TRF, COT.', max_length=50, verbose_name='prefijo')),
+                ('period', models.CharField(blank=True, default='', help_text='Día del correlativo (AAAAMMDD). Vacío si el correlativo no se reinicia.', max_length=8, verbose_name='periodo')),
+                ('last_value', models.PositiveBigIntegerField(default=0, verbose_name='último número asignado')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='última asignación')),
+            ],
+            options={
+                'verbose_name': 'Correlativo de Documento',
+                'verbose_name_plural': 'Correlativos de Documentos',
+                'db_table': 'document_sequence',
+                'ordering': ['prefix', '-period'],
+                'unique_together': {('prefix', 'period')},
+            },
+        ),
+    ]
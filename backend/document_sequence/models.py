@@ -0,0 +1,31 @@
+from django.db import models
+
+class DocumentSequence(models.Model):
+    prefix = models.CharField(
+        max_length=50,
+        verbose_name="prefijo",
+        help_text="Ej: SLE, TRF, COT."
+    )
+    period = models.CharField(
+        max_length=8,
+        blank=True,
+        default='',
+        verbose_name="periodo",
+        help_text="Día del correlativo (AAAAMMDD). Vacío si el correlativo no se reinicia."
+    )
+    last_value = models.PositiveBigIntegerField(default=0, verbose_name="último número asignado")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="última asignación")
+
+    def __str__(self):
+        return f"{self.stem}{self.last_value}"
+
+    @property
+    def stem(self):
+        return '-'.join(part for part in (self.prefix, self.period) if part) + '-'
+
+    class Meta:
+        db_table = 'document_sequence'
+        verbose_name = 'Correlativo de Documento'
+        verbose_name_plural = 'Correlativos de Documentos'
+        ordering = ['prefix', '-period']
+        unique_together = ('prefix', 'period')
@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models import F
+from .models import DocumentSequence
+
+
+def _period(date):
+    return date.strftime('%Y%m%d') if date else ''
+
+
+def _seed(model, stem):
+    """Último número ya usado por códigos existentes con el mismo prefijo (documentos anteriores al correlativo)."""
+    if model is None:
+        return 0
+    numbers = [
+        int(code[len(stem):])
+        for code in model.objects.filter(code__startswith=stem).values_list('code', flat=True)
+        if code[len(stem):].isdigit()
+    ]
+    return max(numbers, default=0)
+
+
+def reserve_numbers(prefix, date=None, count=1, model=None):
+    """
+    Reserva `count` números consecutivos del correlativo (prefijo, día) y devuelve el primero.
+
+    Debe llamarse dentro de la misma transacción que inserta los documentos: si esta se revierte,
+    el correlativo también, y no quedan huecos.
+    """
+    period = _period(date)
+    sequences = DocumentSequence.objects.filter(prefix=prefix, period=period)
+
+    with transaction.atomic():
+        if not sequences.update(last_value=F('last_value') + count):
+            stem = DocumentSequence(prefix=prefix, period=period).stem
+            DocumentSequence.objects.get_or_create(prefix=prefix, period=period, defaults={'last_value': _seed(model, stem)})
+            sequences.update(last_value=F('last_value') + count)
+        last_value = sequences.values_list('last_value', flat=True).get()
+    return last_value - count + 1
+
+
+def reserve_codes(prefix, date=None, count=1, width=5, model=None):
+    """Reserva un bloque de códigos, p. ej. para importaciones con bulk_create."""
+    first = reserve_numbers(prefix, date, count, model)
+    stem = DocumentSequence(prefix=prefix, period=_period(date)).stem
+    return [f"{stem}{number:0{width}d}" for number in range(first, first + count)]
+
+
+def next_code(prefix, date=None, width=5, model=None):
+    """Código siguiente del correlativo. Ej: next_code('SLE', fecha) -> 'SLE-20251124-00001'."""
+    return reserve_codes(prefix, date, 1, width, model)[0]
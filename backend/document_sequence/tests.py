@@ -0,0 +1,42 @@
+from datetime import date
+from django.db import transaction
+from django.test import TestCase
+
+from proration.models import Proration
+from .models import DocumentSequence
+from .services import next_code, reserve_codes, reserve_numbers
+
+
+class DocumentSequenceTests(TestCase):
+
+    def test_codes_are_consecutive_per_day(self):
+        day = date(2025, 11, 24)
+        self.assertEqual(next_code('SLE', day), 'SLE-20251124-00001')
+        self.assertEqual(next_code('SLE', day), 'SLE-20251124-00002')
+        self.assertEqual(next_code('SLE', date(2025, 11, 25)), 'SLE-20251125-00001')
+        self.assertEqual(next_code('TRF', day), 'TRF-20251124-00001')
+
+    def test_sequence_without_period(self):
+        self.assertEqual(next_code('COT'), 'COT-00001')
+        self.assertEqual(DocumentSequence.objects.get(prefix='COT').period, '')
+
+    def test_reserve_numbers_returns_the_first_of_the_block(self):
+        day = date(2025, 11, 24)
+        self.assertEqual(reserve_numbers('SLE', day, count=5), 1)
+        self.assertEqual(reserve_numbers('SLE', day, count=3), 6)
+        self.assertEqual(next_code('SLE', day), 'SLE-20251124-00009')
+        self.assertEqual(reserve_codes('SLE', day, count=2, width=3), ['SLE-20251124-010', 'SLE-20251124-011'])
+
+    def test_seeds_from_existing_codes(self):
+        day = date(2025, 11, 24)
+        # Documentos creados antes del correlativo (bulk_create no pasa por save())
+        Proration.objects.bulk_create([Proration(code='PRO-20251124-00007'), Proration(code='PRO-20251124-00003')])
+        self.assertEqual(next_code('PRO', day, model=Proration), 'PRO-20251124-00008')
+
+    def test_rolled_back_numbers_are_reused(self):
+        day = date(2025, 11, 24)
+        next_code('SLE', day)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            next_code('SLE', day)
+            raise RuntimeError
+        self.assertEqual(next_code('SLE', day), 'SLE-20251124-00002')
@@ -1,12 +1,21 @@
 import uuid
 from django.contrib import admin
 from django.contrib import messages
+from django.core.exceptions import PermissionDenied
 from django.db import transaction
+from django.db.models import BooleanField, Value
 from django.http import HttpResponseRedirect
-from branch.models import Branch
-from inventory.models import Inventory
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.utils.http import urlencode
+from inventory.models import AverageCost, Inventory, InventoryArchive, InventoryStock
+from inventory.services import add_to_stock, lock_stock, record_movements, save_stock
 from kardex.models import Kardex
-from inventory_movement_type.models import InventoryMovementType
+from reference_data.caches import branches, movement_types
+
+HISTORY_FIELDS = ('id', 'product__name', 'branch__name', 'batch', 'original_quantity', 'quantity', 'cost', 'created_at', 'archived')
+HISTORY_LIMIT = 500
 
 @admin.register(Inventory)
 class InventoryAdmin(admin.ModelAdmin):
@@ -54,25 +63,28 @@ class InventoryAdmin(admin.ModelAdmin):
 
         try:
             with transaction.atomic():
+                stock = lock_stock([(obj.branch_id, obj.product_id)])
                 super().save_model(request, obj, form, change)
-                try:
-                    move_type = InventoryMovementType.objects.get(code='ADJ-POS')
-                except InventoryMovementType.DoesNotExist:
+                add_to_stock(stock[(obj.branch_id, obj.product_id)], obj, obj.quantity, reopened=obj.quantity > 0)
+                move_type = movement_types.first(code='ADJ-POS')
+                if move_type:
+                    record_movements(stock, [Kardex(
+                        transaction_id=obj.pk,
+                        document_number="AJUSTE MANUAL",
+                        movement_type=move_type,
+                        inventory_entry=obj,
+                        branch=obj.branch,
+                        product=obj.product,
+                        batch=obj.batch,
+                        quantity=obj.quantity,
+                        cost=obj.cost,
+                        created_by=request.user
+                    )])
+                save_stock(stock.values())
+
+                if not move_type:
                     messages.error(request, "No existe el tipo de movimiento 'ADJ-POS'. El Kardex no se generó.")
                     return
-
-                Kardex.objects.create(
-                    transaction_id=obj.pk,
-                    document_number="AJUSTE MANUAL",
-                    movement_type=move_type,
-                    inventory_entry=obj,
-                    branch=obj.branch,
-                    product=obj.product,
-                    batch=obj.batch,
-                    quantity=obj.quantity,
-                    cost=obj.cost,
-                    created_by=request.user
-                )
                 messages.success(request, f"Inventario agregado y registrado en Kardex como Ajuste Manual (Lote: {str(obj.batch)[:8]}).")
 
         except Exception as e:
@@ -80,10 +92,120 @@ class InventoryAdmin(admin.ModelAdmin):
             
     def changelist_view(self, request, extra_context=None):
         if 'branch__id__exact' not in request.GET:
-            default_branch = Branch.objects.order_by('id').first()
+            default_branch = min(branches.all(), key=lambda branch: branch.pk, default=None)
             if default_branch:
                 params = request.GET.copy()
                 params['branch__id__exact'] = default_branch.id
                 return HttpResponseRedirect(f"{request.path}?{params.urlencode()}")
 
-        return super().changelist_view(request, extra_context)
\ No newline at end of file
+        return super().changelist_view(request, extra_context)
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        # Los lotes agotados se mueven al archivo; en el listado se avisa si también hay coincidencias ahí.
+        # El autocompletado y el historial usan esta misma búsqueda y no deben dejar el aviso pendiente.
+        if search_term and request.path == reverse('admin:inventory_inventory_changelist'):
+            archived, _ = self.archive_admin.get_search_results(request, InventoryArchive.objects.all(), search_term)
+            if archived.exists():
+                url = f"{reverse('admin:inventory_inventory_history')}?{urlencode({'q': search_term})}"
+                messages.info(request, format_html(
+                    'Hay lotes archivados que coinciden con la búsqueda. <a href="{}">Ver historial del lote</a>.', url
+                ))
+        return queryset, may_have_duplicates
+
+    @property
+    def archive_admin(self):
+        return self.admin_site.get_model_admin(InventoryArchive)
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('history/', self.admin_site.admin_view(self.lot_history), name='inventory_inventory_history'),
+        ]
+        return custom_urls + urls
+
+    def lot_history(self, request):
+        """Lotes vivos y archivados que coinciden con la búsqueda, en una sola consulta UNION."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        search_term = request.GET.get('q', '').strip()
+        rows = []
+        if search_term:
+            live, _ = super().get_search_results(request, Inventory.objects.all(), search_term)
+            archived, _ = self.archive_admin.get_search_results(request, InventoryArchive.objects.all(), search_term)
+            live = live.annotate(archived=Value(False, output_field=BooleanField())).values(*HISTORY_FIELDS).order_by()
+            archived = archived.annotate(archived=Value(True, output_field=BooleanField())).values(*HISTORY_FIELDS).order_by()
+            rows = live.union(archived).order_by('-created_at', '-id')[:HISTORY_LIMIT]
+        context = {
+            **self.admin_site.each_context(request),
+            'title': "Historial de lotes",
+            'opts': self.model._meta,
+            'search_term': search_term,
+            'rows': rows,
+            'limit': HISTORY_LIMIT,
+        }
+        return TemplateResponse(request, 'admin/inventory/inventory/lot_history.html', context)
+
+@admin.register(InventoryArchive)
+class InventoryArchiveAdmin(admin.ModelAdmin):
+    list_display = ('product', 'branch', 'short_batch', 'original_quantity', 'cost', 'created_at', 'archived_at')
+    list_filter = ('branch', 'product__category', 'archived_at')
+    search_fields = ('product__name', 'product__code', 'batch', 'entry_number')
+    list_select_related = ('product', 'branch')
+
+    def short_batch(self, obj):
+        return str(obj.batch)[:8] + "..."
+    short_batch.short_description = "Lote"
+
+    # Lotes agotados movidos por archive_inventory, solo lectura
+    def get_readonly_fields(self, request, obj=None):
+        return [f.name for f in self.model._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(InventoryStock)
+class InventoryStockAdmin(admin.ModelAdmin):
+    list_display = ('product', 'branch', 'on_hand', 'lot_count', 'oldest_lot', 'updated_at')
+    list_filter = ('branch', 'product__category')
+    search_fields = ('product__name', 'product__code')
+    list_select_related = ('product', 'branch', 'oldest_lot__product')
+
+    # Se mantiene desde los movimientos de inventario, solo lectura
+    def get_readonly_fields(self, request, obj=None):
+        return [f.name for f in self.model._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(AverageCost)
+class AverageCostAdmin(admin.ModelAdmin):
+    list_display = ('product', 'branch', 'quantity', 'unit_cost', 'value', 'updated_at')
+    list_filter = ('branch', 'product__category')
+    search_fields = ('product__name', 'product__code')
+    list_select_related = ('product', 'branch')
+
+    # Se mantiene desde el Kardex (o con rebuild_average_cost), solo lectura
+    def get_readonly_fields(self, request, obj=None):
+        return [f.name for f in self.model._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.http import quote_etag
+
+BRANCH_VERSION_KEY = 'inventory:branch:{}'
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+
+def get_versions(*keys):
+    """
+    Versión actual de cada clave, en una sola consulta; las que nunca cambiaron valen 0.
+    Las versiones viven en la base (tabla cache_version) porque la caché por defecto es de cada proceso.
+    """
+    from inventory.models import CacheVersion
+
+    found = dict(CacheVersion.objects.filter(key__in=keys).values_list('key', 'version'))
+    return tuple(found.get(key, 0) for key in keys)
+
+
+def bump_versions(keys):
+    """Incrementa las versiones una vez confirmada la transacción en curso, para todos los procesos."""
+    from inventory.models import CacheVersion
+
+    keys = set(keys)
+
+    def bump():
+        # Primero se aseguran las filas y luego se incrementan todas; así ningún aumento se pierde
+        existing = set(CacheVersion.objects.filter(key__in=keys).values_list('key', flat=True))
+        if keys - existing:
+            CacheVersion.objects.bulk_create([CacheVersion(key=key) for key in keys - existing], ignore_conflicts=True)
+        CacheVersion.objects.filter(key__in=keys).update(version=F('version') + 1, updated_at=timezone.now())
+
+    if keys:
+        transaction.on_commit(bump)
+
+
+def branch_version(branch_id):
+    """Versión de las existencias de la sucursal; cambia cada vez que se confirma un movimiento de sus lotes."""
+    return get_versions(BRANCH_VERSION_KEY.format(branch_id))[0]
+
+
+def touch_branches(branch_ids):
+    """Invalida todo lo cacheado por sucursal una vez confirmada la transacción en curso."""
+    bump_versions(BRANCH_VERSION_KEY.format(branch_id) for branch_id in branch_ids)
+
+
+def branch_catalog_etag(branch_id, version):
+    return quote_etag(f"catalog-{branch_id}-{version}")
+
+
+def branch_catalog(branch_id, version):
+    """
+    Productos con existencia en la sucursal; se calcula una vez por versión de la sucursal.
+    La versión se lee una sola vez por petición para que el ETag y el contenido coincidan.
+    """
+    from inventory.models import InventoryStock
+
+    key = f"inventory:catalog:{branch_id}:{version}"
+    catalog = cache.get(key)
+    if catalog is None:
+        rows = InventoryStock.objects.filter(branch_id=branch_id, on_hand__gt=0)\
+            .values_list('product__id', 'product__code', 'product__name').order_by('product__name')
+        catalog = [{'id': product_id, 'name': f"{code} - {name}"} for product_id, code, name in rows]
+        cache.set(key, catalog, CATALOG_CACHE_TIMEOUT)
+    return catalog
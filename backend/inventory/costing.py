@@ -0,0 +1,61 @@
+from decimal import Decimal
+from django.utils import timezone
+from inventory.models import AverageCost
+
+PRECISION = Decimal('0.0001')
+
+
+def apply_movement(quantity, value, unit_cost, moved, cost):
+    """
+    Aplica un movimiento al costo promedio ponderado en O(1).
+    Las entradas se suman a su costo y recalculan el promedio; las salidas se valoran al promedio vigente.
+    """
+    quantity += moved
+    if moved > 0:
+        value += moved * cost
+        unit_cost = (value / quantity).quantize(PRECISION) if quantity > 0 else cost
+    else:
+        value += moved * unit_cost
+    if quantity == 0:
+        value = Decimal('0')
+    return quantity, value.quantize(PRECISION), unit_cost
+
+
+def load_costs(pairs):
+    """
+    Estados de costo promedio de cada (sucursal, producto), creándolos si no existen.
+    No bloquea: quien escribe ya tiene bloqueadas las filas de existencias de esos pares.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+
+    def fetch():
+        branches = {branch_id for branch_id, _ in pairs}
+        products = {product_id for _, product_id in pairs}
+        rows = AverageCost.objects.filter(branch_id__in=branches, product_id__in=products)
+        return {(row.branch_id, row.product_id): row for row in rows if (row.branch_id, row.product_id) in pairs}
+
+    costs = fetch()
+    missing = pairs - costs.keys()
+    if missing:
+        AverageCost.objects.bulk_create(
+            [AverageCost(branch_id=branch_id, product_id=product_id) for branch_id, product_id in missing],
+            ignore_conflicts=True
+        )
+        costs = fetch()
+    return costs
+
+
+def apply_movements(rows):
+    """Avanza el costo promedio con una lista de movimientos del Kardex: una lectura y un bulk_update por documento."""
+    costs = load_costs((row.branch_id, row.product_id) for row in rows)
+    for row in rows:
+        state = costs[(row.branch_id, row.product_id)]
+        state.quantity, state.value, state.unit_cost = apply_movement(
+            state.quantity, state.value, state.unit_cost, row.quantity, row.cost
+        )
+    now = timezone.now()
+    for state in costs.values():
+        state.updated_at = now
+    AverageCost.objects.bulk_update(list(costs.values()), ['quantity', 'value', 'unit_cost', 'updated_at'])
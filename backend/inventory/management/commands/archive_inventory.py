@@ -0,0 +1,57 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from inventory.models import Inventory, InventoryArchive, InventoryStock
+from inventory.services import lock_stock
+from kardex.models import Kardex
+
+
+class Command(BaseCommand):
+    help = "Mueve a inventory_archive los lotes agotados sin movimiento en los últimos N días."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help="Antigüedad mínima (días desde la última actualización).")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Lotes archivados por transacción.")
+        parser.add_argument('--dry-run', action='store_true', help="Solo cuenta los lotes que se archivarían.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        candidates = Inventory.objects.filter(is_open=False, quantity=0, updated_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f"{candidates.count()} lote(s) agotados antes del {cutoff:%d/%m/%Y} se archivarían.")
+            return
+
+        archived = 0
+        last_id = 0
+        while True:
+            chunk = list(
+                candidates.filter(id__gt=last_id).order_by('id').values_list('id', 'branch_id', 'product_id')[:options['batch_size']]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            archived += self.archive_chunk(chunk, cutoff)
+
+        self.stdout.write(self.style.SUCCESS(f"{archived} lote(s) archivados."))
+
+    def archive_chunk(self, chunk, cutoff):
+        with transaction.atomic():
+            # Mismo orden de bloqueo que ventas y traslados: primero existencias, luego lotes
+            lock_stock([(branch_id, product_id) for _, branch_id, product_id in chunk])
+            lots = list(
+                Inventory.objects.select_for_update()
+                .filter(id__in=[lot_id for lot_id, _, _ in chunk], is_open=False, quantity=0, updated_at__lt=cutoff)
+                .order_by('product_id', 'created_at', 'id')
+            )
+            if not lots:
+                return 0
+            ids = [lot.pk for lot in lots]
+
+            InventoryArchive.objects.bulk_create([InventoryArchive.from_lot(lot) for lot in lots])
+            Kardex.objects.filter(inventory_entry_id__in=ids).update(archived_entry_id=F('inventory_entry_id'), inventory_entry=None)
+            InventoryStock.objects.filter(oldest_lot_id__in=ids).update(oldest_lot=None)
+            Inventory.objects.filter(id__in=ids).delete()
+            return len(ids)
@@ -0,0 +1,76 @@
+import time
+import uuid
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from branch.models import Branch
+from inventory.models import Inventory
+from inventory.services import load_open_lots
+from product.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la consulta FIFO de lotes abiertos mientras se acumulan lotes agotados. "
+        "Todo lo insertado se revierte al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--branch', type=int, help="Sucursal (ID). Por defecto la primera.")
+        parser.add_argument('--product', type=int, help="Producto (ID). Por defecto el primero.")
+        parser.add_argument('--steps', default='0,10000,100000,1000000', help="Lotes agotados acumulados en cada medición.")
+        parser.add_argument('--open-lots', type=int, default=5, help="Lotes con saldo que debe encontrar la consulta.")
+        parser.add_argument('--repeat', type=int, default=50, help="Repeticiones por medición.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--explain', action='store_true', help="Muestra el plan de la consulta en cada medición.")
+
+    def handle(self, *args, **options):
+        branch = Branch.objects.filter(pk=options['branch']).first() if options['branch'] else Branch.objects.order_by('id').first()
+        product = Product.objects.filter(pk=options['product']).first() if options['product'] else Product.objects.order_by('id').first()
+        if not branch or not product:
+            raise CommandError("Se necesita al menos una sucursal y un producto.")
+
+        steps = sorted(int(step) for step in options['steps'].split(','))
+
+        with transaction.atomic():
+            self.create_lots(branch, product, options['open_lots'], Decimal('1.00'), options['batch_size'])
+
+            depleted = 0
+            self.stdout.write(f"{'lotes agotados':>16} {'ms por consulta':>16} {'lotes leídos':>14}")
+            for step in steps:
+                self.create_lots(branch, product, step - depleted, Decimal('0.00'), options['batch_size'])
+                depleted = step
+
+                elapsed, found = self.measure(branch, product, options['repeat'])
+                self.stdout.write(f"{depleted:>16} {elapsed * 1000:>16.3f} {found:>14}")
+                if options['explain']:
+                    self.stdout.write(self.fifo_queryset(branch, product).explain())
+
+            transaction.set_rollback(True)
+
+    def fifo_queryset(self, branch, product):
+        return Inventory.objects.filter(branch=branch, product=product, is_open=True, active=True).order_by('created_at', 'id')
+
+    def measure(self, branch, product, repeat):
+        found = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            found = len(load_open_lots(branch, [product.pk]).get(product.pk, []))
+        return (time.perf_counter() - start) / repeat, found
+
+    def create_lots(self, branch, product, count, quantity, batch_size):
+        while count > 0:
+            size = min(count, batch_size)
+            Inventory.objects.bulk_create([
+                Inventory(
+                    branch=branch,
+                    product=product,
+                    batch=uuid.uuid4(),
+                    original_quantity=Decimal('1.00'),
+                    quantity=quantity,
+                    cost=Decimal('1.00'),
+                    is_open=quantity > 0
+                )
+                for _ in range(size)
+            ])
+            count -= size
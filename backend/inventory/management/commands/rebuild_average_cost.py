@@ -0,0 +1,76 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from inventory.costing import apply_movement
+from inventory.models import AverageCost, InventoryStock
+from kardex.models import Kardex, KardexArchive
+from kardex.pagination import keyset_rows
+
+CHUNK_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = "Reconstruye (o verifica con --verify) el costo promedio ponderado recorriendo todo el Kardex una sola vez."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help="Solo reporta diferencias, no modifica nada.")
+        parser.add_argument('--branch', type=int, help="Limitar a una sucursal (ID).")
+
+    def handle(self, *args, **options):
+        branch_id = options['branch']
+
+        with transaction.atomic():
+            # Bloquear las existencias detiene a los escritores del Kardex durante la reconstrucción
+            stock_rows = InventoryStock.objects.select_for_update().order_by('branch_id', 'product_id')
+            current = AverageCost.objects.all()
+            if branch_id:
+                stock_rows = stock_rows.filter(branch_id=branch_id)
+                current = current.filter(branch_id=branch_id)
+            list(stock_rows.values_list('id', flat=True))
+            current = {(row.branch_id, row.product_id): row for row in current}
+
+            # Los meses archivados son anteriores a todo el Kardex vivo, así que basta recorrer uno y luego el otro
+            states = {}
+            replayed = 0
+            for model in (KardexArchive, Kardex):
+                movements = model.objects.all()
+                if branch_id:
+                    movements = movements.filter(branch_id=branch_id)
+                # Páginas por (created_at, id): con mysqlclient .iterator() cargaría todo el Kardex en memoria
+                columns = ('branch_id', 'product_id', 'quantity', 'cost')
+                for row_branch, product_id, quantity, cost in keyset_rows(movements, columns, CHUNK_SIZE):
+                    state = states.get((row_branch, product_id), (Decimal('0'), Decimal('0'), Decimal('0')))
+                    states[(row_branch, product_id)] = apply_movement(*state, quantity, cost)
+                    replayed += 1
+
+            to_update = []
+            to_create = []
+            for pair in current.keys() | states.keys():
+                quantity, value, unit_cost = states.get(pair, (Decimal('0'), Decimal('0'), Decimal('0')))
+                row = current.get(pair)
+                if row is None:
+                    row = AverageCost(branch_id=pair[0], product_id=pair[1])
+                    to_create.append(row)
+                elif (row.quantity, row.value, row.unit_cost) == (quantity, value, unit_cost):
+                    continue
+                else:
+                    to_update.append(row)
+                self.stdout.write(
+                    f"Sucursal {pair[0]}, producto {pair[1]}: registrado {row.unit_cost} x {row.quantity}, "
+                    f"calculado {unit_cost} x {quantity}."
+                )
+                row.quantity, row.value, row.unit_cost = quantity, value, unit_cost
+
+            differences = len(to_update) + len(to_create)
+            if options['verify']:
+                if differences:
+                    self.stdout.write(self.style.ERROR(f"{differences} costo(s) promedio no coinciden con el Kardex."))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"Costos promedio correctos ({replayed} movimientos)."))
+                return
+
+            AverageCost.objects.bulk_create(to_create, batch_size=1000)
+            AverageCost.objects.bulk_update(to_update, ['quantity', 'value', 'unit_cost'], batch_size=1000)
+            self.stdout.write(self.style.SUCCESS(
+                f"Costos promedio reconstruidos a partir de {replayed} movimientos: {differences} fila(s) corregidas."
+            ))
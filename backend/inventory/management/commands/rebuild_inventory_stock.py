@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from inventory.cache import touch_branches
+from django.db.models import Q
+from inventory.models import Inventory, InventoryStock
+from inventory.services import compute_stock
+
+
+class Command(BaseCommand):
+    help = "Reconstruye (o verifica con --verify) las existencias por sucursal a partir de los lotes de inventario."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help="Solo reporta diferencias, no modifica nada.")
+        parser.add_argument('--branch', type=int, help="Limitar a una sucursal (ID).")
+
+    def handle(self, *args, **options):
+        branch_id = options['branch']
+
+        with transaction.atomic():
+            lots = Inventory.objects.all()
+            if branch_id:
+                lots = lots.filter(branch_id=branch_id)
+            stale_open_flags = lots.filter(Q(is_open=True, quantity__lte=0) | Q(is_open=False, quantity__gt=0))
+            if options['verify']:
+                stale_lots = stale_open_flags.count()
+                if stale_lots:
+                    self.stdout.write(self.style.ERROR(f"{stale_lots} lote(s) con la marca 'con saldo' desactualizada."))
+            else:
+                stale_open_flags.filter(quantity__gt=0).update(is_open=True)
+                stale_open_flags.filter(quantity__lte=0).update(is_open=False)
+
+            stock_rows = InventoryStock.objects.select_for_update()
+            if branch_id:
+                stock_rows = stock_rows.filter(branch_id=branch_id)
+            current = {(row.branch_id, row.product_id): row for row in stock_rows}
+            expected = compute_stock(branch_id)
+
+            to_update = []
+            to_create = []
+            for pair in current.keys() | expected.keys():
+                on_hand, lot_count, oldest_lot_id = expected.get(pair, (0, 0, None))
+                row = current.get(pair)
+                if row is None:
+                    row = InventoryStock(branch_id=pair[0], product_id=pair[1])
+                    to_create.append(row)
+                elif (row.on_hand, row.lot_count, row.oldest_lot_id) == (on_hand, lot_count, oldest_lot_id):
+                    continue
+                else:
+                    to_update.append(row)
+
+                self.stdout.write(
+                    f"Sucursal {pair[0]}, producto {pair[1]}: "
+                    f"registrado {row.on_hand}/{row.lot_count} lotes, calculado {on_hand}/{lot_count} lotes."
+                )
+                row.on_hand, row.lot_count, row.oldest_lot_id = on_hand, lot_count, oldest_lot_id
+
+            differences = len(to_update) + len(to_create)
+            if options['verify']:
+                if differences:
+                    self.stdout.write(self.style.ERROR(f"{differences} existencia(s) no coinciden con los lotes."))
+                else:
+                    self.stdout.write(self.style.SUCCESS("Las existencias coinciden con los lotes."))
+                return
+
+            InventoryStock.objects.bulk_create(to_create, batch_size=1000)
+            InventoryStock.objects.bulk_update(to_update, ['on_hand', 'lot_count', 'oldest_lot'], batch_size=1000)
+            touch_branches(row.branch_id for row in to_create + to_update)
+            self.stdout.write(self.style.SUCCESS(f"Existencias reconstruidas: {differences} fila(s) corregidas."))
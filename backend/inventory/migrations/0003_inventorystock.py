@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 10:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_stock(apps, schema_editor):
+    Inventory = apps.get_model('inventory', 'Inventory')
+    InventoryStock = apps.get_model('inventory', 'InventoryStock')
+    rows = Inventory.objects.filter(active=True, quantity__gt=0).values('branch_id', 'product_id').annotate(
+        on_hand=models.Sum('quantity'),
+        lot_count=models.Count('id'),
+        oldest_lot_id=models.Min('id')
+    ).order_by()
+    InventoryStock.objects.bulk_create([InventoryStock(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('inventory', '0002_alter_inventory_unique_together'),
+        ('product', '0003_alter_product_subcategory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('on_hand', models.DecimalField(decimal_places=2, default=0, help_text='Suma del saldo de los lotes activos.', max_digits=12, verbose_name='existencia')),
+                ('lot_count', models.PositiveIntegerField(default=0, verbose_name='lotes con saldo')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='última actualización')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='branch.branch', verbose_name='sucursal')),
+                ('oldest_lot', models.ForeignKey(blank=True, help_text='Siguiente lote a despachar por FIFO.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.inventory', verbose_name='lote más antiguo')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='product.product', verbose_name='producto')),
+            ],
+            options={
+                'verbose_name': 'Existencia por Sucursal',
+                'verbose_name_plural': 'Existencias por Sucursal',
+                'db_table': 'inventory_stock',
+                'ordering': ['branch', 'product'],
+                'unique_together': {('branch', 'product')},
+            },
+        ),
+        migrations.RunPython(populate_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 10:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('inventory', '0003_inventorystock'),
+        ('product', '0003_alter_product_subcategory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='inventory',
+            constraint=models.CheckConstraint(condition=models.Q(('quantity__gte', 0)), name='inventory_quantity_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='inventorystock',
+            constraint=models.CheckConstraint(condition=models.Q(('on_hand__gte', 0)), name='inventory_stock_on_hand_non_negative'),
+        ),
+    ]
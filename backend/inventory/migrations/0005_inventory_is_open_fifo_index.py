@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 10:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def close_depleted_lots(apps, schema_editor):
+    Inventory = apps.get_model('inventory', 'Inventory')
+    Inventory.objects.filter(quantity__lte=0).update(is_open=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('inventory', '0004_inventory_non_negative_constraints'),
+        ('product', '0003_alter_product_subcategory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='is_open',
+            field=models.BooleanField(default=True, editable=False, help_text='Se apaga cuando el lote se agota; el FIFO solo recorre lotes abiertos.', verbose_name='con saldo'),
+        ),
+        migrations.RunPython(close_depleted_lots, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['branch', 'product', 'is_open', 'active', 'created_at'], name='inventory_fifo_idx'),
+        ),
+    ]
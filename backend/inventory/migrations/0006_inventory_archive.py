@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-18 10:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('inventory', '0005_inventory_is_open_fifo_index'),
+        ('product', '0003_alter_product_subcategory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventory',
+            name='batch',
+            field=models.UUIDField(db_index=True, editable=False, verbose_name='lote (batch)'),
+        ),
+        migrations.CreateModel(
+            name='InventoryArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_number', models.UUIDField(editable=False, unique=True, verbose_name='número de entrada (UUID)')),
+                ('batch', models.UUIDField(db_index=True, editable=False, verbose_name='lote (batch)')),
+                ('original_quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='cantidad original')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='cantidad actual')),
+                ('cost', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='costo unitario')),
+                ('created_at', models.DateTimeField(verbose_name='fecha de ingreso')),
+                ('updated_at', models.DateTimeField(verbose_name='última actualización')),
+                ('active', models.BooleanField(default=True, verbose_name='activo')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='fecha de archivo')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='branch.branch', verbose_name='sucursal')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='creado por')),
+                ('modified_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='modificado por')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='product.product', verbose_name='producto')),
+            ],
+            options={
+                'verbose_name': 'Lote Archivado',
+                'verbose_name_plural': 'Lotes Archivados',
+                'db_table': 'inventory_archive',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
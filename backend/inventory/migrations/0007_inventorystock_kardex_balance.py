@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_inventory_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorystock',
+            name='kardex_balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='saldo en Kardex'),
+        ),
+        migrations.AddField(
+            model_name='inventorystock',
+            name='kardex_value',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='valor en Kardex'),
+        ),
+    ]
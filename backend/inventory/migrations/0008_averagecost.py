@@ -0,0 +1,72 @@
+# Generated by Django 5.2 on 2026-10-18 10:54
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Q
+
+PRECISION = Decimal('0.0001')
+CHUNK_SIZE = 5000
+
+
+def replay_kardex(apps, schema_editor):
+    AverageCost = apps.get_model('inventory', 'AverageCost')
+    states = {}
+    for model_name in ('KardexArchive', 'Kardex'):
+        movements = apps.get_model('kardex', model_name).objects.order_by('created_at', 'id').values_list(
+            'created_at', 'id', 'branch_id', 'product_id', 'quantity', 'cost'
+        )
+        # Páginas por clave (created_at, id): con mysqlclient .iterator() cargaría toda la tabla en memoria
+        rows = list(movements[:CHUNK_SIZE])
+        while rows:
+            for created_at, pk, branch_id, product_id, moved, cost in rows:
+                quantity, value, unit_cost = states.get((branch_id, product_id), (Decimal('0'), Decimal('0'), Decimal('0')))
+                quantity += moved
+                if moved > 0:
+                    value += moved * cost
+                    unit_cost = (value / quantity).quantize(PRECISION) if quantity > 0 else cost
+                else:
+                    value += moved * unit_cost
+                if quantity == 0:
+                    value = Decimal('0')
+                states[(branch_id, product_id)] = (quantity, value.quantize(PRECISION), unit_cost)
+            created_at, pk = rows[-1][:2]
+            rows = list(movements.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))[:CHUNK_SIZE])
+
+    AverageCost.objects.bulk_create([
+        AverageCost(branch_id=branch_id, product_id=product_id, quantity=quantity, value=value, unit_cost=unit_cost)
+        for (branch_id, product_id), (quantity, value, unit_cost) in states.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('inventory', '0007_inventorystock_kardex_balance'),
+        ('kardex', '0004_kardex_archive'),
+        ('product', '0003_alter_product_subcategory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AverageCost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='cantidad')),
+                ('unit_cost', models.DecimalField(decimal_places=4, default=0, max_digits=12, verbose_name='costo promedio')),
+                ('value', models.DecimalField(decimal_places=4, default=0, max_digits=16, verbose_name='valor')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='última actualización')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='branch.branch', verbose_name='sucursal')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='product.product', verbose_name='producto')),
+            ],
+            options={
+                'verbose_name': 'Costo Promedio',
+                'verbose_name_plural': 'Costos Promedio',
+                'db_table': 'inventory_average_cost',
+                'ordering': ['branch', 'product'],
+                'unique_together': {('branch', 'product')},
+            },
+        ),
+        migrations.RunPython(replay_kardex, migrations.RunPython.noop),
+    ]
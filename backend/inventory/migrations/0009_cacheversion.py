@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_averagecost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='clave')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='versión')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='última actualización')),
+            ],
+            options={
+                'verbose_name': 'Versión de Caché',
+                'verbose_name_plural': 'Versiones de Caché',
+                'db_table': 'cache_version',
+            },
+        ),
+    ]
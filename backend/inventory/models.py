@@ -15,7 +15,7 @@ class Inventory(models.Model):
     )
     branch = models.ForeignKey(Branch, on_delete=models.PROTECT, verbose_name="sucursal")
     product = models.ForeignKey(Product, on_delete=models.PROTECT, verbose_name="producto")
-    batch = models.UUIDField(verbose_name="lote (batch)", editable=False)
+    batch = models.UUIDField(verbose_name="lote (batch)", editable=False, db_index=True)
     original_quantity = models.DecimalField(
         max_digits=12, 
         decimal_places=2, 
@@ -33,6 +33,12 @@ class Inventory(models.Model):
         decimal_places=2, 
         verbose_name="costo unitario"
     )
+    is_open = models.BooleanField(
+        default=True,
+        editable=False,
+        verbose_name="con saldo",
+        help_text="Se apaga cuando el lote se agota; el FIFO solo recorre lotes abiertos."
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="fecha de ingreso")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="última actualización")
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="creado por")
@@ -45,6 +51,135 @@ class Inventory(models.Model):
         verbose_name_plural = 'Inventario (Por Lotes)'
         ordering = ['-created_at']
         unique_together = ('branch', 'product', 'batch')
+        indexes = [
+            # Lotes abiertos de un producto en una sucursal, ya en orden FIFO
+            models.Index(fields=['branch', 'product', 'is_open', 'active', 'created_at'], name='inventory_fifo_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(quantity__gte=0), name='inventory_quantity_non_negative'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} - Lote: {str(self.batch)[:8]}... (Q: {self.quantity})"
+
+    @classmethod
+    def batch_received(cls, batch):
+        """Indica si el lote ya entró al inventario, buscando también en los lotes archivados."""
+        return cls.objects.filter(batch=batch).exists() or InventoryArchive.objects.filter(batch=batch).exists()
+
+    def save(self, *args, **kwargs):
+        self.is_open = self.quantity > 0
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'is_open' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['is_open']
+        super().save(*args, **kwargs)
+
+class InventoryArchive(models.Model):
+    """Lotes agotados movidos fuera de la tabla de inventario vivo. Conservan su ID original."""
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    entry_number = models.UUIDField(unique=True, editable=False, verbose_name="número de entrada (UUID)")
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='+', verbose_name="sucursal")
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='+', verbose_name="producto")
+    batch = models.UUIDField(verbose_name="lote (batch)", editable=False, db_index=True)
+    original_quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="cantidad original")
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="cantidad actual")
+    cost = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="costo unitario")
+    created_at = models.DateTimeField(verbose_name="fecha de ingreso")
+    updated_at = models.DateTimeField(verbose_name="última actualización")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="creado por")
+    modified_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="modificado por")
+    active = models.BooleanField(default=True, verbose_name="activo")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="fecha de archivo")
+
+    ARCHIVED_FIELDS = (
+        'id', 'entry_number', 'branch_id', 'product_id', 'batch', 'original_quantity', 'quantity', 'cost',
+        'created_at', 'updated_at', 'created_by_id', 'modified_by_id', 'active'
+    )
+
+    class Meta:
+        db_table = 'inventory_archive'
+        verbose_name = 'Lote Archivado'
+        verbose_name_plural = 'Lotes Archivados'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.product.name} - Lote: {str(self.batch)[:8]}... (archivado)"
+
+    @classmethod
+    def from_lot(cls, lot):
+        return cls(**{field: getattr(lot, field) for field in cls.ARCHIVED_FIELDS})
+
+
+class InventoryStock(models.Model):
+    """Existencias consolidadas por sucursal y producto, mantenidas por cada movimiento de inventario."""
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='+', verbose_name="sucursal")
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='+', verbose_name="producto")
+    on_hand = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name="existencia",
+        help_text="Suma del saldo de los lotes activos."
+    )
+    lot_count = models.PositiveIntegerField(default=0, verbose_name="lotes con saldo")
+    oldest_lot = models.ForeignKey(
+        Inventory,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="lote más antiguo",
+        help_text="Siguiente lote a despachar por FIFO."
+    )
+    # Último saldo escrito en el Kardex de esta sucursal y producto; cada movimiento parte de aquí
+    kardex_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="saldo en Kardex")
+    kardex_value = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="valor en Kardex")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="última actualización")
+
+    class Meta:
+        db_table = 'inventory_stock'
+        verbose_name = 'Existencia por Sucursal'
+        verbose_name_plural = 'Existencias por Sucursal'
+        ordering = ['branch', 'product']
+        unique_together = ('branch', 'product')
+        constraints = [
+            models.CheckConstraint(condition=models.Q(on_hand__gte=0), name='inventory_stock_on_hand_non_negative'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} en {self.branch.name}: {self.on_hand}"
+
+
+class AverageCost(models.Model):
+    """Costo promedio ponderado móvil por sucursal y producto, actualizado con cada movimiento del Kardex."""
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='+', verbose_name="sucursal")
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='+', verbose_name="producto")
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="cantidad")
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=4, default=0, verbose_name="costo promedio")
+    value = models.DecimalField(max_digits=16, decimal_places=4, default=0, verbose_name="valor")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="última actualización")
+
+    class Meta:
+        db_table = 'inventory_average_cost'
+        verbose_name = 'Costo Promedio'
+        verbose_name_plural = 'Costos Promedio'
+        ordering = ['branch', 'product']
+        unique_together = ('branch', 'product')
+
+    def __str__(self):
+        return f"{self.product.name} en {self.branch.name}: {self.unit_cost}"
+
+
+class CacheVersion(models.Model):
+    """Contador de versión de lo que se cachea por proceso; se guarda en la base para que todos los workers lo vean."""
+    key = models.CharField(max_length=100, primary_key=True, verbose_name="clave")
+    version = models.PositiveBigIntegerField(default=0, verbose_name="versión")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="última actualización")
+
+    class Meta:
+        db_table = 'cache_version'
+        verbose_name = 'Versión de Caché'
+        verbose_name_plural = 'Versiones de Caché'
 
     def __str__(self):
-        return f"{self.product.name} - Lote: {str(self.batch)[:8]}... (Q: {self.quantity})"
\ No newline at end of file
+        return f"{self.key}: {self.version}"
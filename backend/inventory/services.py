@@ -0,0 +1,370 @@
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+from inventory.cache import touch_branches
+from inventory.costing import apply_movements
+from inventory.models import Inventory, InventoryStock
+from kardex.models import Kardex
+
+# Orden de bloqueo compartido por ventas, traslados y entradas:
+#   1. filas de InventoryStock, ordenadas por (sucursal, producto)
+#   2. lotes de Inventory, ordenados por (producto, fecha de ingreso, id)
+# Respetar siempre este orden evita interbloqueos entre cajeros y despachadores.
+
+def _pairs_filter(pairs):
+    branches = {branch_id for branch_id, _ in pairs}
+    if len(branches) == 1:
+        return Q(branch_id=branches.pop(), product_id__in={product_id for _, product_id in pairs})
+    condition = Q()
+    for branch_id, product_id in pairs:
+        condition |= Q(branch_id=branch_id, product_id=product_id)
+    return condition
+
+
+def lock_stock(pairs):
+    """
+    Bloquea las filas de existencias de cada (sucursal, producto), creándolas si no existen.
+    Todo movimiento de inventario pasa primero por aquí, así los escritores de un mismo
+    producto y sucursal se atienden en fila.
+    """
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return {}
+
+    def fetch():
+        rows = InventoryStock.objects.select_for_update().filter(_pairs_filter(pairs)).order_by('branch_id', 'product_id')
+        return {(row.branch_id, row.product_id): row for row in rows}
+
+    stock = fetch()
+    missing = [pair for pair in pairs if pair not in stock]
+    if missing:
+        InventoryStock.objects.bulk_create(
+            [InventoryStock(branch_id=branch_id, product_id=product_id) for branch_id, product_id in missing],
+            ignore_conflicts=True
+        )
+        stock = fetch()
+    return stock
+
+
+def fifo_key(lot):
+    """Orden FIFO de los lotes: fecha de ingreso y luego ID. Es la única definición de 'lote más antiguo'."""
+    return (lot.created_at, lot.pk)
+
+
+def add_to_stock(stock_row, lot, quantity, reopened=False):
+    """Suma en memoria una entrada a la fila de existencias. `reopened` indica que el lote no tenía saldo."""
+    if not lot.active:
+        return
+    stock_row.on_hand += quantity
+    if reopened:
+        stock_row.lot_count += 1
+        # Un lote reabierto (o con fecha de ingreso anterior) puede ser más antiguo que el registrado
+        if stock_row.oldest_lot_id is None or fifo_key(lot) < fifo_key(stock_row.oldest_lot):
+            stock_row.oldest_lot = lot
+
+
+def set_stock_from_lots(stock_row, lots):
+    """Recalcula en memoria la fila de existencias a partir de la lista completa (y bloqueada) de lotes abiertos."""
+    open_lots = [lot for lot in lots if lot.quantity > 0]
+    stock_row.on_hand = sum((lot.quantity for lot in open_lots), Decimal('0.00'))
+    stock_row.lot_count = len(open_lots)
+    stock_row.oldest_lot_id = open_lots[0].pk if open_lots else None
+
+
+def save_stock(stock_rows):
+    stock_rows = list(stock_rows)
+    if not stock_rows:
+        return
+    now = timezone.now()
+    for row in stock_rows:
+        row.updated_at = now
+    InventoryStock.objects.bulk_update(
+        stock_rows, ['on_hand', 'lot_count', 'oldest_lot', 'kardex_balance', 'kardex_value', 'updated_at']
+    )
+    touch_branches(row.branch_id for row in stock_rows)
+
+
+def record_movements(stock, rows):
+    """
+    Inserta movimientos de Kardex con el saldo acumulado de su (sucursal, producto).
+    El saldo sale de las filas de existencias ya bloqueadas, así que no hay que sumar el historial;
+    el llamador debe guardar después esas filas con save_stock.
+    """
+    for row in rows:
+        stock_row = stock[(row.branch_id, row.product_id)]
+        stock_row.kardex_balance += row.quantity
+        stock_row.kardex_value += Kardex.movement_value(row.quantity, row.cost)
+        row.balance_after = stock_row.kardex_balance
+        row.value_after = stock_row.kardex_value
+    apply_movements(rows)
+    return Kardex.objects.bulk_create(rows)
+
+
+def oldest_open_lots(branch, product_ids):
+    """ID del primer lote con saldo de cada producto en orden FIFO, leído por el índice de lotes abiertos."""
+    oldest = {}
+    lots = Inventory.objects.filter(branch=branch, product_id__in=set(product_ids), is_open=True, active=True)\
+        .order_by('product_id', 'created_at', 'id').values_list('product_id', 'id')
+    for product_id, lot_id in lots:
+        oldest.setdefault(product_id, lot_id)
+    return oldest
+
+
+def compute_stock(branch_id=None):
+    """Existencias calculadas desde los lotes, agrupadas por (sucursal, producto). Usado para reconstruir y verificar."""
+    lots = Inventory.objects.filter(active=True, quantity__gt=0)
+    if branch_id:
+        lots = lots.filter(branch_id=branch_id)
+    # Mismo criterio que set_stock_from_lots: el primero por (fecha de ingreso, id)
+    oldest = Inventory.objects.filter(
+        branch_id=OuterRef('branch_id'), product_id=OuterRef('product_id'), active=True, quantity__gt=0
+    ).order_by('created_at', 'id').values('id')[:1]
+    rows = lots.values('branch_id', 'product_id').annotate(
+        on_hand=Sum('quantity'),
+        lot_count=Count('id'),
+        oldest_lot_id=Subquery(oldest)
+    ).order_by()
+    return {
+        (row['branch_id'], row['product_id']): (row['on_hand'], row['lot_count'], row['oldest_lot_id'])
+        for row in rows
+    }
+
+
+def load_open_lots(branch, product_ids):
+    """Carga y bloquea en una sola consulta los lotes con saldo de todos los productos, en orden FIFO."""
+    lots = Inventory.objects.select_for_update().filter(
+        branch=branch,
+        product_id__in=set(product_ids),
+        is_open=True,
+        active=True
+    ).order_by('product_id', 'created_at', 'id')
+
+    lots_by_product = defaultdict(list)
+    for lot in lots:
+        lots_by_product[lot.product_id].append(lot)
+    return lots_by_product
+
+
+def allocate_fifo(lots_by_product, demands):
+    """
+    Reparte en memoria la cantidad pedida de cada línea entre los lotes más antiguos.
+
+    `demands` es una lista de tuplas (clave, producto, cantidad). Devuelve un diccionario
+    clave -> [(lote, cantidad_tomada), ...] y descuenta la cantidad de cada lote en memoria.
+    """
+    allocations = {}
+    for key, product, qty_needed in demands:
+        lots = lots_by_product.get(product.pk, [])
+
+        total_available = sum(lot.quantity for lot in lots)
+        if total_available < qty_needed:
+            raise ValidationError(f"Stock insuficiente para '{product}'. Requerido: {qty_needed}, Disponible: {total_available}.")
+
+        qty_remaining = qty_needed
+        taken = []
+        for lot in lots:
+            if qty_remaining <= 0: break
+            if lot.quantity <= 0: continue
+
+            to_take = min(lot.quantity, qty_remaining)
+            lot.quantity -= to_take
+            taken.append((lot, to_take))
+            qty_remaining -= to_take
+
+        allocations[key] = taken
+    return allocations
+
+
+def save_lots(lots, user, fields=('quantity',)):
+    """Guarda los saldos de los lotes tocados con un único bulk_update, cerrando los que quedan en cero."""
+    if not lots:
+        return
+    now = timezone.now()
+    for lot in lots:
+        lot.is_open = lot.quantity > 0
+        lot.modified_by = user
+        lot.updated_at = now
+    Inventory.objects.bulk_update(lots, list(fields) + ['is_open', 'modified_by', 'updated_at'])
+
+
+def _outflow(lot, quantity, movement_type, transaction_id, document_number, user):
+    return Kardex(
+        transaction_id=transaction_id,
+        document_number=document_number,
+        movement_type=movement_type,
+        inventory_entry=lot,
+        branch_id=lot.branch_id,
+        product_id=lot.product_id,
+        batch=lot.batch,
+        quantity=quantity * -1,
+        cost=lot.cost,
+        created_by=user
+    )
+
+
+def deplete_fifo(branch, demands, movement_type, transaction_id, document_number, user):
+    """
+    Descuenta por FIFO todas las líneas de un documento en un número fijo de consultas:
+    una lectura bloqueante de lotes, un bulk_update de saldos y un bulk_create del Kardex.
+    """
+    demands = [(key, product, qty) for key, product, qty in demands if qty > 0]
+    if not demands:
+        return {}
+
+    product_ids = {product.pk for _, product, _ in demands}
+    stock = lock_stock([(branch.pk, product_id) for product_id in product_ids])
+    check_stock(stock, branch, demands)
+
+    lots_by_product = load_open_lots(branch, product_ids)
+    allocations = allocate_fifo(lots_by_product, demands)
+
+    touched = {}
+    kardex_rows = []
+    for key, product, _ in demands:
+        for lot, to_take in allocations[key]:
+            touched[lot.pk] = lot
+            kardex_rows.append(_outflow(lot, to_take, movement_type, transaction_id, document_number, user))
+
+    save_lots(list(touched.values()), user)
+    record_movements(stock, kardex_rows)
+
+    for product_id in product_ids:
+        set_stock_from_lots(stock[(branch.pk, product_id)], lots_by_product.get(product_id, []))
+    save_stock(stock.values())
+    return allocations
+
+
+def deplete_reserved(branch, reservations, movement_type, transaction_id, document_number, user):
+    """
+    Descuenta lotes elegidos de antemano (una lista de picking) sin recorrer los lotes abiertos:
+    solo se bloquean los lotes reservados.
+
+    `reservations` es una lista de tuplas (clave, producto_id, lote_id, cantidad). Devuelve
+    clave -> [(lote, cantidad_tomada), ...], o None sin escribir nada si algún lote ya no tiene
+    el saldo reservado (lo consumió una venta, por ejemplo).
+    """
+    reservations = [(key, product_id, lot_id, qty) for key, product_id, lot_id, qty in reservations if qty > 0]
+    if not reservations:
+        return {}
+
+    product_ids = {product_id for _, product_id, _, _ in reservations}
+    stock = lock_stock([(branch.pk, product_id) for product_id in product_ids])
+
+    needed = defaultdict(Decimal)
+    for _, _, lot_id, qty in reservations:
+        needed[lot_id] += qty
+    lots = {
+        lot.pk: lot for lot in Inventory.objects.select_for_update().filter(
+            id__in=needed, branch=branch, is_open=True, active=True
+        ).order_by('product_id', 'created_at', 'id')
+    }
+    if any(lot_id not in lots or lots[lot_id].quantity < qty for lot_id, qty in needed.items()):
+        return None
+
+    allocations = defaultdict(list)
+    kardex_rows = []
+    for key, product_id, lot_id, qty in reservations:
+        lot = lots[lot_id]
+        lot.quantity -= qty
+        allocations[key].append((lot, qty))
+        kardex_rows.append(_outflow(lot, qty, movement_type, transaction_id, document_number, user))
+
+    save_lots(list(lots.values()), user)
+    record_movements(stock, kardex_rows)
+
+    # Existencias por diferencia; solo se relee el lote más antiguo si el que había se agotó
+    refresh = set()
+    for _, product_id, _, qty in reservations:
+        stock[(branch.pk, product_id)].on_hand -= qty
+    for lot in lots.values():
+        if lot.quantity > 0:
+            continue
+        stock_row = stock[(branch.pk, lot.product_id)]
+        stock_row.lot_count -= 1
+        if stock_row.oldest_lot_id == lot.pk:
+            refresh.add(lot.product_id)
+    if refresh:
+        oldest = oldest_open_lots(branch, refresh)
+        for product_id in refresh:
+            stock[(branch.pk, product_id)].oldest_lot_id = oldest.get(product_id)
+    save_stock(stock.values())
+    return dict(allocations)
+
+
+def upsert_lots(branch, entries, stock, user):
+    """
+    Suma entradas a los lotes de la sucursal por (producto, lote), creando en bloque los que no existan.
+
+    `entries` es una lista de tuplas (producto_id, batch, costo, cantidad). Las filas de existencias de
+    la sucursal deben estar ya bloqueadas (y se actualizan en memoria). Devuelve (producto_id, batch) -> lote.
+    """
+    totals = {}
+    for product_id, batch, cost, qty in entries:
+        if (product_id, batch) in totals:
+            totals[(product_id, batch)][1] += qty
+        else:
+            totals[(product_id, batch)] = [cost, qty]
+    if not totals:
+        return {}
+
+    existing = Inventory.objects.select_for_update().filter(
+        branch=branch,
+        product_id__in={product_id for product_id, _ in totals},
+        batch__in={batch for _, batch in totals}
+    ).order_by('product_id', 'created_at', 'id')
+    lots = {(lot.product_id, lot.batch): lot for lot in existing if (lot.product_id, lot.batch) in totals}
+
+    reopened = {}
+    to_update = []
+    to_create = []
+    for key, (cost, qty) in totals.items():
+        lot = lots.get(key)
+        if lot is None:
+            reopened[key] = True
+            to_create.append(Inventory(
+                entry_number=uuid.uuid4(), branch=branch, product_id=key[0], batch=key[1],
+                original_quantity=qty, quantity=qty, cost=cost, is_open=qty > 0,
+                created_by=user, modified_by=user
+            ))
+            continue
+        reopened[key] = lot.quantity <= 0
+        lot.quantity += qty
+        lot.original_quantity += qty
+        to_update.append(lot)
+
+    save_lots(to_update, user, fields=('quantity', 'original_quantity'))
+    if to_create:
+        Inventory.objects.bulk_create(to_create)
+        # MySQL no devuelve los ID del bulk_create: se releen por número de entrada
+        for lot in Inventory.objects.filter(entry_number__in=[lot.entry_number for lot in to_create]):
+            lots[(lot.product_id, lot.batch)] = lot
+
+    for key, (_, qty) in totals.items():
+        add_to_stock(stock[(branch.pk, key[0])], lots[key], qty, reopened=reopened[key] and qty > 0)
+    return lots
+
+
+def check_stock(stock, branch, demands):
+    """Rechaza el documento antes de leer lotes si la existencia consolidada no alcanza."""
+    required = defaultdict(Decimal)
+    products = {}
+    for _, product, qty in demands:
+        required[product.pk] += qty
+        products[product.pk] = product
+
+    for product_id, qty_needed in required.items():
+        available = stock[(branch.pk, product_id)].on_hand
+        if available < qty_needed:
+            raise ValidationError(f"Stock insuficiente para '{products[product_id]}'. Requerido: {qty_needed}, Disponible: {available}.")
+
+
+def weighted_price(allocation, markup=Decimal('1.20')):
+    """Precio unitario promedio de una línea según el costo de los lotes de los que salió."""
+    total_qty = sum(qty for _, qty in allocation)
+    if not total_qty:
+        return Decimal('0.00')
+    total_value = sum(qty * lot.cost * markup for lot, qty in allocation)
+    return (total_value / total_qty).quantize(Decimal('0.01'))
@@ -1,3 +1,276 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from django.contrib.admin import site
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from branch.models import Branch
+from category.models import Category
+from inventory_movement_type.models import InventoryMovementType
+from kardex.models import Kardex
+from product.models import Product
+from subcategory.models import Subcategory
+from unit_of_measure.models import UnitOfMeasure
+from .costing import apply_movement
+from .models import AverageCost, Inventory, InventoryArchive, InventoryStock
+from .services import add_to_stock, allocate_fifo, compute_stock, deplete_fifo, lock_stock, record_movements, save_stock
+
+
+class AllocateFifoTests(SimpleTestCase):
+
+    def lots(self, *quantities):
+        return [SimpleNamespace(quantity=Decimal(quantity)) for quantity in quantities]
+
+    def test_takes_the_oldest_lots_first(self):
+        product = SimpleNamespace(pk=1)
+        lots = self.lots('3', '5', '4')
+        allocations = allocate_fifo({1: lots}, [('line', product, Decimal('7'))])
+
+        self.assertEqual([(lot, qty) for lot, qty in allocations['line']], [(lots[0], Decimal('3')), (lots[1], Decimal('4'))])
+        self.assertEqual([lot.quantity for lot in lots], [Decimal('0'), Decimal('1'), Decimal('4')])
+
+    def test_lines_of_the_same_product_share_the_lots(self):
+        product = SimpleNamespace(pk=1)
+        lots = self.lots('3', '5')
+        allocations = allocate_fifo({1: lots}, [('a', product, Decimal('2')), ('b', product, Decimal('4'))])
+
+        self.assertEqual([qty for _, qty in allocations['a']], [Decimal('2')])
+        self.assertEqual([qty for _, qty in allocations['b']], [Decimal('1'), Decimal('3')])
+
+    def test_rejects_lines_without_enough_stock(self):
+        product = SimpleNamespace(pk=1)
+        lots = self.lots('3')
+        with self.assertRaises(ValidationError):
+            allocate_fifo({1: lots}, [('line', product, Decimal('4'))])
+
+
+class InventoryTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('bodega', password='x')
+        self.sale_type = InventoryMovementType.objects.create(name='SALE', code='SALE', flow='out')
+        category = Category.objects.create(name='Pruebas')
+        subcategory = Subcategory.objects.create(name='Inventario', category=category)
+        unit = UnitOfMeasure.objects.create(name='Unidad', type='Conteo')
+        self.product = Product.objects.create(
+            sku='INV-1', name='Producto', size='U', presentation='Unidad',
+            category=category, subcategory=subcategory, purchase_unit=unit, sale_unit=unit
+        )
+        self.branch = Branch.objects.create(name='Central', address='-', municipality='San Salvador')
+
+    def add_lot(self, quantity, cost, days_ago=0):
+        """Ingresa un lote con la fecha indicada y lo suma a las existencias como lo haría una compra."""
+        quantity = Decimal(quantity)
+        stock = lock_stock([(self.branch.pk, self.product.pk)])
+        lot = Inventory.objects.create(
+            branch=self.branch, product=self.product, batch=uuid.uuid4(),
+            original_quantity=quantity, quantity=quantity, cost=Decimal(cost)
+        )
+        Inventory.objects.filter(pk=lot.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        lot.refresh_from_db()
+        add_to_stock(stock[(self.branch.pk, self.product.pk)], lot, quantity, reopened=True)
+        save_stock(stock.values())
+        return lot
+
+    def stock(self):
+        return InventoryStock.objects.get(branch=self.branch, product=self.product)
+
+    def deplete(self, quantity):
+        return deplete_fifo(
+            self.branch, [('line', self.product, Decimal(quantity))], self.sale_type,
+            1, 'VTA-1', self.user
+        )
+
+
+class DepleteFifoTests(InventoryTestCase):
+
+    def test_depletes_by_date_of_entry_not_by_id(self):
+        newer = self.add_lot('5', '3.00', days_ago=1)
+        older = self.add_lot('5', '2.00', days_ago=2)
+
+        allocations = self.deplete('7')
+
+        self.assertEqual([(lot.pk, qty) for lot, qty in allocations['line']], [(older.pk, Decimal('5')), (newer.pk, Decimal('2'))])
+        older.refresh_from_db()
+        newer.refresh_from_db()
+        self.assertEqual((older.quantity, older.is_open), (Decimal('0.00'), False))
+        self.assertEqual((newer.quantity, newer.is_open), (Decimal('3.00'), True))
+
+        stock = self.stock()
+        self.assertEqual((stock.on_hand, stock.lot_count, stock.oldest_lot_id), (Decimal('3.00'), 1, newer.pk))
+        self.assertEqual(
+            list(Kardex.objects.order_by('id').values_list('inventory_entry_id', 'quantity', 'cost')),
+            [(older.pk, Decimal('-5.00'), Decimal('2.00')), (newer.pk, Decimal('-2.00'), Decimal('3.00'))]
+        )
+
+    def test_rejects_without_writing_when_stock_is_short(self):
+        lot = self.add_lot('5', '2.00')
+
+        with self.assertRaises(ValidationError):
+            self.deplete('6')
+
+        lot.refresh_from_db()
+        self.assertEqual(lot.quantity, Decimal('5.00'))
+        self.assertEqual(self.stock().on_hand, Decimal('5.00'))
+        self.assertFalse(Kardex.objects.exists())
+
+    def test_query_count_does_not_grow_with_the_lots_touched(self):
+        for days_ago in range(10, 0, -1):
+            self.add_lot('1', '2.00', days_ago=days_ago)
+        # La primera salida crea la fila de costo promedio; se mide a partir de la segunda
+        self.deplete('1')
+
+        with CaptureQueriesContext(connection) as two_lots:
+            self.deplete('2')
+        with CaptureQueriesContext(connection) as six_lots:
+            self.deplete('6')
+        self.assertEqual(len(six_lots.captured_queries), len(two_lots.captured_queries))
+
+
+class StockProjectionTests(InventoryTestCase):
+
+    def rebuild(self, *args):
+        out = StringIO()
+        call_command('rebuild_inventory_stock', *args, stdout=out)
+        return out.getvalue()
+
+    def test_projection_matches_the_lots(self):
+        newer = self.add_lot('5', '3.00', days_ago=1)
+        self.add_lot('4', '2.00', days_ago=2)
+        self.deplete('4')
+
+        stock = self.stock()
+        self.assertEqual((stock.on_hand, stock.lot_count, stock.oldest_lot_id), (Decimal('5.00'), 1, newer.pk))
+        self.assertEqual(compute_stock()[(self.branch.pk, self.product.pk)], (stock.on_hand, stock.lot_count, stock.oldest_lot_id))
+        self.assertIn("Las existencias coinciden", self.rebuild('--verify'))
+
+    def test_oldest_lot_follows_the_date_of_entry(self):
+        self.add_lot('5', '3.00', days_ago=1)
+        older = self.add_lot('5', '2.00', days_ago=2)
+
+        self.assertEqual(self.stock().oldest_lot_id, older.pk)
+        self.assertEqual(compute_stock()[(self.branch.pk, self.product.pk)][2], older.pk)
+
+    def test_verify_reports_drift_and_rebuild_fixes_it(self):
+        lot = self.add_lot('5', '2.00')
+        InventoryStock.objects.filter(branch=self.branch, product=self.product).update(on_hand=Decimal('7.00'), lot_count=2)
+        Inventory.objects.filter(pk=lot.pk).update(is_open=False)
+
+        output = self.rebuild('--verify')
+        self.assertIn("1 existencia(s) no coinciden", output)
+        self.assertIn("1 lote(s) con la marca 'con saldo' desactualizada", output)
+        self.assertEqual(self.stock().on_hand, Decimal('7.00'))
+
+        self.rebuild()
+        stock = self.stock()
+        lot.refresh_from_db()
+        self.assertEqual((stock.on_hand, stock.lot_count, stock.oldest_lot_id, lot.is_open), (Decimal('5.00'), 1, lot.pk, True))
+        self.assertIn("Las existencias coinciden", self.rebuild('--verify'))
+
+
+class LotHistoryTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin_user = User.objects.create_superuser('admin', password='x')
+        self.client.force_login(self.admin_user)
+        self.live = self.add_lot('5', '2.00', days_ago=1)
+        spent = self.add_lot('3', '1.50', days_ago=2)
+        InventoryArchive.from_lot(spent).save()
+        Inventory.objects.filter(pk=spent.pk).delete()
+        self.archived = InventoryArchive.objects.get(pk=spent.pk)
+
+    def test_history_lists_live_and_archived_lots(self):
+        response = self.client.get(reverse('admin:inventory_inventory_history'), {'q': 'Producto'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['id'], row['archived']) for row in response.context['rows']],
+            [(self.live.pk, False), (self.archived.pk, True)]
+        )
+
+    def test_changelist_search_links_to_the_history(self):
+        url = reverse('admin:inventory_inventory_changelist')
+        response = self.client.get(url, {'q': 'Producto', 'branch__id__exact': self.branch.pk})
+
+        self.assertContains(response, reverse('admin:inventory_inventory_history'))
+
+    def test_other_searches_do_not_leave_the_archive_notice(self):
+        inventory_admin = site.get_model_admin(Inventory)
+        request = RequestFactory().get(reverse('admin:autocomplete'), {'term': 'Producto'})
+        request.user = self.admin_user
+        request._messages = CookieStorage(request)
+
+        inventory_admin.get_search_results(request, Inventory.objects.all(), 'Producto')
+
+        self.assertEqual(list(request._messages), [])
+
+
+class ApplyMovementTests(SimpleTestCase):
+
+    def replay(self, *movements):
+        state = (Decimal('0'), Decimal('0'), Decimal('0'))
+        for moved, cost in movements:
+            state = apply_movement(*state, Decimal(moved), Decimal(cost))
+        return state
+
+    def test_entries_average_and_exits_keep_the_average(self):
+        self.assertEqual(self.replay(('10', '2.00'), ('10', '3.00')), (Decimal('20'), Decimal('50.0000'), Decimal('2.5000')))
+        # La salida se valora al promedio vigente, no al costo del lote del que salió
+        self.assertEqual(
+            self.replay(('10', '2.00'), ('10', '3.00'), ('-5', '2.00')),
+            (Decimal('15'), Decimal('37.5000'), Decimal('2.5000'))
+        )
+
+    def test_emptying_the_stock_resets_the_value(self):
+        quantity, value, unit_cost = self.replay(('3', '1.00'), ('3', '2.00'), ('-6', '1.00'))
+        self.assertEqual((quantity, value), (Decimal('0'), Decimal('0')))
+        self.assertEqual(self.replay(('3', '1.00'), ('3', '2.00'), ('-6', '1.00'), ('4', '5.00'))[2], Decimal('5.0000'))
+
+
+class AverageCostTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.purchase_type = InventoryMovementType.objects.create(name='PURCHASE', code='PURCHASE', flow='in')
+
+    def move(self, movement_type, quantity, cost):
+        stock = lock_stock([(self.branch.pk, self.product.pk)])
+        record_movements(stock, [Kardex(
+            transaction_id=1, document_number='DOC-1', movement_type=movement_type,
+            branch=self.branch, product=self.product, batch=uuid.uuid4(),
+            quantity=Decimal(quantity), cost=Decimal(cost), created_by=self.user
+        )])
+        save_stock(stock.values())
+
+    def rebuild(self, *args):
+        out = StringIO()
+        call_command('rebuild_average_cost', *args, stdout=out)
+        return out.getvalue()
+
+    def test_incremental_cost_matches_a_full_replay(self):
+        self.move(self.purchase_type, '10', '2.00')
+        self.move(self.purchase_type, '5', '3.50')
+        self.move(self.sale_type, '-8', '2.00')
+
+        cost = AverageCost.objects.get(branch=self.branch, product=self.product)
+        self.assertEqual((cost.quantity, cost.unit_cost, cost.value), (Decimal('7.00'), Decimal('2.5000'), Decimal('17.5000')))
+        self.assertIn("Costos promedio correctos (3 movimientos)", self.rebuild('--verify'))
+
+    def test_rebuild_fixes_a_drifted_cost(self):
+        self.move(self.purchase_type, '10', '2.00')
+        AverageCost.objects.filter(branch=self.branch, product=self.product).update(unit_cost=Decimal('9.0000'))
+
+        self.assertIn("1 costo(s) promedio no coinciden", self.rebuild('--verify'))
+        self.rebuild()
+        self.assertEqual(AverageCost.objects.get(branch=self.branch, product=self.product).unit_cost, Decimal('2.0000'))
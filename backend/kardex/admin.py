@@ -1,14 +1,21 @@
+from datetime import datetime
 from django.contrib import admin
-from kardex.models import Kardex
+from django.http import HttpResponseBadRequest
+from django.urls import path
+from django.utils import timezone
+from kardex.export import kardex_csv_response, kardex_xlsx_response
+from kardex.models import Kardex, KardexArchive
 
 @admin.register(Kardex)
 class KardexAdmin(admin.ModelAdmin):
-    list_display = ('created_at', 'movement_type', 'document_number', 'product', 'branch', 'quantity', 'cost')
+    list_display = ('created_at', 'movement_type', 'document_number', 'product', 'branch', 'quantity', 'cost', 'balance_after')
     
     list_filter = ('branch', 'movement_type', 'created_at', 'product')
     
     search_fields = ('document_number', 'product__name', 'batch', 'transaction_id')
 
+    actions = ['export_csv', 'export_xlsx']
+
     # Kardex solo lectura
     def get_readonly_fields(self, request, obj=None):
         return [f.name for f in self.model._meta.fields]
@@ -20,4 +27,65 @@ class KardexAdmin(admin.ModelAdmin):
         return False  # No actualizar registros manuales
     
     def has_delete_permission(self, request, obj=None):
-        return False  # No borrar
\ No newline at end of file
+        return False  # No borrar
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('export/', self.admin_site.admin_view(self.export_year), name='kardex_export'),
+        ]
+        return custom_urls + urls
+
+    @admin.action(description="Exportar movimientos seleccionados a CSV")
+    def export_csv(self, request, queryset):
+        return kardex_csv_response([queryset], f"kardex_{timezone.localdate():%Y%m%d}.csv")
+
+    @admin.action(description="Exportar movimientos seleccionados a Excel")
+    def export_xlsx(self, request, queryset):
+        return kardex_xlsx_response([queryset], f"kardex_{timezone.localdate():%Y%m%d}.xlsx")
+
+    def export_year(self, request):
+        """
+        Kardex completo de una sucursal y año (?branch=ID&year=AAAA[&format=xlsx]), incluyendo los meses archivados.
+        Por defecto se exporta en CSV.
+        """
+        branch_id = request.GET.get('branch', '')
+        year = request.GET.get('year', '')
+        export_format = request.GET.get('format', 'csv')
+        if not branch_id.isdigit() or not year.isdigit():
+            return HttpResponseBadRequest("Indique la sucursal (branch) y el año (year).")
+        if not 1 <= int(year) < 9999:
+            return HttpResponseBadRequest("El año debe estar entre 1 y 9998.")
+        if export_format not in ('csv', 'xlsx'):
+            return HttpResponseBadRequest("El formato debe ser csv o xlsx.")
+
+        start = timezone.make_aware(datetime(int(year), 1, 1))
+        end = timezone.make_aware(datetime(int(year) + 1, 1, 1))
+        querysets = [
+            model.objects.filter(branch_id=int(branch_id), created_at__gte=start, created_at__lt=end)
+            for model in (KardexArchive, Kardex)
+        ]
+        filename = f"kardex_sucursal{branch_id}_{year}.{export_format}"
+        if export_format == 'xlsx':
+            return kardex_xlsx_response(querysets, filename)
+        return kardex_csv_response(querysets, filename)
+
+@admin.register(KardexArchive)
+class KardexArchiveAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'movement_type', 'document_number', 'product', 'branch', 'quantity', 'cost', 'balance_after')
+    list_filter = ('created_at', 'branch', 'movement_type')
+    search_fields = ('document_number', 'batch', 'transaction_id')
+    list_select_related = ('movement_type', 'product', 'branch')
+
+    # Meses cerrados movidos por manage_kardex_periods, solo lectura
+    def get_readonly_fields(self, request, obj=None):
+        return [f.name for f in self.model._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
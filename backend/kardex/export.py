@@ -0,0 +1,167 @@
+import csv
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from branch.models import Branch
+from inventory_movement_type.models import InventoryMovementType
+from product.models import Product
+from .pagination import CHUNK_SIZE, keyset_rows
+
+HEADER = (
+    'Fecha', 'Tipo de movimiento', 'Documento', 'Sucursal', 'Producto', 'Lote',
+    'Cantidad', 'Costo unitario', 'Saldo', 'Valor del saldo'
+)
+COLUMNS = (
+    'created_at', 'movement_type_id', 'document_number', 'branch_id', 'product_id', 'batch',
+    'quantity', 'cost', 'balance_after', 'value_after'
+)
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Partes fijas de un libro de una sola hoja; la hoja se escribe aparte, fila por fila
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Kardex" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_END = '</sheetData></worksheet>'
+# Caracteres de control que XML no admite
+INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class Echo:
+    """Buffer mínimo para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, value):
+        return value
+
+
+class ZipStream:
+    """Destino sin seek para zipfile: junta los bytes comprimidos hasta que la respuesta los pide."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _records(querysets):
+    # Catálogos pequeños en memoria: cada fila del Kardex se resuelve sin consultas extra
+    movement_types = dict(InventoryMovementType.objects.values_list('id', 'name'))
+    branches = dict(Branch.objects.values_list('id', 'name'))
+    products = dict(Product.objects.values_list('id', 'name'))
+
+    for queryset in querysets:
+        for created_at, movement_type_id, document_number, branch_id, product_id, batch, quantity, cost, balance, value in (
+            keyset_rows(queryset, COLUMNS, CHUNK_SIZE)
+        ):
+            yield (
+                timezone.localtime(created_at).strftime('%d/%m/%Y %H:%M'),
+                movement_types.get(movement_type_id, ''),
+                document_number,
+                branches.get(branch_id, ''),
+                products.get(product_id, ''),
+                batch,
+                quantity,
+                cost,
+                balance,
+                value,
+            )
+
+
+def _csv_rows(querysets):
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow(HEADER)
+    for record in _records(querysets):
+        yield writer.writerow(record)
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if isinstance(value, Decimal):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            text = escape(INVALID_XML.sub('', str(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f"<row>{''.join(cells)}</row>".encode('utf-8')
+
+
+def _xlsx_chunks(querysets):
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in XLSX_PARTS.items():
+            workbook.writestr(name, content)
+        # El tamaño de la hoja no se conoce de antemano: zip64 evita el límite de 4 GB
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(SHEET_START.encode('utf-8'))
+            sheet.write(_xlsx_row(HEADER))
+            for record in _records(querysets):
+                sheet.write(_xlsx_row(record))
+                data = stream.drain()
+                if data:
+                    yield data
+            sheet.write(SHEET_END.encode('utf-8'))
+    yield stream.drain()
+
+
+def kardex_csv_response(querysets, filename):
+    """
+    Exporta a CSV uno o varios querysets del Kardex (vivo y archivado), en orden, fila por fila.
+    Se leen páginas de CHUNK_SIZE movimientos, así que la memoria usada no depende del total.
+    """
+    response = StreamingHttpResponse(_csv_rows(querysets), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def kardex_xlsx_response(querysets, filename):
+    """Igual que kardex_csv_response, pero como libro de Excel comprimido a medida que se genera."""
+    response = StreamingHttpResponse(_xlsx_chunks(querysets), content_type=XLSX_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
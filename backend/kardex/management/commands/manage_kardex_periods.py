@@ -0,0 +1,100 @@
+from datetime import date, datetime, time, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Min
+from django.utils import timezone
+from kardex.models import Kardex, KardexArchive
+
+
+# created_at se guarda en UTC y las particiones comparan TO_DAYS sobre ese valor:
+# los meses del archivo son meses UTC, no de la hora local.
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def utc_month(moment):
+    """Primer día del mes UTC al que pertenece el instante."""
+    return moment.astimezone(dt_timezone.utc).date().replace(day=1)
+
+
+def month_start(month):
+    """Instante en que empieza el mes UTC; coincide con el límite de su partición."""
+    return datetime.combine(month, time.min, tzinfo=dt_timezone.utc)
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea por adelantado las particiones mensuales de kardex_archive y mueve allí los movimientos "
+        "de los meses cerrados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3, help="Meses futuros con partición creada de antemano.")
+        parser.add_argument(
+            '--archive-older-than', type=int, metavar='MESES',
+            help="Archiva los movimientos anteriores a este número de meses cerrados."
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help="Movimientos archivados por transacción.")
+
+    def handle(self, *args, **options):
+        current_month = utc_month(timezone.now())
+
+        if connection.vendor == 'mysql':
+            self.create_partitions(add_months(current_month, options['ahead']))
+        else:
+            self.stdout.write(self.style.WARNING("El particionado solo aplica en MySQL; se omite la creación de particiones."))
+
+        if options['archive_older_than'] is not None:
+            if options['archive_older_than'] < 1:
+                raise CommandError("--archive-older-than debe ser al menos 1; el mes en curso no se archiva.")
+            cutoff_month = add_months(current_month, -options['archive_older_than'])
+            archived = self.archive_before(month_start(cutoff_month), options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"{archived} movimiento(s) anteriores a {cutoff_month:%m/%Y} (UTC) archivados."))
+
+    def create_partitions(self, last_month):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME <> 'pmax'",
+                [KardexArchive._meta.db_table]
+            )
+            existing = sorted(row[0] for row in cursor.fetchall())
+
+            if existing:
+                month = add_months(datetime.strptime(existing[-1], 'p%Y%m').date(), 1)
+            else:
+                # Primera vez: una partición por cada mes con movimientos
+                first = Kardex.objects.aggregate(first=Min('created_at'))['first']
+                month = utc_month(first or timezone.now())
+
+            partitions = []
+            while month <= last_month:
+                partitions.append(
+                    f"PARTITION p{month:%Y%m} VALUES LESS THAN (TO_DAYS('{add_months(month, 1):%Y-%m-%d}'))"
+                )
+                month = add_months(month, 1)
+            if not partitions:
+                self.stdout.write("Las particiones ya están creadas.")
+                return
+
+            cursor.execute(
+                f"ALTER TABLE {KardexArchive._meta.db_table} REORGANIZE PARTITION pmax INTO "
+                f"({', '.join(partitions)}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(partitions)} partición(es) mensual(es) creadas."))
+
+    def archive_before(self, cutoff, batch_size):
+        archived = 0
+        while True:
+            with transaction.atomic():
+                movements = list(
+                    Kardex.objects.select_for_update().filter(created_at__lt=cutoff).order_by('id')[:batch_size]
+                )
+                if not movements:
+                    break
+                KardexArchive.objects.bulk_create([KardexArchive.from_movement(movement) for movement in movements])
+                Kardex.objects.filter(id__in=[movement.pk for movement in movements]).delete()
+            archived += len(movements)
+        return archived
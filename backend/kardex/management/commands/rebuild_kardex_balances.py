@@ -0,0 +1,96 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from inventory.models import InventoryStock
+from kardex.models import Kardex, KardexArchive
+from kardex.pagination import keyset_rows
+
+CHUNK_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = "Recalcula (o verifica con --verify) el saldo acumulado de cada movimiento del Kardex."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help="Solo reporta diferencias, no modifica nada.")
+        parser.add_argument('--branch', type=int, help="Limitar a una sucursal (ID).")
+
+    def handle(self, *args, **options):
+        branch_id = options['branch']
+        verify = options['verify']
+
+        with transaction.atomic():
+            # Bloquear las existencias detiene a los escritores del Kardex mientras se recalcula
+            stock_rows = InventoryStock.objects.select_for_update().order_by('branch_id', 'product_id')
+            movements = Kardex.objects.all()
+            if branch_id:
+                stock_rows = stock_rows.filter(branch_id=branch_id)
+                movements = movements.filter(branch_id=branch_id)
+            stock = {(row.branch_id, row.product_id): row for row in stock_rows}
+
+            # Los meses archivados ya están cerrados: su último saldo es el saldo inicial del Kardex vivo
+            archived = KardexArchive.objects.all()
+            if branch_id:
+                archived = archived.filter(branch_id=branch_id)
+            last_ids = archived.values('branch_id', 'product_id').annotate(last_id=Max('id')).values_list('last_id', flat=True)
+            totals = {
+                (row_branch, product_id): (balance_after, value_after)
+                for row_branch, product_id, balance_after, value_after in KardexArchive.objects.filter(
+                    id__in=list(last_ids)
+                ).values_list('branch_id', 'product_id', 'balance_after', 'value_after')
+            }
+            pending = []
+            wrong_rows = 0
+            # Orden cronológico global, por páginas: los saldos se acumulan por sucursal y producto en `totals`
+            columns = ('id', 'branch_id', 'product_id', 'quantity', 'cost', 'balance_after', 'value_after')
+            for pk, row_branch, product_id, quantity, cost, balance_after, value_after in keyset_rows(movements, columns, CHUNK_SIZE):
+                balance, value = totals.get((row_branch, product_id), (Decimal('0.00'), Decimal('0.00')))
+                balance += quantity
+                value += Kardex.movement_value(quantity, cost)
+                totals[(row_branch, product_id)] = (balance, value)
+
+                if (balance_after, value_after) == (balance, value):
+                    continue
+                wrong_rows += 1
+                if not verify:
+                    pending.append(Kardex(id=pk, balance_after=balance, value_after=value))
+                    if len(pending) >= CHUNK_SIZE:
+                        Kardex.objects.bulk_update(pending, ['balance_after', 'value_after'])
+                        pending = []
+            if pending:
+                Kardex.objects.bulk_update(pending, ['balance_after', 'value_after'])
+
+            to_update = []
+            to_create = []
+            for pair in stock.keys() | totals.keys():
+                balance, value = totals.get(pair, (Decimal('0.00'), Decimal('0.00')))
+                row = stock.get(pair)
+                if row is None:
+                    row = InventoryStock(branch_id=pair[0], product_id=pair[1])
+                    to_create.append(row)
+                elif (row.kardex_balance, row.kardex_value) == (balance, value):
+                    continue
+                else:
+                    to_update.append(row)
+                self.stdout.write(
+                    f"Sucursal {pair[0]}, producto {pair[1]}: registrado {row.kardex_balance} (${row.kardex_value}), "
+                    f"calculado {balance} (${value})."
+                )
+                row.kardex_balance, row.kardex_value = balance, value
+
+            differences = len(to_update) + len(to_create)
+            if verify:
+                if wrong_rows or differences:
+                    self.stdout.write(self.style.ERROR(
+                        f"{wrong_rows} movimiento(s) y {differences} existencia(s) con saldo de Kardex incorrecto."
+                    ))
+                else:
+                    self.stdout.write(self.style.SUCCESS("Los saldos del Kardex son correctos."))
+                return
+
+            InventoryStock.objects.bulk_create(to_create, batch_size=1000)
+            InventoryStock.objects.bulk_update(to_update, ['kardex_balance', 'kardex_value'], batch_size=1000)
+            self.stdout.write(self.style.SUCCESS(
+                f"Saldos del Kardex reconstruidos: {wrong_rows} movimiento(s) y {differences} existencia(s) corregidos."
+            ))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 10:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_inventory_archive'),
+        ('kardex', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kardex',
+            name='archived_entry',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='kardex_movements', to='inventory.inventoryarchive', verbose_name='número de entrada (archivado)'),
+        ),
+        migrations.AlterField(
+            model_name='kardex',
+            name='inventory_entry',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='kardex_movements', to='inventory.inventory', verbose_name='número de entrada (origen)'),
+        ),
+    ]
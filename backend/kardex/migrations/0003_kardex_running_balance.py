@@ -0,0 +1,72 @@
+# Generated by Django 5.2 on 2026-10-18 10:50
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+CHUNK_SIZE = 2000
+
+
+def backfill_balances(apps, schema_editor):
+    Kardex = apps.get_model('kardex', 'Kardex')
+    InventoryStock = apps.get_model('inventory', 'InventoryStock')
+
+    totals = {}
+    pending = []
+    movements = Kardex.objects.order_by('created_at', 'id').values_list(
+        'created_at', 'id', 'branch_id', 'product_id', 'quantity', 'cost'
+    )
+    # Páginas por clave (created_at, id): con mysqlclient .iterator() cargaría toda la tabla en memoria
+    rows = list(movements[:CHUNK_SIZE])
+    while rows:
+        for created_at, pk, branch_id, product_id, quantity, cost in rows:
+            balance, value = totals.get((branch_id, product_id), (Decimal('0.00'), Decimal('0.00')))
+            balance += quantity
+            value += (quantity * cost).quantize(Decimal('0.01'))
+            totals[(branch_id, product_id)] = (balance, value)
+            pending.append(Kardex(id=pk, balance_after=balance, value_after=value))
+        Kardex.objects.bulk_update(pending, ['balance_after', 'value_after'])
+        pending = []
+        created_at, pk = rows[-1][:2]
+        rows = list(movements.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))[:CHUNK_SIZE])
+
+    stock = {(row.branch_id, row.product_id): row for row in InventoryStock.objects.all()}
+    missing = []
+    for (branch_id, product_id), (balance, value) in totals.items():
+        row = stock.get((branch_id, product_id))
+        if row is None:
+            missing.append(InventoryStock(branch_id=branch_id, product_id=product_id, kardex_balance=balance, kardex_value=value))
+        else:
+            row.kardex_balance, row.kardex_value = balance, value
+    InventoryStock.objects.bulk_create(missing, batch_size=1000)
+    InventoryStock.objects.bulk_update(list(stock.values()), ['kardex_balance', 'kardex_value'], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('inventory', '0007_inventorystock_kardex_balance'),
+        ('inventory_movement_type', '0001_initial'),
+        ('kardex', '0002_kardex_archived_entry'),
+        ('product', '0003_alter_product_subcategory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kardex',
+            name='balance_after',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='saldo'),
+        ),
+        migrations.AddField(
+            model_name='kardex',
+            name='value_after',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='valor del saldo'),
+        ),
+        migrations.AddIndex(
+            model_name='kardex',
+            index=models.Index(fields=['branch', 'product', 'created_at'], name='kardex_stream_idx'),
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
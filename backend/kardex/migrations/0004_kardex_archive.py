@@ -0,0 +1,90 @@
+# Generated by Django 5.2 on 2026-10-18 10:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def partition_archive(apps, schema_editor):
+    # Particionado por rango de meses y compresión solo en MySQL; la llave primaria debe incluir la columna de partición
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        "ALTER TABLE kardex_archive DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at), ROW_FORMAT=COMPRESSED"
+    )
+    schema_editor.execute(
+        "ALTER TABLE kardex_archive PARTITION BY RANGE (TO_DAYS(created_at)) "
+        "(PARTITION pmax VALUES LESS THAN MAXVALUE)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('inventory', '0007_inventorystock_kardex_balance'),
+        ('inventory_movement_type', '0001_initial'),
+        ('kardex', '0003_kardex_running_balance'),
+        ('product', '0003_alter_product_subcategory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KardexArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.PositiveIntegerField(verbose_name='ID de registro (origen)')),
+                ('document_number', models.CharField(max_length=100, verbose_name='número de documento')),
+                ('lot_id', models.BigIntegerField(blank=True, null=True, verbose_name='número de entrada (origen)')),
+                ('batch', models.UUIDField(verbose_name='lote (batch)')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='cantidad movida')),
+                ('cost', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='costo unitario')),
+                ('balance_after', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='saldo')),
+                ('value_after', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='valor del saldo')),
+                ('created_at', models.DateTimeField(verbose_name='fecha de ingreso')),
+                ('updated_at', models.DateTimeField(verbose_name='última actualización')),
+                ('active', models.BooleanField(default=True, verbose_name='activo')),
+            ],
+            options={
+                'verbose_name': 'Kardex Archivado',
+                'verbose_name_plural': 'Kardex Archivado',
+                'db_table': 'kardex_archive',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='kardex',
+            index=models.Index(fields=['created_at'], name='kardex_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='kardexarchive',
+            name='branch',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='branch.branch', verbose_name='sucursal'),
+        ),
+        migrations.AddField(
+            model_name='kardexarchive',
+            name='created_by',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='creado por'),
+        ),
+        migrations.AddField(
+            model_name='kardexarchive',
+            name='modified_by',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='modificado por'),
+        ),
+        migrations.AddField(
+            model_name='kardexarchive',
+            name='movement_type',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='inventory_movement_type.inventorymovementtype', verbose_name='tipo de movimiento'),
+        ),
+        migrations.AddField(
+            model_name='kardexarchive',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='product.product', verbose_name='producto'),
+        ),
+        migrations.AddIndex(
+            model_name='kardexarchive',
+            index=models.Index(fields=['branch', 'product', 'created_at'], name='kardex_archive_stream_idx'),
+        ),
+        migrations.RunPython(partition_archive, migrations.RunPython.noop),
+    ]
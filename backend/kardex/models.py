@@ -1,9 +1,10 @@
+from decimal import Decimal
 from django.conf import settings
 from django.db import models
 from branch.models import Branch
 from product.models import Product
 from inventory_movement_type.models import InventoryMovementType
-from inventory.models import Inventory
+from inventory.models import Inventory, InventoryArchive
 
 class Kardex(models.Model):
     # Registro origen (Compra ID, Venta ID, etc.)
@@ -20,9 +21,20 @@ class Kardex(models.Model):
     inventory_entry = models.ForeignKey(
         Inventory, 
         on_delete=models.PROTECT, 
+        null=True,
+        blank=True,
         related_name='kardex_movements',
         verbose_name="número de entrada (origen)"
     )
+    # Al archivar un lote agotado, el movimiento pasa a apuntar a su copia en el archivo (mismo ID)
+    archived_entry = models.ForeignKey(
+        InventoryArchive,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='kardex_movements',
+        verbose_name="número de entrada (archivado)"
+    )
     branch = models.ForeignKey(Branch, on_delete=models.PROTECT, verbose_name="sucursal")
     product = models.ForeignKey(Product, on_delete=models.PROTECT, verbose_name="producto")
     batch = models.UUIDField(verbose_name="lote (batch)")
@@ -33,6 +45,9 @@ class Kardex(models.Model):
         help_text="Positiva si entra, negativa si sale (visual)."
     )
     cost = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="costo unitario")
+    # Saldo acumulado de la sucursal y producto después de este movimiento
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="saldo")
+    value_after = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="valor del saldo")
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="fecha de ingreso")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="última actualización")
@@ -45,6 +60,80 @@ class Kardex(models.Model):
         verbose_name = 'Kardex'
         verbose_name_plural = 'Kardex'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['branch', 'product', 'created_at'], name='kardex_stream_idx'),
+            models.Index(fields=['created_at'], name='kardex_created_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.created_at.strftime('%d/%m/%Y')} - {self.movement_type.name} - {self.product.name}"
\ No newline at end of file
+        return f"{self.created_at.strftime('%d/%m/%Y')} - {self.movement_type.name} - {self.product.name}"
+
+    @staticmethod
+    def movement_value(quantity, cost):
+        return (quantity * cost).quantize(Decimal('0.01'))
+
+    @classmethod
+    def balance_at(cls, branch_id, product_id, moment):
+        """Saldo y valor de la sucursal y producto a la fecha indicada, leyendo solo el último movimiento previo."""
+        for model in (cls, KardexArchive):
+            last = model.objects.filter(
+                branch_id=branch_id, product_id=product_id, created_at__lte=moment
+            ).order_by('-created_at', '-id').values_list('balance_after', 'value_after').first()
+            if last:
+                return last
+        return (Decimal('0.00'), Decimal('0.00'))
+
+    @property
+    def lot(self):
+        """Lote de origen, esté en el inventario vivo o en el archivo."""
+        return self.inventory_entry or self.archived_entry
+
+
+class KardexArchive(models.Model):
+    """
+    Movimientos de meses cerrados, movidos desde el Kardex por manage_kardex_periods.
+    En MySQL la tabla va comprimida y particionada por mes de created_at, por eso sus
+    relaciones no crean llaves foráneas en la base de datos.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    transaction_id = models.PositiveIntegerField(verbose_name="ID de registro (origen)")
+    document_number = models.CharField(max_length=100, verbose_name="número de documento")
+    movement_type = models.ForeignKey(InventoryMovementType, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', verbose_name="tipo de movimiento")
+    # ID del lote; se conserva al archivar, así que resuelve tanto en Inventory como en InventoryArchive
+    lot_id = models.BigIntegerField(null=True, blank=True, verbose_name="número de entrada (origen)")
+    branch = models.ForeignKey(Branch, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', verbose_name="sucursal")
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', verbose_name="producto")
+    batch = models.UUIDField(verbose_name="lote (batch)")
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="cantidad movida")
+    cost = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="costo unitario")
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="saldo")
+    value_after = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="valor del saldo")
+
+    created_at = models.DateTimeField(verbose_name="fecha de ingreso")
+    updated_at = models.DateTimeField(verbose_name="última actualización")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+', verbose_name="creado por")
+    modified_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+', verbose_name="modificado por")
+    active = models.BooleanField(default=True, verbose_name="activo")
+
+    ARCHIVED_FIELDS = (
+        'id', 'transaction_id', 'document_number', 'movement_type_id', 'branch_id', 'product_id', 'batch', 'quantity',
+        'cost', 'balance_after', 'value_after', 'created_at', 'updated_at', 'created_by_id', 'modified_by_id', 'active'
+    )
+
+    class Meta:
+        db_table = 'kardex_archive'
+        verbose_name = 'Kardex Archivado'
+        verbose_name_plural = 'Kardex Archivado'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['branch', 'product', 'created_at'], name='kardex_archive_stream_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.created_at.strftime('%d/%m/%Y')} - {self.movement_type.name} - {self.product.name} (archivado)"
+
+    @classmethod
+    def from_movement(cls, movement):
+        archived = cls(**{field: getattr(movement, field) for field in cls.ARCHIVED_FIELDS})
+        archived.lot_id = movement.inventory_entry_id or movement.archived_entry_id
+        return archived
@@ -0,0 +1,28 @@
+from django.db.models import Q
+
+CHUNK_SIZE = 2000
+
+
+def keyset_rows(queryset, fields, chunk_size=CHUNK_SIZE):
+    """
+    Recorre `queryset.values_list(*fields)` en orden (created_at, id) por páginas de `chunk_size`,
+    filtrando cada página a partir de la última clave leída.
+
+    Sustituye a .iterator(): con MySQL/mysqlclient no hay cursores del lado del servidor y el
+    resultado completo quedaría en memoria; así solo se mantiene una página a la vez.
+    """
+    fields = tuple(fields)
+    columns = fields + tuple(key for key in ('created_at', 'id') if key not in fields)
+    created_at, pk = columns.index('created_at'), columns.index('id')
+    queryset = queryset.order_by('created_at', 'id').values_list(*columns)
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            page = page.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+        rows = list(page[:chunk_size])
+        for row in rows:
+            yield row[:len(fields)]
+        if len(rows) < chunk_size:
+            return
+        last = (rows[-1][created_at], rows[-1][pk])
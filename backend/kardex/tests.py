@@ -1,3 +1,161 @@
+import io
+import uuid
+import zipfile
+from xml.etree import ElementTree
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from branch.models import Branch
+from category.models import Category
+from inventory.models import InventoryStock
+from inventory.services import lock_stock, record_movements, save_stock
+from inventory_movement_type.models import InventoryMovementType
+from product.models import Product
+from subcategory.models import Subcategory
+from unit_of_measure.models import UnitOfMeasure
+from .models import Kardex, KardexArchive
+
+
+class KardexTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('bodega', password='x')
+        self.purchase = InventoryMovementType.objects.create(name='PURCHASE', code='PURCHASE', flow='in')
+        self.sale = InventoryMovementType.objects.create(name='SALE', code='SALE', flow='out')
+        category = Category.objects.create(name='Pruebas')
+        subcategory = Subcategory.objects.create(name='Kardex', category=category)
+        unit = UnitOfMeasure.objects.create(name='Unidad', type='Conteo')
+        self.product = Product.objects.create(
+            sku='KDX-1', name='Producto', size='U', presentation='Unidad',
+            category=category, subcategory=subcategory, purchase_unit=unit, sale_unit=unit
+        )
+        self.branch = Branch.objects.create(name='Central', address='-', municipality='San Salvador')
+
+    def move(self, movement_type, quantity, cost):
+        """Registra un movimiento como lo hacen las ventas y compras: con las existencias bloqueadas."""
+        stock = lock_stock([(self.branch.pk, self.product.pk)])
+        record_movements(stock, [Kardex(
+            transaction_id=1, document_number='DOC-1', movement_type=movement_type,
+            branch=self.branch, product=self.product, batch=uuid.uuid4(),
+            quantity=Decimal(quantity), cost=Decimal(cost), created_by=self.user
+        )])
+        save_stock(stock.values())
+        # MySQL no devuelve el ID del bulk_create
+        return Kardex.objects.order_by('-id').first()
+
+
+class RunningBalanceTests(KardexTestCase):
+
+    def rebuild(self, *args):
+        out = StringIO()
+        call_command('rebuild_kardex_balances', *args, stdout=out)
+        return out.getvalue()
+
+    def test_each_movement_carries_the_balance_after_it(self):
+        rows = [
+            self.move(self.purchase, '10', '2.00'),
+            self.move(self.purchase, '5', '3.00'),
+            self.move(self.sale, '-4', '2.00'),
+        ]
+
+        self.assertEqual(
+            [(row.balance_after, row.value_after) for row in rows],
+            [(Decimal('10.00'), Decimal('20.00')), (Decimal('15.00'), Decimal('35.00')), (Decimal('11.00'), Decimal('27.00'))]
+        )
+        stock = InventoryStock.objects.get(branch=self.branch, product=self.product)
+        self.assertEqual((stock.kardex_balance, stock.kardex_value), (Decimal('11.00'), Decimal('27.00')))
+        self.assertIn("Los saldos del Kardex son correctos", self.rebuild('--verify'))
+
+    def test_balance_at_reads_the_last_movement_before_the_moment(self):
+        first = self.move(self.purchase, '10', '2.00')
+        second = self.move(self.sale, '-3', '2.00')
+        Kardex.objects.filter(pk=first.pk).update(created_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(
+            Kardex.balance_at(self.branch.pk, self.product.pk, timezone.now() - timedelta(days=1)),
+            (Decimal('10.00'), Decimal('20.00'))
+        )
+        self.assertEqual(Kardex.balance_at(self.branch.pk, self.product.pk, second.created_at), (Decimal('7.00'), Decimal('14.00')))
+        self.assertEqual(
+            Kardex.balance_at(self.branch.pk, self.product.pk, timezone.now() - timedelta(days=3)),
+            (Decimal('0.00'), Decimal('0.00'))
+        )
+
+    def test_rebuild_fixes_wrong_balances(self):
+        self.move(self.purchase, '10', '2.00')
+        last = self.move(self.sale, '-4', '2.00')
+        Kardex.objects.filter(pk=last.pk).update(balance_after=Decimal('99.00'))
+        InventoryStock.objects.filter(branch=self.branch, product=self.product).update(kardex_balance=Decimal('99.00'))
+
+        self.assertIn("1 movimiento(s) y 1 existencia(s) con saldo de Kardex incorrecto", self.rebuild('--verify'))
+
+        self.rebuild()
+        last.refresh_from_db()
+        stock = InventoryStock.objects.get(branch=self.branch, product=self.product)
+        self.assertEqual((last.balance_after, last.value_after), (Decimal('6.00'), Decimal('12.00')))
+        self.assertEqual(stock.kardex_balance, Decimal('6.00'))
+        self.assertIn("Los saldos del Kardex son correctos", self.rebuild('--verify'))
+
+
+class KardexPeriodTests(KardexTestCase):
+
+    def test_archive_cutoff_follows_utc_months(self):
+        # 31/01 a las 17:00 en El Salvador sigue siendo enero en UTC; a las 20:00 ya es 1 de febrero UTC
+        january = self.move(self.purchase, '10', '2.00')
+        february = self.move(self.sale, '-1', '2.00')
+        Kardex.objects.filter(pk=january.pk).update(created_at=datetime(2026, 1, 31, 23, 0, tzinfo=dt_timezone.utc))
+        Kardex.objects.filter(pk=february.pk).update(created_at=datetime(2026, 2, 1, 2, 0, tzinfo=dt_timezone.utc))
+
+        now = datetime(2026, 3, 1, 3, 0, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            call_command('manage_kardex_periods', '--archive-older-than', '1', stdout=StringIO())
+
+        self.assertEqual(list(KardexArchive.objects.values_list('id', flat=True)), [january.pk])
+        self.assertEqual(list(Kardex.objects.values_list('id', flat=True)), [february.pk])
+
+
+class KardexExportTests(KardexTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        self.move(self.purchase, '10', '2.00')
+        self.move(self.sale, '-4', '2.00')
+
+    def export(self, **params):
+        return self.client.get(reverse('admin:kardex_export'), {'branch': self.branch.pk, 'year': timezone.localdate().year, **params})
+
+    def test_csv_export(self):
+        response = self.export()
+
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].endswith(',10.00,2.00,10.00,20.00'))
+        self.assertTrue(lines[2].endswith(',-4.00,2.00,6.00,12.00'))
+
+    def test_xlsx_export(self):
+        response = self.export(format='xlsx')
+
+        workbook = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(workbook.testzip())
+        namespace = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        sheet = ElementTree.fromstring(workbook.read('xl/worksheets/sheet1.xml'))
+        rows = [
+            [cell.findtext('x:v', namespaces=namespace) or cell.findtext('x:is/x:t', namespaces=namespace) for cell in row]
+            for row in sheet.iterfind('x:sheetData/x:row', namespace)
+        ]
+        self.assertEqual(rows[0][0], 'Fecha')
+        self.assertEqual([row[6:] for row in rows[1:]], [['10.00', '2.00', '10.00', '20.00'], ['-4.00', '2.00', '6.00', '12.00']])
+        self.assertEqual(rows[1][4], 'Producto')
+
+    def test_rejects_invalid_parameters(self):
+        for params in ({'year': '0'}, {'year': '99999'}, {'year': 'abc'}, {'format': 'pdf'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.export(**params).status_code, 400)
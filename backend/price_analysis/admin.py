@@ -1,7 +1,11 @@
 from django.contrib import admin
+from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
 from .models import PriceAnalysis
 from price_analysis_detail.models import PriceAnalysisDetail
-from price_history.models import PriceHistory
+from price_history.services import publish_prices
 from proration.models import Proration
 
 class PriceAnalysisDetailInline(admin.TabularInline):
@@ -90,16 +94,14 @@ class PriceAnalysisAdmin(admin.ModelAdmin):
     
     @admin.action(description="Aprobar y generar precios en el historial")
     def approve_and_generate_prices(self, request, queryset):
-        for analysis in queryset:
-            analysis.is_approved = True
-            analysis.modified_by = request.user
-            analysis.save()
-            for detail in analysis.details.all():
-                PriceHistory.objects.create(
-                    analysis_detail=detail,
-                    product=detail.product,
-                    sale_price=detail.sale_price,
-                    created_by=request.user,
-                    modified_by=request.user
+        details = PriceAnalysisDetail.objects.filter(analysis__in=queryset).order_by('analysis__date', 'analysis_id', 'id')
+        try:
+            with transaction.atomic():
+                prices = publish_prices(
+                    [(detail, detail.product_id, detail.sale_price) for detail in details], request.user
                 )
-        self.message_user(request, "Los precios han sido aprobados y generados en el historial exitosamente.")
\ No newline at end of file
+                queryset.update(is_approved=True, modified_by=request.user, updated_at=timezone.now())
+        except ValidationError as e:
+            self.message_user(request, e.message, level=messages.ERROR)
+            return
+        self.message_user(request, f"Los precios han sido aprobados y generados en el historial exitosamente ({len(prices)} producto(s)).")
\ No newline at end of file
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from document_sequence.services import next_code
 from django.utils import timezone
 from proration.models import Proration
 from django.conf import settings
@@ -23,11 +24,10 @@ class PriceAnalysis(models.Model):
     def save(self, *args, **kwargs):
         if not self.pk:
             self.invoice_number = self.proration.purchase.invoice_number
+        with transaction.atomic():
+            if not self.code:
+                self.code = next_code('ANL', self.date, model=PriceAnalysis)
             super().save(*args, **kwargs)
-            date_str = self.date.strftime('%Y%m%d')
-            self.code = f"ANL-{date_str}-{self.pk:05d}"
-            kwargs['force_insert'] = False
-        super().save(*args, **kwargs)
 
     class Meta:
         verbose_name = "Análisis de Precio"
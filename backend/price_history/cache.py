@@ -0,0 +1,56 @@
+from decimal import Decimal
+from django.core.cache import cache
+from inventory.cache import bump_versions, get_versions
+
+PRICE_VERSION_KEY = 'price_history:prices'
+PRICE_CACHE_TIMEOUT = 60 * 60
+# Marca en la caché compartida de "sin precio activo", para no volver a consultarlo
+NO_PRICE = ''
+
+# Copia en memoria del proceso; se descarta cuando cambia la versión, que se lee de la base
+_local = {'version': None, 'prices': {}}
+
+
+def price_version():
+    """Versión de los precios activos (compartida por todos los procesos); cambia con cada publicación confirmada."""
+    return get_versions(PRICE_VERSION_KEY)[0]
+
+
+def touch_prices():
+    """Invalida los precios cacheados en todos los procesos una vez confirmada la transacción en curso."""
+    bump_versions([PRICE_VERSION_KEY])
+
+
+def active_prices(product_ids):
+    """
+    Precio activo de cada producto: {producto_id: Decimal}; los que no tienen precio activo no aparecen.
+    Se busca primero en memoria del proceso, luego en la caché compartida y, para lo que falte,
+    con una sola consulta.
+    """
+    from .models import PriceHistory
+
+    version = price_version()
+    if _local['version'] != version:
+        _local['version'], _local['prices'] = version, {}
+    local = _local['prices']
+
+    product_ids = set(product_ids)
+    missing = product_ids - local.keys()
+    if missing:
+        keys = {f"price_history:active:{version}:{product_id}": product_id for product_id in missing}
+        for key, price in cache.get_many(keys).items():
+            local[keys[key]] = price
+        missing = product_ids - local.keys()
+
+    if missing:
+        found = dict(
+            PriceHistory.objects.filter(active_product_id__in=missing).values_list('active_product_id', 'sale_price')
+        )
+        fetched = {product_id: str(found[product_id]) if product_id in found else NO_PRICE for product_id in missing}
+        cache.set_many(
+            {f"price_history:active:{version}:{product_id}": price for product_id, price in fetched.items()},
+            PRICE_CACHE_TIMEOUT
+        )
+        local.update(fetched)
+
+    return {product_id: Decimal(local[product_id]) for product_id in product_ids if local[product_id] != NO_PRICE}
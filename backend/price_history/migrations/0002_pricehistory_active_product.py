@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 11:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_active_prices(apps, schema_editor):
+    PriceHistory = apps.get_model('price_history', 'PriceHistory')
+    keep = {}
+    # Si un producto quedó con varios precios activos, se conserva el más reciente
+    active = PriceHistory.objects.filter(is_active=True).order_by('-start_date', '-id').values_list('pk', 'product_id')
+    for price_id, product_id in active:
+        keep.setdefault(product_id, price_id)
+    PriceHistory.objects.filter(is_active=True).exclude(pk__in=keep.values()).update(is_active=False)
+    rows = [PriceHistory(pk=price_id, active_product_id=product_id) for product_id, price_id in keep.items()]
+    PriceHistory.objects.bulk_update(rows, ['active_product'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('price_history', '0001_initial'),
+        ('product', '0004_product_unit_weight_kg'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricehistory',
+            name='active_product',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='active_price', to='product.product', verbose_name='Producto (precio activo)'),
+        ),
+        migrations.RunPython(mark_active_prices, migrations.RunPython.noop),
+    ]
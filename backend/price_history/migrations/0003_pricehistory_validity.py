@@ -0,0 +1,66 @@
+# Generated by Django 5.2 on 2026-10-18 11:11
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+CHUNK_SIZE = 2000
+
+
+def fill_validity(apps, schema_editor):
+    PriceHistory = apps.get_model('price_history', 'PriceHistory')
+    PriceHistory.objects.update(valid_from=models.F('start_date'))
+    rows = []
+    previous = None
+    # Cada precio vale hasta que empieza el siguiente del mismo producto; el último inactivo, hasta su desactivación
+    history = PriceHistory.objects.order_by('product_id', 'start_date', 'id')\
+        .values_list('pk', 'product_id', 'start_date', 'is_active', 'updated_at')
+    # Páginas por clave (producto, fecha, id): con mysqlclient .iterator() cargaría toda la tabla en memoria
+    page = list(history[:CHUNK_SIZE])
+    while page:
+        for price_id, product_id, start_date, is_active, updated_at in page:
+            if previous and previous[1] == product_id:
+                rows.append(PriceHistory(pk=previous[0], valid_to=start_date))
+            elif previous and not previous[3]:
+                rows.append(PriceHistory(pk=previous[0], valid_to=previous[4]))
+            previous = (price_id, product_id, start_date, is_active, updated_at)
+        PriceHistory.objects.bulk_update(rows, ['valid_to'], batch_size=1000)
+        rows = []
+        price_id, product_id, start_date = page[-1][:3]
+        page = list(history.filter(
+            Q(product_id__gt=product_id)
+            | Q(product_id=product_id, start_date__gt=start_date)
+            | Q(product_id=product_id, start_date=start_date, id__gt=price_id)
+        )[:CHUNK_SIZE])
+    if previous and not previous[3]:
+        rows.append(PriceHistory(pk=previous[0], valid_to=previous[4]))
+    PriceHistory.objects.bulk_update(rows, ['valid_to'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('price_analysis_detail', '0001_initial'),
+        ('price_history', '0002_pricehistory_active_product'),
+        ('product', '0004_product_unit_weight_kg'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricehistory',
+            name='valid_from',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Vigente Desde'),
+        ),
+        migrations.AddField(
+            model_name='pricehistory',
+            name='valid_to',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Vigente Hasta'),
+        ),
+        migrations.RunPython(fill_validity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pricehistory',
+            index=models.Index(fields=['product', 'valid_from', 'valid_to'], name='price_history_interval_idx'),
+        ),
+    ]
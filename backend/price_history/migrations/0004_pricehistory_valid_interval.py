@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 11:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def close_empty_intervals(apps, schema_editor):
+    PriceHistory = apps.get_model('price_history', 'PriceHistory')
+    # Precios inactivos con fecha futura se cerraron antes de abrir: su intervalo queda vacío
+    PriceHistory.objects.filter(valid_to__lt=models.F('valid_from')).update(valid_to=models.F('valid_from'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('price_analysis_detail', '0001_initial'),
+        ('price_history', '0003_pricehistory_validity'),
+        ('product', '0004_product_unit_weight_kg'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(close_empty_intervals, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='pricehistory',
+            constraint=models.CheckConstraint(condition=models.Q(('valid_to__isnull', True), ('valid_to__gte', models.F('valid_from')), _connector='OR'), name='price_history_valid_interval'),
+        ),
+    ]
@@ -1,15 +1,28 @@
-from django.db import models
+from bisect import bisect_right
+from collections import defaultdict
+from django.db import models, transaction
+from django.db.models import F, Q
 from product.models import Product
 from django.conf import settings
 from django.utils import timezone
 from price_analysis_detail.models import PriceAnalysisDetail
+from .cache import touch_prices
 
 class PriceHistory(models.Model):
     analysis_detail = models.ForeignKey(PriceAnalysisDetail, on_delete=models.PROTECT, related_name="price_entries", verbose_name="Detalle de Análisis de Origen")
     product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name="price_history", verbose_name="Producto")
     sale_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Precio de Venta")
     is_active = models.BooleanField(default=True, verbose_name="Precio Activo")
+    # Igual al producto mientras el precio está activo y NULL después: el índice único admite
+    # muchos NULL, así que garantiza un solo precio activo por producto sin índice parcial
+    active_product = models.OneToOneField(
+        Product, on_delete=models.PROTECT, null=True, blank=True, editable=False,
+        related_name="active_price", verbose_name="Producto (precio activo)"
+    )
     start_date = models.DateTimeField(default=timezone.now, verbose_name="Fecha de Activación")
+    # Intervalo de vigencia [desde, hasta); hasta es NULL mientras el precio sigue activo
+    valid_from = models.DateTimeField(default=timezone.now, verbose_name="Vigente Desde")
+    valid_to = models.DateTimeField(null=True, blank=True, verbose_name="Vigente Hasta")
     
     # --- Campos de Auditoría ---
     active = models.BooleanField(default=True, verbose_name="Activo")
@@ -19,9 +32,33 @@ class PriceHistory(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
-        if self.is_active:
-            PriceHistory.objects.filter(product=self.product, is_active=True).exclude(pk=self.pk).update(is_active=False)
-        super().save(*args, **kwargs)
+        """
+        Cada fila es un solo intervalo de vigencia. Activar un precio lo hace vigente desde ahora y cierra
+        en ese mismo momento el precio activo anterior. Reactivar una fila ya cerrada no reabre su intervalo:
+        se guarda como una fila nueva y la original conserva su historia.
+        """
+        with transaction.atomic():
+            now = timezone.now()
+            was_active = bool(self.pk) and PriceHistory.objects.filter(pk=self.pk, is_active=True).exists()
+            if self.is_active and not was_active:
+                if self.pk:
+                    self.pk = None
+                    self._state.adding = True
+                    self.start_date = now
+                    kwargs.pop('update_fields', None)
+                self.valid_from = now
+                self.valid_to = None
+                PriceHistory.objects.filter(product=self.product, is_active=True)\
+                    .update(is_active=False, active_product=None, valid_to=now)
+            elif not self.pk:
+                self.valid_from = self.start_date
+                # Un precio inactivo con fecha futura nunca estuvo vigente: su intervalo queda vacío
+                self.valid_to = max(self.valid_from, now)
+            elif not self.is_active and self.valid_to is None:
+                self.valid_to = max(self.valid_from, now)
+            self.active_product_id = self.product_id if self.is_active else None
+            super().save(*args, **kwargs)
+            touch_prices()
 
     def __str__(self):
         status = "Activo" if self.is_active else "Inactivo"
@@ -31,6 +68,51 @@ class PriceHistory(models.Model):
         verbose_name = "Historial de Precio"
         verbose_name_plural = "Historiales de Precios"
         ordering = ['-start_date']
+        indexes = [
+            models.Index(fields=['product', 'valid_from', 'valid_to'], name='price_history_interval_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(valid_to__isnull=True) | Q(valid_to__gte=F('valid_from')),
+                name='price_history_valid_interval'
+            ),
+        ]
+
+    @classmethod
+    def prices_at(cls, pairs):
+        """
+        Precio vigente de cada (producto, momento) en una sola consulta: {(producto_id, momento): precio o None}.
+        Se leen los intervalos de esos productos que cruzan el rango de fechas pedido y cada par se
+        resuelve en memoria con búsqueda binaria.
+        """
+        pairs = set(pairs)
+        if not pairs:
+            return {}
+        moments = [moment for _, moment in pairs]
+        rows = cls.objects.filter(
+            product_id__in={product_id for product_id, _ in pairs}, valid_from__lte=max(moments)
+        ).filter(Q(valid_to__gt=min(moments)) | Q(valid_to__isnull=True))\
+            .order_by('product_id', 'valid_from', 'id').values_list('product_id', 'valid_from', 'valid_to', 'sale_price')
+
+        intervals = defaultdict(list)
+        for product_id, valid_from, valid_to, sale_price in rows:
+            intervals[product_id].append((valid_from, valid_to, sale_price))
+        starts = {product_id: [start for start, _, _ in rows] for product_id, rows in intervals.items()}
+
+        prices = {}
+        for product_id, moment in pairs:
+            index = bisect_right(starts.get(product_id, []), moment) - 1
+            price = None
+            if index >= 0:
+                _, valid_to, sale_price = intervals[product_id][index]
+                if valid_to is None or moment < valid_to:
+                    price = sale_price
+            prices[(product_id, moment)] = price
+        return prices
+
+    @classmethod
+    def price_at(cls, product_id, moment):
+        return cls.prices_at([(product_id, moment)])[(product_id, moment)]
 
 class ActivePrice(PriceHistory):
     class Meta:
@@ -0,0 +1,39 @@
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .cache import touch_prices
+from .models import PriceHistory
+
+
+def publish_prices(entries, user):
+    """
+    Publica nuevos precios activos en dos sentencias: un UPDATE que desactiva los precios vigentes
+    de todos los productos afectados y un bulk_create con los nuevos.
+
+    `entries` es una lista de tuplas (detalle_de_análisis, producto_id, precio). Si un producto aparece
+    varias veces, vale la última. Devuelve los precios creados.
+    """
+    latest = {}
+    for detail, product_id, sale_price in entries:
+        latest[product_id] = (detail, Decimal(sale_price).quantize(Decimal('0.01')))
+    if not latest:
+        return []
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            PriceHistory.objects.filter(product_id__in=latest, is_active=True).update(
+                is_active=False, active_product=None, valid_to=now, modified_by=user, updated_at=now
+            )
+            touch_prices()
+            return PriceHistory.objects.bulk_create([
+                PriceHistory(
+                    analysis_detail=detail, product_id=product_id, active_product_id=product_id, sale_price=sale_price,
+                    is_active=True, start_date=now, valid_from=now, created_by=user, modified_by=user
+                )
+                for product_id, (detail, sale_price) in latest.items()
+            ], batch_size=1000)
+    except IntegrityError:
+        # La restricción única detectó otra publicación simultánea para alguno de los productos
+        raise ValidationError("Otra publicación de precios se realizó al mismo tiempo para estos productos. Intente de nuevo.")
@@ -1,3 +1,197 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 
-# Create your tests here.
+from category.models import Category
+from price_analysis.models import PriceAnalysis
+from price_analysis_detail.models import PriceAnalysisDetail
+from product.models import Product
+from proration.models import Proration
+from subcategory.models import Subcategory
+from unit_of_measure.models import UnitOfMeasure
+from . import cache as price_cache
+from .models import PriceHistory
+from .services import publish_prices
+
+START = datetime(2026, 1, 1, 8, 0, tzinfo=dt_timezone.utc)
+
+
+class PriceHistoryTestCase(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Pruebas')
+        subcategory = Subcategory.objects.create(name='Precios', category=category)
+        unit = UnitOfMeasure.objects.create(name='Unidad', type='Conteo')
+        self.product = Product.objects.create(
+            sku='PRICE-1', name='Producto', size='U', presentation='Unidad',
+            category=category, subcategory=subcategory, purchase_unit=unit, sale_unit=unit
+        )
+        # El análisis se guarda sin su save(): no hace falta una compra para estas pruebas
+        PriceAnalysis.objects.bulk_create([PriceAnalysis(proration=Proration.objects.create(), code='ANL-TEST', invoice_number='F-1')])
+        self.detail = PriceAnalysisDetail.objects.create(
+            analysis=PriceAnalysis.objects.get(code='ANL-TEST'), product=self.product,
+            quantity=1, invoice_cost=Decimal('5.00'), final_prorated_cost=Decimal('5.00')
+        )
+
+    def at(self, hours):
+        return START + timedelta(hours=hours)
+
+    def save_at(self, hours, price):
+        """Guarda el precio como si fueran las START + `hours` horas."""
+        with mock.patch('django.utils.timezone.now', return_value=self.at(hours)):
+            price.save()
+        return price
+
+    def activate(self, hours, sale_price):
+        price = PriceHistory(analysis_detail=self.detail, product=self.product, sale_price=Decimal(sale_price), is_active=True)
+        return self.save_at(hours, price)
+
+    def assert_intervals_do_not_overlap(self):
+        rows = list(PriceHistory.objects.filter(product=self.product).order_by('valid_from', 'id'))
+        for row in rows:
+            if row.valid_to is not None:
+                self.assertLessEqual(row.valid_from, row.valid_to)
+        for previous, current in zip(rows, rows[1:]):
+            self.assertIsNotNone(previous.valid_to)
+            self.assertLessEqual(previous.valid_to, current.valid_from)
+
+
+class PriceReactivationTests(PriceHistoryTestCase):
+
+    def test_reactivation_opens_a_new_interval(self):
+        first = self.activate(0, '10.00')
+        self.activate(2, '12.00')
+
+        first.refresh_from_db()
+        first.is_active = True
+        reactivated = self.save_at(5, first)
+
+        original = PriceHistory.objects.get(pk=self.detail.price_entries.order_by('id').first().pk)
+        self.assertNotEqual(reactivated.pk, original.pk)
+        self.assertEqual((original.valid_from, original.valid_to, original.is_active), (self.at(0), self.at(2), False))
+        self.assertEqual((reactivated.valid_from, reactivated.valid_to), (self.at(5), None))
+        self.assertEqual(self.product.price_history.get(sale_price=Decimal('12.00')).valid_to, self.at(5))
+        self.assert_intervals_do_not_overlap()
+
+        prices = PriceHistory.prices_at([(self.product.pk, self.at(h)) for h in (1, 3, 6)])
+        self.assertEqual(
+            [prices[(self.product.pk, self.at(h))] for h in (1, 3, 6)],
+            [Decimal('10.00'), Decimal('12.00'), Decimal('10.00')]
+        )
+
+    def test_deactivation_closes_the_interval(self):
+        price = self.activate(0, '10.00')
+        price.is_active = False
+        self.save_at(4, price)
+
+        price.refresh_from_db()
+        self.assertEqual((price.valid_to, price.active_product_id), (self.at(4), None))
+        self.assertIsNone(PriceHistory.price_at(self.product.pk, self.at(5)))
+
+    def test_inactive_price_with_a_future_start_is_never_in_force(self):
+        price = PriceHistory(
+            analysis_detail=self.detail, product=self.product, sale_price=Decimal('10.00'),
+            is_active=False, start_date=self.at(10)
+        )
+        self.save_at(0, price)
+
+        price.refresh_from_db()
+        self.assertEqual((price.valid_from, price.valid_to), (self.at(10), self.at(10)))
+        self.assertIsNone(PriceHistory.price_at(self.product.pk, self.at(10)))
+
+
+class PublishPricesTests(PriceHistoryTestCase):
+
+    def test_publishing_replaces_the_active_price(self):
+        old = self.activate(0, '10.00')
+
+        created = publish_prices([(self.detail, self.product.pk, '11.50'), (self.detail, self.product.pk, '12.00')], None)
+
+        self.assertEqual([price.sale_price for price in created], [Decimal('12.00')])
+        old.refresh_from_db()
+        self.assertEqual((old.is_active, old.active_product_id), (False, None))
+        self.assertIsNotNone(old.valid_to)
+        self.assertEqual(self.product.price_history.get(is_active=True).sale_price, Decimal('12.00'))
+
+    def test_concurrent_publication_is_a_validation_error(self):
+        old = self.activate(0, '10.00')
+
+        def publish_concurrently():
+            # Otra publicación confirma su precio entre el UPDATE y el INSERT de esta
+            PriceHistory.objects.bulk_create([PriceHistory(
+                analysis_detail=self.detail, product=self.product, active_product=self.product,
+                sale_price=Decimal('13.00'), is_active=True
+            )])
+
+        with mock.patch('price_history.services.touch_prices', side_effect=publish_concurrently):
+            with self.assertRaises(ValidationError):
+                publish_prices([(self.detail, self.product.pk, '12.00')], None)
+
+        old.refresh_from_db()
+        self.assertTrue(old.is_active)
+        self.assertEqual(list(self.product.price_history.values_list('sale_price', flat=True)), [Decimal('10.00')])
+
+
+class ActivePricesTests(PriceHistoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        price_cache._local.update(version=None, prices={})
+        self.without_price = Product.objects.create(
+            sku='PRICE-2', name='Sin precio', size='U', presentation='Unidad', category=self.product.category,
+            subcategory=self.product.subcategory, purchase_unit=self.product.purchase_unit, sale_unit=self.product.sale_unit
+        )
+        self.activate(0, '10.00')
+
+    def prices(self):
+        return price_cache.active_prices([self.product.pk, self.without_price.pk])
+
+    def test_repeated_lookups_only_read_the_version(self):
+        # Versión y precios faltantes; los productos sin precio también quedan en caché
+        with self.assertNumQueries(2):
+            self.assertEqual(self.prices(), {self.product.pk: Decimal('10.00')})
+        with self.assertNumQueries(1):
+            self.assertEqual(self.prices(), {self.product.pk: Decimal('10.00')})
+
+    def test_shared_cache_serves_a_new_process(self):
+        self.prices()
+        price_cache._local.update(version=None, prices={})
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.prices(), {self.product.pk: Decimal('10.00')})
+
+    def test_publication_invalidates_after_commit(self):
+        self.prices()
+        with self.captureOnCommitCallbacks(execute=True):
+            publish_prices([(self.detail, self.without_price.pk, '7.25')], None)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.prices(), {self.product.pk: Decimal('10.00'), self.without_price.pk: Decimal('7.25')})
+
+
+class PricesAtTests(PriceHistoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.activate(0, '10.00')
+        self.activate(2, '12.00')
+        last = self.activate(4, '15.00')
+        last.is_active = False
+        self.save_at(6, last)
+
+    def test_price_in_force_at_each_moment(self):
+        moments = {-1: None, 0: Decimal('10.00'), 1: Decimal('10.00'), 2: Decimal('12.00'), 5: Decimal('15.00'), 6: None}
+        with self.assertNumQueries(1):
+            prices = PriceHistory.prices_at([(self.product.pk, self.at(hours)) for hours in moments])
+        self.assertEqual({hours: prices[(self.product.pk, self.at(hours))] for hours in moments}, moments)
+
+    def test_product_without_history(self):
+        self.assertEqual(PriceHistory.prices_at([(self.product.pk + 1, self.at(1))]), {(self.product.pk + 1, self.at(1)): None})
+        self.assertEqual(PriceHistory.prices_at([]), {})
+
+    def test_price_at(self):
+        self.assertEqual(PriceHistory.price_at(self.product.pk, self.at(3)), Decimal('12.00'))
@@ -1,8 +1,9 @@
 from django.contrib import admin
+from reference_data.forms import ReferenceChoicesMixin
 from .models import Product
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ReferenceChoicesMixin, admin.ModelAdmin):
 
     # --- Vista de Lista ---
     list_display = (
@@ -42,7 +43,7 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('category', 'subcategory')
         }),
         ('Unidades de Medida', {
-            'fields': ('purchase_unit', 'sale_unit')
+            'fields': ('purchase_unit', 'sale_unit', 'unit_weight_kg')
         }),
         ('Estado', {
             'fields': ('active',)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_alter_product_subcategory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='unit_weight_kg',
+            field=models.DecimalField(decimal_places=3, default=0, help_text='Peso de una unidad de venta; se usa para planificar la carga de los vehículos.', max_digits=10, verbose_name='peso unitario (Kg)'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 import uuid
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from document_sequence.services import next_code
 from category.models import Category
 from subcategory.models import Subcategory
 from unit_of_measure.models import UnitOfMeasure
@@ -63,6 +64,13 @@ class Product(models.Model):
         related_name='+',
         verbose_name="unidad de venta"
     )
+    unit_weight_kg = models.DecimalField(
+        max_digits=10,
+        decimal_places=3,
+        default=0,
+        verbose_name="peso unitario (Kg)",
+        help_text="Peso de una unidad de venta; se usa para planificar la carga de los vehículos."
+    )
 
     # --- Campos de Auditoría ---
     active = models.BooleanField(default=True, verbose_name="activo")
@@ -75,15 +83,14 @@ class Product(models.Model):
         return f"{self.name} ({self.code})"
 
     def save(self, *args, **kwargs):
-        # Generar el código solo al crear un nuevo producto
-        if not self.pk:
+        with transaction.atomic():
+            # Generar el código solo al crear un nuevo producto
+            if not self.code:
+                # Ejemplo: CAT-SUBCAT-00001
+                cat_prefix = self.category.name[:3].upper()
+                subcat_prefix = self.subcategory.name[:3].upper()
+                self.code = next_code(f"{cat_prefix}-{subcat_prefix}", model=Product)
             super().save(*args, **kwargs)
-            # Ejemplo: CAT-SUBCAT-00001
-            cat_prefix = self.category.name[:3].upper()
-            subcat_prefix = self.subcategory.name[:3].upper()
-            self.code = f"{cat_prefix}-{subcat_prefix}-{self.pk:05d}"
-            kwargs['force_insert'] = False
-        super().save(*args, **kwargs)
 
     class Meta:
         db_table = 'product'
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib import messages
-from .models import Proration, ProrationItem, ProrationExpense
+from .models import Proration, ProrationItem, ProrationExpense, ProrationJob, ProrationJobItem
 from purchase.models import Purchase
 from django.utils.html import format_html
 from django.urls import reverse
@@ -96,7 +96,7 @@ class ProrationAdmin(admin.ModelAdmin):
         if not change and obj.purchase:
             received_details = obj.purchase.details.filter(is_received=True, active=True)
 
-            items_created_count = 0
+            items = []
             items_skipped_count = 0
 
             for detail in received_details:
@@ -104,17 +104,18 @@ class ProrationAdmin(admin.ModelAdmin):
                 qty_to_use = detail.verified_quantity
 
                 if qty_to_use > 0:
-                    ProrationItem.objects.create(
+                    items.append(ProrationItem(
                         proration=obj,
-                        product=detail.product,
+                        product_id=detail.product_id,
                         quantity=qty_to_use,
                         fob_unit_value=detail.price,
                         created_by=request.user,
                         modified_by=request.user
-                    )
-                    items_created_count += 1
+                    ))
                 else:
                     items_skipped_count += 1
+            ProrationItem.objects.bulk_create(items, batch_size=1000)
+            items_created_count = len(items)
             obj.run_proration()
 
             if items_skipped_count > 0:
@@ -141,8 +142,8 @@ class ProrationAdmin(admin.ModelAdmin):
         
         super().save_related(request, form, formsets, change)
         if form.instance and form.instance.pk:
-            form.instance.run_proration()
-            messages.info(request, "Prorrateo recalculado automáticamente.")
+            if form.instance.run_proration():
+                messages.info(request, "Prorrateo recalculado automáticamente.")
 
     def get_provider(self, obj):
         if obj.purchase: return obj.purchase.provider.name
@@ -156,10 +157,59 @@ class ProrationAdmin(admin.ModelAdmin):
         
     @admin.action(description="Ejecutar Prorrateo de Costos (Manual)")
     def run_proration_action(self, request, queryset):
-        count = 0
-        for proration in queryset:
-            proration.run_proration()
-            proration.modified_by = request.user
-            proration.save()
-            count += 1
-        self.message_user(request, f"Se recalculó el prorrateo para {count} registro(s).")
\ No newline at end of file
+        # Se encola y responde de inmediato; el comando run_proration_jobs hace el cálculo
+        job = ProrationJob.enqueue(queryset, request.user)
+        url = reverse('admin:proration_prorationjob_change', args=[job.pk])
+        self.message_user(request, format_html(
+            'Trabajo #{} en cola con {} prorrateo(s). <a href="{}">Ver avance</a>', job.pk, job.total, url
+        ))
+
+
+class ProrationJobItemInline(admin.TabularInline):
+    model = ProrationJobItem
+    extra = 0
+    fields = ('proration', 'status', 'message', 'finished_at')
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProrationJob)
+class ProrationJobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'status', 'progress', 'failed', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    inlines = [ProrationJobItemInline]
+    actions = ['requeue_jobs']
+
+    def progress(self, obj):
+        if not obj.total:
+            return "-"
+        return f"{obj.processed}/{obj.total} ({obj.processed * 100 // obj.total}%)"
+    progress.short_description = 'Avance'
+
+    @admin.action(description="Reintentar trabajos fallidos o con errores")
+    def requeue_jobs(self, request, queryset):
+        jobs = [job for job in queryset if job.status == 'failed' or (job.status == 'done' and job.failed)]
+        for job in jobs:
+            job.requeue()
+        if jobs:
+            self.message_user(request, f"{len(jobs)} trabajo(s) en cola de nuevo.")
+        else:
+            self.message_user(request, "Solo se reintentan trabajos fallidos o terminados con errores.", level=messages.WARNING)
+
+    # Lo actualiza el worker, solo lectura
+    def get_readonly_fields(self, request, obj=None):
+        return [f.name for f in self.model._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
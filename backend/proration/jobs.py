@@ -0,0 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import ProrationJob
+from .worker import prorate_job_item, setup
+
+STALE_AFTER = timedelta(minutes=30)
+
+
+def claim_job(stale_after=STALE_AFTER):
+    """
+    Toma el trabajo pendiente más antiguo; con SKIP LOCKED dos workers no toman el mismo.
+    Un trabajo 'En Proceso' sin actividad desde hace `stale_after` se da por abandonado (el worker
+    que lo tenía murió) y se retoma: sus prorrateos ya terminados no se repiten.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job = ProrationJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status='pending') | Q(status='running', heartbeat_at__lt=now - stale_after)
+        ).order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        job.status = 'running'
+        job.started_at = job.started_at or now
+        job.heartbeat_at = now
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def run_job(job, workers, report=None):
+    """
+    Reparte los prorrateos pendientes del trabajo en un pool de procesos. Cada proceso registra
+    su resultado y el avance del trabajo; aquí solo se informa a medida que terminan.
+    Si el pool falla (un proceso muere, por ejemplo) el trabajo queda 'Fallido' con el error y
+    puede volver a encolarse; los prorrateos que no terminaron siguen pendientes.
+    """
+    items = dict(job.items.filter(status='pending').values_list('id', 'proration__code'))
+    try:
+        if items:
+            # Los procesos hijos abren su propia conexión; no deben heredar la del padre
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=setup) as pool:
+                futures = [pool.submit(prorate_job_item, item_id, job.force, job.created_by_id) for item_id in items]
+                for done, future in enumerate(as_completed(futures), start=1):
+                    item_id, status, message = future.result()
+                    if report:
+                        report(f"[{done}/{len(items)}] {items[item_id]}: {message}")
+    except Exception as e:
+        ProrationJob.objects.filter(pk=job.pk).update(
+            status='failed', error=f"{type(e).__name__}: {e}", finished_at=timezone.now()
+        )
+    else:
+        ProrationJob.objects.filter(pk=job.pk).update(status='done', finished_at=timezone.now())
+    job.refresh_from_db()
+    return job
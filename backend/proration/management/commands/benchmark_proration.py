@@ -0,0 +1,42 @@
+import random
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from proration.models import ProrationItem
+from proration.services import prorate_items
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el cálculo del prorrateo con facturas sintéticas (en memoria) y comprueba que "
+        "flete, DAI y otros gastos cuadren al centavo con sus totales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', default='100,1000,5000', help="Cantidades de líneas a medir.")
+        parser.add_argument('--repeat', type=int, default=5, help="Repeticiones por medición.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        freight, dai, other = Decimal('12345.67'), Decimal('8910.11'), Decimal('1213.14')
+
+        self.stdout.write(f"{'líneas':>8} {'ms por cálculo':>15} {'cuadra':>8}")
+        for count in sorted(int(value) for value in options['lines'].split(',')):
+            items = [
+                ProrationItem(quantity=rng.randint(1, 500), fob_unit_value=Decimal(rng.randint(1, 99999)) / 100)
+                for _ in range(count)
+            ]
+
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                prorate_items(items, freight, dai, other)
+            elapsed = (time.perf_counter() - start) * 1000 / options['repeat']
+
+            balanced = (
+                sum(item.prorated_freight for item in items) == freight
+                and sum(item.prorated_dai for item in items) == dai
+                and sum(item.prorated_other_expenses for item in items) == other
+                and sum(item.cost_percentage for item in items) == 100
+            )
+            self.stdout.write(f"{count:>8} {elapsed:>15.2f} {'sí' if balanced else 'NO':>8}")
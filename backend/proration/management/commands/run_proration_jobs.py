@@ -0,0 +1,35 @@
+import os
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from proration.jobs import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de trabajos de prorrateo con un pool de procesos locales."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help="Procesos en paralelo (en SQLite use 1: no admite escrituras concurrentes).")
+        parser.add_argument('--poll', type=float, default=5, help="Segundos de espera cuando la cola está vacía.")
+        parser.add_argument('--once', action='store_true', help="Procesa lo que haya en cola y termina.")
+        parser.add_argument(
+            '--stale-minutes', type=int, default=30,
+            help="Minutos sin avance tras los que un trabajo 'En Proceso' se da por abandonado y se retoma."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job(stale_after=timedelta(minutes=options['stale_minutes']))
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+                continue
+
+            self.stdout.write(f"Trabajo #{job.pk}: {job.total} prorrateo(s).")
+            job = run_job(job, options['workers'], report=self.stdout.write)
+            if job.status == 'failed':
+                self.stdout.write(self.style.ERROR(f"Trabajo #{job.pk} fallido: {job.error}"))
+                continue
+            style = self.style.WARNING if job.failed else self.style.SUCCESS
+            self.stdout.write(style(f"Trabajo #{job.pk} terminado: {job.processed} procesado(s), {job.failed} con error."))
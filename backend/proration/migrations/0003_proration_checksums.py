@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('proration', '0002_proration_is_approved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proration',
+            name='expenses_checksum',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='Huella de Gastos'),
+        ),
+        migrations.AddField(
+            model_name='proration',
+            name='items_checksum',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='Huella de Líneas'),
+        ),
+    ]
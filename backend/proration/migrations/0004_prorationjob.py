@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-18 11:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('proration', '0003_proration_checksums'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProrationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'En Cola'), ('running', 'En Proceso'), ('done', 'Terminado')], default='pending', max_length=10, verbose_name='Estado')),
+                ('force', models.BooleanField(default=True, help_text='Recalcula aunque las líneas y gastos no hayan cambiado.', verbose_name='Forzar Recálculo')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Prorrateos')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='Procesados')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='Con Error')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Inicio')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Trabajo de Prorrateo',
+                'verbose_name_plural': 'Trabajos de Prorrateo',
+                'db_table': 'proration_job',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProrationJobItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'En Cola'), ('done', 'Recalculado'), ('error', 'Error')], default='pending', max_length=10, verbose_name='Estado')),
+                ('message', models.CharField(blank=True, default='', max_length=255, verbose_name='Resultado')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='proration.prorationjob')),
+                ('proration', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='proration.proration', verbose_name='Prorrateo')),
+            ],
+            options={
+                'verbose_name': 'Prorrateo del Trabajo',
+                'verbose_name_plural': 'Prorrateos del Trabajo',
+                'db_table': 'proration_job_item',
+                'indexes': [models.Index(fields=['job', 'status'], name='proration_job_item_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('proration', '0004_prorationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prorationjob',
+            name='error',
+            field=models.TextField(blank=True, default='', verbose_name='Error'),
+        ),
+        migrations.AddField(
+            model_name='prorationjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última Actividad'),
+        ),
+        migrations.AlterField(
+            model_name='prorationjob',
+            name='status',
+            field=models.CharField(choices=[('pending', 'En Cola'), ('running', 'En Proceso'), ('done', 'Terminado'), ('failed', 'Fallido')], default='pending', max_length=10, verbose_name='Estado'),
+        ),
+    ]
@@ -1,9 +1,11 @@
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction
+from document_sequence.services import next_code
+from django.db.models import F, OuterRef, Q, Subquery, Sum
 from django.utils import timezone
 from decimal import Decimal
 from purchase.models import Purchase
 from product.models import Product
+from .services import CENT, POOLS, checksum, prorate_items, rows_checksum
 from django.conf import settings
 
 class Proration(models.Model):
@@ -19,6 +21,8 @@ class Proration(models.Model):
     dai = models.DecimalField(max_digits=12, decimal_places=2, default=0.0, editable=False, verbose_name="DAI (Aranceles)")
     total_expenses = models.DecimalField(max_digits=12, decimal_places=2, default=0.0, editable=False, verbose_name="Total Gastos al Costo")
     total_prorated_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0.0, editable=False, verbose_name="Costo Total Prorrateado")
+    items_checksum = models.CharField(max_length=64, blank=True, default='', editable=False, verbose_name="Huella de Líneas")
+    expenses_checksum = models.CharField(max_length=64, blank=True, default='', editable=False, verbose_name="Huella de Gastos")
     is_approved = models.BooleanField(default=False, verbose_name="Prorrateo Aprobado", help_text="Marcar cuando el prorrateo esté finalizado y listo para el análisis de precios.")
     active = models.BooleanField(default=True, verbose_name="Activo")
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
@@ -30,68 +34,86 @@ class Proration(models.Model):
         return self.code
 
     def save(self, *args, **kwargs):
-        if not self.pk:
+        with transaction.atomic():
+            if not self.code:
+                self.code = next_code('PRO', self.date, model=Proration)
             super().save(*args, **kwargs)
-            date_str = self.date.strftime('%Y%m%d')
-            self.code = f"PRO-{date_str}-{self.pk:05d}"
-            kwargs['force_insert'] = False
-        super().save(*args, **kwargs)
+
+    def input_totals(self):
+        """
+        Totales de líneas y gastos en una sola consulta: cada total es un agregado condicional
+        en una subconsulta sobre el prorrateo. La huella de las líneas se calcula aparte (items_signature).
+        """
+        items = ProrationItem.objects.filter(proration=OuterRef('pk')).order_by().values('proration')
+        expenses = ProrationExpense.objects.filter(proration=OuterRef('pk'), include_in_proration=True).order_by().values('proration')
+
+        def aggregate(rows, expression):
+            return Subquery(rows.annotate(value=expression).values('value'))
+
+        totals = Proration.objects.filter(pk=self.pk).values('pk').annotate(
+            fob_total=aggregate(items, Sum(F('quantity') * F('fob_unit_value'))),
+            freight_total=aggregate(expenses, Sum('amount', filter=Q(expense_type='FREIGHT'))),
+            dai_total=aggregate(expenses, Sum('amount', filter=Q(expense_type='DAI'))),
+            expenses_total=aggregate(expenses, Sum('amount')),
+        ).get()
+        return {key: value or 0 for key, value in totals.items()}
+
+    def items_signature(self):
+        # Un agregado lineal no sirve de huella: cambios en varias líneas pueden compensarse entre sí
+        return rows_checksum(self.items.order_by('id').values_list('id', 'quantity', 'fob_unit_value'))
 
     def calculate_totals(self):
-        # Calcular total FOB desde los items
-        self.total_fob = self.items.aggregate(
-            total=Sum(models.F('quantity') * models.F('fob_unit_value'))
-        )['total'] or Decimal('0.0')
-        
-        # Calcular gastos
-        expenses_to_include = self.expenses.filter(include_in_proration=True)
-        self.freight = expenses_to_include.filter(expense_type='FREIGHT').aggregate(total=Sum('amount'))['total'] or Decimal('0.0')
-        self.dai = expenses_to_include.filter(expense_type='DAI').aggregate(total=Sum('amount'))['total'] or Decimal('0.0')
-        self.total_expenses = expenses_to_include.aggregate(total=Sum('amount'))['total'] or Decimal('0.0')
+        """Actualiza los totales y devuelve (líneas cambiaron, gastos que cambiaron) respecto del último cálculo."""
+        totals = self.input_totals()
+        items_checksum = self.items_signature()
+        expenses_checksum = checksum(totals['freight_total'], totals['dai_total'], totals['expenses_total'])
+
+        previous = {'freight': self.freight, 'dai': self.dai, 'other': self.total_expenses - self.freight - self.dai}
+        self.total_fob = Decimal(totals['fob_total']).quantize(CENT)
+        self.freight = Decimal(totals['freight_total']).quantize(CENT)
+        self.dai = Decimal(totals['dai_total']).quantize(CENT)
+        self.total_expenses = Decimal(totals['expenses_total']).quantize(CENT)
         self.total_prorated_cost = self.total_fob + self.total_expenses
-        self.save()
+        current = {'freight': self.freight, 'dai': self.dai, 'other': self.total_expenses - self.freight - self.dai}
+
+        items_changed = items_checksum != self.items_checksum
+        if expenses_checksum != self.expenses_checksum and self.expenses_checksum:
+            changed_pools = {pool for pool in POOLS if current[pool] != previous[pool]}
+        else:
+            # Sin huella previa (prorrateos antiguos) no se sabe qué cambió: se recalcula todo
+            changed_pools = set() if self.expenses_checksum else set(POOLS)
+        self.items_checksum = items_checksum
+        self.expenses_checksum = expenses_checksum
+        return items_changed, changed_pools
+
+    def run_proration(self, force=False):
+        """
+        Recalcula el prorrateo solo si cambiaron sus entradas. Si las líneas no cambiaron, solo se
+        reescribe la columna de cada gasto modificado. Devuelve los campos de línea reescritos.
+        """
+        stored = (self.items_checksum, self.expenses_checksum)
+        items_changed, changed_pools = self.calculate_totals()
+        if not force and stored == (self.items_checksum, self.expenses_checksum):
+            return ()
+        if force or items_changed:
+            changed_pools = set(POOLS)
+        self.save(update_fields=[
+            'total_fob', 'freight', 'dai', 'total_expenses', 'total_prorated_cost',
+            'items_checksum', 'expenses_checksum', 'modified_by', 'updated_at'
+        ])
+
+        if self.total_fob <= 0 or not changed_pools:
+            return ()
+
+        # Todas las líneas en memoria y un solo bulk_update; los centavos cuadran con los totales
+        items = list(self.items.all())
+        fields = prorate_items(
+            items, self.freight, self.dai, self.total_expenses - self.freight - self.dai,
+            pools=[pool for pool in POOLS if pool in changed_pools]
+        )
+        ProrationItem.objects.bulk_update(items, fields, batch_size=1000)
+        return fields
 
-    def run_proration(self):
-        self.calculate_totals()
-        
-        if self.total_fob <= 0:
-            return
-
-        # Calcular factores de prorrateo
-        freight_factor = self.freight / self.total_fob
-        dai_factor = self.dai / self.total_fob
-        other_expenses = self.total_expenses - self.freight - self.dai
-        other_factor = other_expenses / self.total_fob
-
-        # Aplicar prorrateo a cada item
-        for item in self.items.all():
-            # Calcular valor FOB total del item
-            item.total_fob_value = item.quantity * item.fob_unit_value
-            
-            # Calcular porcentaje de participación
-            item.cost_percentage = (item.total_fob_value / self.total_fob) * Decimal('100.0')
-            
-            # Prorratear gastos
-            item.prorated_freight = item.total_fob_value * freight_factor
-            item.prorated_dai = item.total_fob_value * dai_factor
-            item.prorated_other_expenses = item.total_fob_value * other_factor
-            
-            # Calcular costo total del item
-            total_item_cost = (
-                item.total_fob_value + 
-                item.prorated_freight + 
-                item.prorated_dai + 
-                item.prorated_other_expenses
-            )
-            
-            # Calcular costo unitario prorrateado
-            if item.quantity > 0:
-                item.prorated_unit_cost = total_item_cost
-            else:
-                item.prorated_unit_cost = Decimal('0.0')
-            
-            item.save()
-            
     class Meta:
         verbose_name = "Prorrateo de Importación"
         verbose_name_plural = "Prorrateos de Importación"
@@ -146,4 +168,80 @@ class ProrationItem(models.Model):
     
     class Meta:
         verbose_name = "Ítem de Prorrateo"
-        verbose_name_plural = "Ítems de Prorrateo"
\ No newline at end of file
+        verbose_name_plural = "Ítems de Prorrateo"
+
+class ProrationJob(models.Model):
+    """Lote de prorrateos a recalcular fuera de la petición; lo procesa el comando run_proration_jobs."""
+    STATUS_CHOICES = [
+        ('pending', 'En Cola'),
+        ('running', 'En Proceso'),
+        ('done', 'Terminado'),
+        ('failed', 'Fallido'),
+    ]
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="Estado")
+    force = models.BooleanField(default=True, verbose_name="Forzar Recálculo", help_text="Recalcula aunque las líneas y gastos no hayan cambiado.")
+    total = models.PositiveIntegerField(default=0, verbose_name="Prorrateos")
+    processed = models.PositiveIntegerField(default=0, verbose_name="Procesados")
+    failed = models.PositiveIntegerField(default=0, verbose_name="Con Error")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Inicio")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Fin")
+    # El worker la actualiza al tomar el trabajo y con cada prorrateo; si deja de avanzar, otro worker lo retoma
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Última Actividad")
+    error = models.TextField(blank=True, default='', verbose_name="Error")
+
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Trabajo #{self.pk} ({self.processed}/{self.total})"
+
+    def requeue(self):
+        """Vuelve a poner en cola el trabajo; los prorrateos con error se reintentan y los terminados se conservan."""
+        with transaction.atomic():
+            retried = self.items.filter(status='error').update(status='pending', message='', finished_at=None)
+            ProrationJob.objects.filter(pk=self.pk).update(
+                status='pending', error='', finished_at=None,
+                processed=F('processed') - retried, failed=F('failed') - retried
+            )
+        self.refresh_from_db()
+
+    @classmethod
+    def enqueue(cls, prorations, user, force=True):
+        """Crea el trabajo y una fila pendiente por prorrateo, sin calcular nada."""
+        proration_ids = list(prorations.values_list('pk', flat=True))
+        with transaction.atomic():
+            job = cls.objects.create(total=len(proration_ids), force=force, created_by=user)
+            ProrationJobItem.objects.bulk_create(
+                [ProrationJobItem(job=job, proration_id=proration_id) for proration_id in proration_ids]
+            )
+        return job
+
+    class Meta:
+        db_table = 'proration_job'
+        verbose_name = "Trabajo de Prorrateo"
+        verbose_name_plural = "Trabajos de Prorrateo"
+        ordering = ['-created_at']
+
+
+class ProrationJobItem(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'En Cola'),
+        ('done', 'Recalculado'),
+        ('error', 'Error'),
+    ]
+    job = models.ForeignKey(ProrationJob, on_delete=models.CASCADE, related_name='items')
+    proration = models.ForeignKey(Proration, on_delete=models.CASCADE, related_name='+', verbose_name="Prorrateo")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="Estado")
+    message = models.CharField(max_length=255, blank=True, default='', verbose_name="Resultado")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Fin")
+
+    def __str__(self):
+        return f"{self.proration} ({self.get_status_display()})"
+
+    class Meta:
+        db_table = 'proration_job_item'
+        verbose_name = "Prorrateo del Trabajo"
+        verbose_name_plural = "Prorrateos del Trabajo"
+        indexes = [
+            models.Index(fields=['job', 'status'], name='proration_job_item_status_idx'),
+        ]
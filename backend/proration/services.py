@@ -0,0 +1,108 @@
+import hashlib
+import heapq
+from decimal import Decimal
+from django.utils import timezone
+
+PRORATED_FIELDS = (
+    'total_fob_value', 'cost_percentage', 'prorated_freight', 'prorated_dai',
+    'prorated_other_expenses', 'prorated_unit_cost', 'updated_at'
+)
+
+# Gasto -> columna de la línea donde se guarda su parte
+POOLS = {
+    'freight': 'prorated_freight',
+    'dai': 'prorated_dai',
+    'other': 'prorated_other_expenses',
+}
+
+CENT = Decimal('0.01')
+PERCENT_PRECISION = Decimal('0.0001')
+# El porcentaje se guarda con 4 decimales: 100% son 1,000,000 de unidades
+PERCENT_UNITS = 1000000
+
+
+def to_cents(amount):
+    return int((Decimal(amount) * 100).quantize(Decimal('1')))
+
+
+def from_cents(cents):
+    return (Decimal(cents) / 100).quantize(CENT)
+
+
+def checksum(*values):
+    """Huella de las entradas del prorrateo; los importes se normalizan a centavos."""
+    parts = [str(from_cents(to_cents(value))) if isinstance(value, Decimal) else str(value) for value in values]
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+
+def rows_checksum(rows):
+    """
+    Huella de las filas (id, cantidad, valor FOB unitario) de las líneas, en orden de id. Cualquier
+    cambio en una fila la altera, aunque los cambios de varias líneas se compensen en los totales.
+    """
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update(('|'.join(str(value) for value in row) + '\n').encode())
+    return digest.hexdigest()
+
+
+def distribute(total, weights):
+    """
+    Reparte el entero `total` en proporción a `weights` (enteros) por el método del mayor residuo:
+    cada parte es el cociente entero y las unidades que sobran van a los mayores residuos.
+    La suma de las partes es exactamente `total`.
+    """
+    base = sum(weights)
+    if not base:
+        return [0] * len(weights)
+
+    shares = []
+    remainders = []
+    for index, weight in enumerate(weights):
+        share, remainder = divmod(total * weight, base)
+        shares.append(share)
+        remainders.append((remainder, -index))
+
+    leftover = total - sum(shares)
+    if leftover:
+        # Empates: gana la línea que aparece primero
+        for _, negative_index in heapq.nlargest(leftover, remainders):
+            shares[-negative_index] += 1
+    return shares
+
+
+def prorate_items(items, freight, dai, other_expenses, pools=POOLS):
+    """
+    Calcula en memoria el prorrateo de todas las líneas en una sola pasada, en centavos enteros.
+    Flete, DAI y otros gastos se reparten según el valor FOB de cada línea y sus sumas cuadran
+    al centavo con los totales del prorrateo.
+
+    Si las líneas no cambiaron, `pools` limita el cálculo a los gastos que sí cambiaron; el resto de
+    columnas se conserva. Devuelve los campos modificados, para el bulk_update.
+    """
+    full = set(pools) == set(POOLS)
+    fob = [item.quantity * to_cents(item.fob_unit_value) for item in items]
+    amounts = {'freight': freight, 'dai': dai, 'other': other_expenses}
+    shares = {pool: distribute(to_cents(amounts[pool]), fob) for pool in pools}
+    percent_shares = distribute(PERCENT_UNITS, fob) if full else None
+
+    now = timezone.now()
+    for index, (item, fob_cents) in enumerate(zip(items, fob)):
+        if full:
+            item.total_fob_value = from_cents(fob_cents)
+            item.cost_percentage = (Decimal(percent_shares[index]) / 10000).quantize(PERCENT_PRECISION)
+        for pool, pool_shares in shares.items():
+            setattr(item, POOLS[pool], from_cents(pool_shares[index]))
+
+        # prorated_unit_cost guarda el costo total de la línea (FOB más gastos), como siempre lo ha
+        # hecho; el análisis de precios lo lee así
+        total_cents = fob_cents + sum(to_cents(getattr(item, field)) for field in POOLS.values())
+        if item.quantity > 0:
+            item.prorated_unit_cost = from_cents(total_cents)
+        else:
+            item.prorated_unit_cost = Decimal('0.0')
+        item.updated_at = now
+
+    if full:
+        return PRORATED_FIELDS
+    return tuple(POOLS[pool] for pool in POOLS if pool in pools) + ('prorated_unit_cost', 'updated_at')
@@ -1,3 +1,218 @@
-from django.test import TestCase
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
 
-# Create your tests here.
+from category.models import Category
+from product.models import Product
+from subcategory.models import Subcategory
+from unit_of_measure.models import UnitOfMeasure
+from .jobs import claim_job, run_job
+from .models import Proration, ProrationExpense, ProrationItem, ProrationJob
+from .services import PRORATED_FIELDS, distribute, prorate_items
+
+
+class DistributeTests(SimpleTestCase):
+
+    def test_parts_add_up_to_the_total(self):
+        for total, weights in ((100, [1, 1, 1]), (1001, [3, 7, 11, 13]), (5, [1] * 7), (123457, [999, 1, 50000])):
+            self.assertEqual(sum(distribute(total, weights)), total)
+
+    def test_leftover_goes_to_the_largest_remainders(self):
+        # 10 * 1/6 = 1.67, 10 * 2/6 = 3.33, 10 * 3/6 = 5: el centavo que sobra va al primero
+        self.assertEqual(distribute(10, [1, 2, 3]), [2, 3, 5])
+
+    def test_ties_go_to_the_first_line(self):
+        self.assertEqual(distribute(100, [1, 1, 1]), [34, 33, 33])
+
+    def test_zero_weights(self):
+        self.assertEqual(distribute(100, [0, 0]), [0, 0])
+        self.assertEqual(distribute(100, [0, 5]), [0, 100])
+
+
+class ProrateItemsTests(SimpleTestCase):
+
+    def items(self, *lines):
+        return [ProrationItem(quantity=quantity, fob_unit_value=Decimal(value)) for quantity, value in lines]
+
+    def test_expenses_balance_to_the_cent(self):
+        items = self.items((3, '1.00'), (3, '1.00'), (3, '1.00'))
+        prorate_items(items, Decimal('10.00'), Decimal('0.02'), Decimal('0.00'))
+
+        self.assertEqual([item.prorated_freight for item in items], [Decimal('3.34'), Decimal('3.33'), Decimal('3.33')])
+        self.assertEqual(sum(item.prorated_dai for item in items), Decimal('0.02'))
+        self.assertEqual(sum(item.cost_percentage for item in items), Decimal('100.0000'))
+
+    def test_prorated_unit_cost_is_the_line_cost(self):
+        items = self.items((4, '2.50'), (1, '10.00'))
+        prorate_items(items, Decimal('5.00'), Decimal('1.00'), Decimal('2.00'))
+
+        first, second = items
+        self.assertEqual(first.total_fob_value, Decimal('10.00'))
+        self.assertEqual(first.prorated_unit_cost, Decimal('14.00'))
+        self.assertEqual(second.prorated_unit_cost, Decimal('14.00'))
+
+    def test_only_changed_pools_are_rewritten(self):
+        items = self.items((1, '1.00'), (2, '1.00'))
+        prorate_items(items, Decimal('3.00'), Decimal('3.00'), Decimal('3.00'))
+        fields = prorate_items(items, Decimal('6.00'), Decimal('9.99'), Decimal('9.99'), pools=['freight'])
+
+        self.assertEqual(fields, ('prorated_freight', 'prorated_unit_cost', 'updated_at'))
+        self.assertEqual([item.prorated_freight for item in items], [Decimal('2.00'), Decimal('4.00')])
+        self.assertEqual([item.prorated_dai for item in items], [Decimal('1.00'), Decimal('2.00')])
+        self.assertEqual(items[0].prorated_unit_cost, Decimal('5.00'))
+
+    def test_zero_quantity_line(self):
+        items = self.items((0, '5.00'), (2, '1.00'))
+        prorate_items(items, Decimal('1.00'), Decimal('0.00'), Decimal('0.00'))
+
+        self.assertEqual(items[0].prorated_freight, Decimal('0.00'))
+        self.assertEqual(items[0].prorated_unit_cost, Decimal('0.0'))
+        self.assertEqual(items[1].prorated_freight, Decimal('1.00'))
+
+
+class RunProrationTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Pruebas')
+        subcategory = Subcategory.objects.create(name='Importación', category=category)
+        unit = UnitOfMeasure.objects.create(name='Unidad', type='Conteo')
+        product = Product.objects.create(
+            sku='PRO-1', name='Producto', size='U', presentation='Unidad',
+            category=category, subcategory=subcategory, purchase_unit=unit, sale_unit=unit
+        )
+        self.proration = Proration.objects.create()
+        self.first, self.second = [
+            ProrationItem.objects.create(proration=self.proration, product=product, quantity=quantity, fob_unit_value=Decimal(value))
+            for quantity, value in ((2, '10.00'), (1, '20.00'))
+        ]
+        self.freight = self.expense('FREIGHT', '8.00')
+        self.dai = self.expense('DAI', '4.00')
+
+    def expense(self, expense_type, amount):
+        return ProrationExpense.objects.create(
+            proration=self.proration, expense_type=expense_type, description=expense_type,
+            date=timezone.localdate(), amount=Decimal(amount)
+        )
+
+    def run_proration(self):
+        self.proration.refresh_from_db()
+        return self.proration.run_proration(force=False)
+
+    def items(self):
+        return list(self.proration.items.order_by('id').values_list('prorated_freight', 'prorated_dai', 'prorated_unit_cost'))
+
+    def test_unchanged_inputs_skip_the_recompute(self):
+        self.assertEqual(self.run_proration(), PRORATED_FIELDS)
+
+        # Totales y huella de líneas: dos lecturas y nada que escribir
+        self.proration.refresh_from_db()
+        with self.assertNumQueries(2):
+            self.assertEqual(self.proration.run_proration(force=False), ())
+
+    def test_changed_expense_rewrites_only_its_column(self):
+        self.run_proration()
+        ProrationItem.objects.filter(pk=self.first.pk).update(prorated_dai=Decimal('99.00'))
+        self.freight.amount = Decimal('10.00')
+        self.freight.save()
+
+        self.assertEqual(self.run_proration(), ('prorated_freight', 'prorated_unit_cost', 'updated_at'))
+        # El DAI no se reescribe: conserva lo que tenía la línea
+        self.assertEqual(self.items(), [
+            (Decimal('5.00'), Decimal('99.00'), Decimal('124.0000')),
+            (Decimal('5.00'), Decimal('2.00'), Decimal('27.0000')),
+        ])
+
+    def test_offsetting_line_edits_are_detected(self):
+        self.run_proration()
+        # El FOB total no cambia (2 x 10 + 1 x 20 = 1 x 20 + 2 x 10), pero sí el reparto por línea
+        ProrationItem.objects.filter(pk=self.first.pk).update(quantity=1, fob_unit_value=Decimal('20.00'))
+        ProrationItem.objects.filter(pk=self.second.pk).update(quantity=2, fob_unit_value=Decimal('10.00'))
+
+        self.assertEqual(self.run_proration(), PRORATED_FIELDS)
+        self.assertEqual(self.items(), [
+            (Decimal('4.00'), Decimal('2.00'), Decimal('26.0000')),
+            (Decimal('4.00'), Decimal('2.00'), Decimal('26.0000')),
+        ])
+
+
+class InlineExecutor:
+    """Sustituye al pool de procesos: corre cada prorrateo en el proceso (y la transacción) de la prueba."""
+
+    def __init__(self, max_workers=None, initializer=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+class BrokenExecutor(InlineExecutor):
+
+    def submit(self, fn, *args):
+        raise BrokenProcessPool("A process in the process pool was terminated abruptly.")
+
+
+@mock.patch('proration.jobs.connections', mock.Mock())
+class ProrationJobTests(TestCase):
+
+    def setUp(self):
+        Proration.objects.create()
+        Proration.objects.create()
+
+    def enqueue(self):
+        return ProrationJob.enqueue(Proration.objects.all(), None)
+
+    def test_claims_the_oldest_pending_job_once(self):
+        first, second = self.enqueue(), self.enqueue()
+
+        self.assertEqual(claim_job(), first)
+        self.assertEqual(claim_job(), second)
+        self.assertIsNone(claim_job())
+
+    def test_reclaims_a_running_job_without_heartbeat(self):
+        job = self.enqueue()
+        claim_job()
+        self.assertIsNone(claim_job())
+
+        ProrationJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=31))
+        reclaimed = claim_job(stale_after=timedelta(minutes=30))
+        self.assertEqual(reclaimed, job)
+        self.assertGreater(reclaimed.heartbeat_at, timezone.now() - timedelta(minutes=1))
+
+    def test_run_job_processes_every_proration(self):
+        self.enqueue()
+        job = claim_job()
+
+        with mock.patch('proration.jobs.ProcessPoolExecutor', InlineExecutor):
+            job = run_job(job, workers=2)
+
+        self.assertEqual((job.status, job.processed, job.failed), ('done', 2, 0))
+        self.assertEqual(set(job.items.values_list('status', flat=True)), {'done'})
+
+    def test_pool_failure_marks_the_job_failed_and_it_can_be_requeued(self):
+        self.enqueue()
+        job = claim_job()
+
+        with mock.patch('proration.jobs.ProcessPoolExecutor', BrokenExecutor):
+            job = run_job(job, workers=2)
+
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('BrokenProcessPool', job.error)
+        self.assertEqual(set(job.items.values_list('status', flat=True)), {'pending'})
+
+        job.requeue()
+        self.assertEqual((job.status, job.error), ('pending', ''))
+        with mock.patch('proration.jobs.ProcessPoolExecutor', InlineExecutor):
+            job = run_job(claim_job(), workers=2)
+        self.assertEqual((job.status, job.processed), ('done', 2))
@@ -0,0 +1,38 @@
+import django
+
+# Funciones que corren en los procesos del pool de run_proration_jobs. Los modelos se importan
+# dentro de cada función para que el módulo también cargue en procesos nuevos (spawn), antes de
+# que Django esté configurado.
+
+
+def setup():
+    django.setup()
+
+
+def prorate_job_item(item_id, force, user_id):
+    """
+    Recalcula un prorrateo del trabajo y registra el resultado y el avance en la misma transacción.
+    Devuelve (ítem, estado, mensaje).
+    """
+    from django.db import transaction
+    from django.db.models import F
+    from django.utils import timezone
+    from .models import Proration, ProrationJob, ProrationJobItem
+
+    def finish(job_id, status, message):
+        ProrationJobItem.objects.filter(pk=item_id).update(status=status, message=message, finished_at=timezone.now())
+        ProrationJob.objects.filter(pk=job_id).update(
+            processed=F('processed') + 1, failed=F('failed') + int(status == 'error'), heartbeat_at=timezone.now()
+        )
+        return item_id, status, message
+
+    job_id, proration_id = ProrationJobItem.objects.values_list('job_id', 'proration_id').get(pk=item_id)
+    try:
+        with transaction.atomic():
+            proration = Proration.objects.select_for_update().get(pk=proration_id)
+            proration.modified_by_id = user_id
+            fields = proration.run_proration(force=force)
+            return finish(job_id, 'done', "Recalculado" if fields else "Sin cambios")
+    except Exception as e:
+        with transaction.atomic():
+            return finish(job_id, 'error', str(e)[:255])
@@ -34,13 +34,13 @@ class PurchaseAdmin(admin.ModelAdmin):
 
     def has_change_permission(self, request, obj=None):
         if obj is not None:
-            if hasattr(obj, 'proration') or Inventory.objects.filter(batch=obj.batch).exists():
+            if hasattr(obj, 'proration') or Inventory.batch_received(obj.batch):
                 return False
         return super().has_change_permission(request, obj)
 
     def has_delete_permission(self, request, obj=None):
         if obj is not None:
-            if hasattr(obj, 'proration') or Inventory.objects.filter(batch=obj.batch).exists():
+            if hasattr(obj, 'proration') or Inventory.batch_received(obj.batch):
                 return False
         return super().has_delete_permission(request, obj)
 
@@ -114,15 +114,16 @@ class PurchaseAdmin(admin.ModelAdmin):
         from inventory_movement_type.models import InventoryMovementType
         from django.db import transaction
         from kardex.models import Kardex
-        from branch.models import Branch
+        from inventory.services import add_to_stock, lock_stock, record_movements, save_stock
+        from reference_data.caches import branches, movement_types
 
         try:
-            movement_type = InventoryMovementType.objects.get(code='PURCHASE')
+            movement_type = movement_types.get(code='PURCHASE')
         except InventoryMovementType.DoesNotExist:
             self.message_user(request, "Error Crítico: No existe el Tipo de Movimiento con código 'PURCHASE'.", level=messages.ERROR)
             return
 
-        target_branch = Branch.objects.filter(active=True).first()
+        target_branch = branches.first(active=True)
         
         if not target_branch:
             self.message_user(request, "Error Crítico: No hay ninguna SUCURSAL activa registrada en el sistema.", level=messages.ERROR)
@@ -137,7 +138,7 @@ class PurchaseAdmin(admin.ModelAdmin):
                 self.message_user(request, f"Omitido {purchase.code}: La compra no está aprobada.", level=messages.WARNING)
                 continue
 
-            if Inventory.objects.filter(batch=purchase.batch).exists():
+            if Inventory.batch_received(purchase.batch):
                 self.message_user(request, f"Omitido {purchase.code}: Ya fue ingresada al inventario anteriormente.", level=messages.WARNING)
                 continue
 
@@ -149,6 +150,9 @@ class PurchaseAdmin(admin.ModelAdmin):
                         self.message_user(request, f"Omitido {purchase.code}: No tiene detalles con 'Cantidad Verificada' mayor a 0.", level=messages.WARNING)
                         continue
 
+                    stock = lock_stock([(TARGET_BRANCH_ID, detail.product_id) for detail in valid_details])
+
+                    movements = []
                     for detail in valid_details:
                         inv_entry = Inventory.objects.create(
                             branch_id=TARGET_BRANCH_ID,
@@ -160,7 +164,7 @@ class PurchaseAdmin(admin.ModelAdmin):
                             created_by=request.user,
                             modified_by=request.user
                         )
-                        Kardex.objects.create(
+                        movements.append(Kardex(
                             transaction_id=purchase.pk,
                             document_number=purchase.invoice_number,
                             movement_type=movement_type,
@@ -171,8 +175,11 @@ class PurchaseAdmin(admin.ModelAdmin):
                             quantity=detail.verified_quantity,
                             cost=detail.price,
                             created_by=request.user
-                        )
-                    
+                        ))
+                        add_to_stock(stock[(TARGET_BRANCH_ID, detail.product_id)], inv_entry, inv_entry.quantity, reopened=True)
+
+                    record_movements(stock, movements)
+                    save_stock(stock.values())
                     success_count += 1
             
             except Exception as e:
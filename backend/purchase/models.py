@@ -1,5 +1,6 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from document_sequence.services import next_code
 from buy_order.models import BuyOrder
 from provider.models import Provider
 import uuid
@@ -64,13 +65,11 @@ class Purchase(models.Model):
         return f"Compra {self.invoice_number} (Orden: {self.buy_order.code})"
 
     def save(self, *args, **kwargs):
-        if not self.pk:
+        with transaction.atomic():
+            if not self.code:
+                # Genera el código con el correlativo del día. Ej: PUR-20251011-00001
+                self.code = next_code('PUR', self.date, model=Purchase)
             super().save(*args, **kwargs)
-            # Genera el código usando la fecha y el ID. Ej: PUR-20251011-00001
-            date_str = self.date.strftime('%Y%m%d')
-            self.code = f"PUR-{date_str}-{self.pk:05d}"
-            kwargs['force_insert'] = False
-        super().save(*args, **kwargs)
 
     class Meta:
         db_table = 'purchase'
@@ -3,8 +3,9 @@ from django.utils.html import format_html
 from django.urls import reverse
 from .models import Quotation
 from quotation_detail.models import QuotationDetail
+from reference_data.forms import ReferenceChoicesMixin
 
-class QuotationDetailInline(admin.TabularInline):
+class QuotationDetailInline(ReferenceChoicesMixin, admin.TabularInline):
     model = QuotationDetail
     fields = ('product', 'unit', 'required_quantity', 'price', 'approved_quantity', 'is_approved', 'active')
     extra = 1
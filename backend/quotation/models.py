@@ -1,5 +1,6 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from document_sequence.services import next_code
 from provider.models import Provider
 
 class Quotation(models.Model):
@@ -42,14 +43,11 @@ class Quotation(models.Model):
         return f"Cotización {self.code} - {self.provider.name}"
 
     def save(self, *args, **kwargs):
-
-        if not self.pk:
+        with transaction.atomic():
+            if not self.code:
+                # Genera el código con el correlativo del día. Ej: COT-20250809-00001
+                self.code = next_code('COT', self.date, model=Quotation)
             super().save(*args, **kwargs)
-            # Genera el código usando la fecha y el ID. Ej: COT-20250809-00001
-            date_str = self.date.strftime('%Y%m%d')
-            self.code = f"COT-{date_str}-{self.pk:05d}"
-            kwargs['force_insert'] = False
-        super().save(*args, **kwargs)
 
     class Meta:
         db_table = 'quotation'
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ReferenceDataConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'reference_data'
+
+    def ready(self):
+        # Conecta las señales de invalidación aunque nadie haya consultado todavía las tablas
+        from . import caches  # noqa: F401
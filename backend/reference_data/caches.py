@@ -0,0 +1,85 @@
+import time
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from branch.models import Branch
+from category.models import Category
+from inventory_movement_type.models import InventoryMovementType
+from subcategory.models import Subcategory
+from unit_of_measure.models import UnitOfMeasure
+
+REFERENCE_CACHE_TTL = 5 * 60
+
+
+class ReferenceCache:
+    """
+    Copia en memoria del proceso de una tabla de referencia pequeña.
+
+    Se invalida con las señales de guardado y borrado del modelo; el TTL cubre los cambios
+    hechos desde otros procesos. Las instancias se comparten entre peticiones: no modificarlas.
+    """
+
+    def __init__(self, model, select_related=(), ttl=REFERENCE_CACHE_TTL):
+        self.model = model
+        self.select_related = select_related
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._rows = None
+        self._loaded_at = 0
+        self._generation = 0
+        post_save.connect(self._changed, sender=model, weak=False)
+        post_delete.connect(self._changed, sender=model, weak=False)
+
+    def _changed(self, **kwargs):
+        self.invalidate()
+        # Otra petición del mismo proceso podría recargar antes de confirmar; se vuelve a invalidar al confirmar
+        transaction.on_commit(self.invalidate)
+
+    def invalidate(self):
+        self._generation += 1
+        self._rows = None
+
+    def all(self):
+        rows = self._rows
+        if rows is not None and time.monotonic() - self._loaded_at < self.ttl:
+            self.hits += 1
+            return rows
+
+        self.misses += 1
+        generation = self._generation
+        queryset = self.model._default_manager.select_related(*self.select_related)
+        rows = tuple(queryset.order_by(*(self.model._meta.ordering or ['pk'])))
+        # Si hubo una invalidación mientras se leía, no se guarda lo leído
+        if generation == self._generation:
+            self._rows, self._loaded_at = rows, time.monotonic()
+        return rows
+
+    def filter(self, **attrs):
+        return [row for row in self.all() if all(getattr(row, name) == value for name, value in attrs.items())]
+
+    def first(self, **attrs):
+        rows = self.filter(**attrs)
+        return rows[0] if rows else None
+
+    def get(self, **attrs):
+        row = self.first(**attrs)
+        if row is None:
+            raise self.model.DoesNotExist(f"{self.model._meta.object_name} no encontrado: {attrs}")
+        return row
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+movement_types = ReferenceCache(InventoryMovementType)
+branches = ReferenceCache(Branch)
+units = ReferenceCache(UnitOfMeasure)
+categories = ReferenceCache(Category)
+subcategories = ReferenceCache(Subcategory, select_related=('category',))
+
+REFERENCE_CACHES = {cache.model: cache for cache in (movement_types, branches, units, categories, subcategories)}
+
+
+def reference_cache_stats():
+    """Aciertos y fallos de cada caché de referencia en este proceso."""
+    return {model._meta.label: cache.stats() for model, cache in REFERENCE_CACHES.items()}
@@ -0,0 +1,49 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.forms.models import ModelChoiceIterator
+from reference_data.caches import REFERENCE_CACHES
+
+
+class CachedChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self.field.reference.all():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.reference.all()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.reference.all())
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """Selector de una tabla de referencia que arma sus opciones y valida desde la caché del proceso."""
+    iterator = CachedChoiceIterator
+
+    def __init__(self, *args, reference, **kwargs):
+        self.reference = reference
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        key = self.to_field_name or 'pk'
+        for obj in self.reference.all():
+            if str(getattr(obj, key)) == str(value):
+                return obj
+        raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value})
+
+
+class ReferenceChoicesMixin:
+    """Para ModelAdmin e inlines: las llaves foráneas a tablas de referencia usan la caché en lugar de consultar en cada render."""
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        reference = REFERENCE_CACHES.get(db_field.related_model)
+        # Si el admin ya filtró el queryset, se respeta ese filtro; los campos encadenados (smart_selects) se dejan igual
+        if reference is not None and type(db_field) is models.ForeignKey and 'queryset' not in kwargs and 'widget' not in kwargs:
+            kwargs['form_class'] = CachedModelChoiceField
+            kwargs['reference'] = reference
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
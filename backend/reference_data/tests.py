@@ -0,0 +1,43 @@
+from unittest import mock
+from django.test import TestCase
+
+from branch.models import Branch
+from .caches import REFERENCE_CACHE_TTL, branches
+
+
+class ReferenceCacheTests(TestCase):
+
+    def setUp(self):
+        self.central = Branch.objects.create(name='Central', address='-', municipality='San Salvador')
+        branches.invalidate()
+
+    def test_reads_are_served_from_memory(self):
+        with self.assertNumQueries(1):
+            branches.all()
+            self.assertEqual(branches.get(name='Central'), self.central)
+            self.assertIsNone(branches.first(name='Norte'))
+
+    def test_saving_a_row_invalidates_the_cache(self):
+        branches.all()
+        with self.captureOnCommitCallbacks(execute=True):
+            Branch.objects.create(name='Norte', address='-', municipality='San Salvador')
+
+        self.assertEqual([branch.name for branch in branches.filter(municipality='San Salvador')], ['Central', 'Norte'])
+
+        self.central.delete()
+        self.assertIsNone(branches.first(name='Central'))
+
+    def test_changes_from_other_processes_are_seen_after_the_ttl(self):
+        with mock.patch('reference_data.caches.time.monotonic', return_value=1000):
+            branches.all()
+        # Una actualización en bloque no dispara señales, como un cambio hecho por otro proceso
+        Branch.objects.filter(pk=self.central.pk).update(name='Central 2')
+
+        with mock.patch('reference_data.caches.time.monotonic', return_value=1000 + REFERENCE_CACHE_TTL - 1):
+            self.assertEqual(branches.get(pk=self.central.pk).name, 'Central')
+        with mock.patch('reference_data.caches.time.monotonic', return_value=1000 + REFERENCE_CACHE_TTL):
+            self.assertEqual(branches.get(pk=self.central.pk).name, 'Central 2')
+
+    def test_missing_rows_raise_does_not_exist(self):
+        with self.assertRaises(Branch.DoesNotExist):
+            branches.get(name='Norte')
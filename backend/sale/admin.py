@@ -4,13 +4,17 @@ from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.http import JsonResponse
 from django.urls import path
+from django.utils.cache import get_conditional_response, patch_cache_control
 from decimal import Decimal
 from django import forms
 
 from .models import Sale, SaleDetail
-from inventory.models import Inventory
+from .pricing import branch_prices, sale_line_prices
+from inventory.cache import branch_catalog, branch_catalog_etag, branch_version
+from inventory.services import deplete_fifo
 from inventory_movement_type.models import InventoryMovementType
-from kardex.models import Kardex
+from reference_data.caches import movement_types
+from reference_data.forms import ReferenceChoicesMixin
 
 class SaleDetailForm(forms.ModelForm):
     class Meta:
@@ -38,14 +42,7 @@ class SaleDetailInline(admin.TabularInline):
     readonly_fields = ('row_total_display',) 
 
     def row_total_display(self, obj):
-        p = obj.price if obj.price else Decimal('0.00')
-        q = obj.quantity if obj.quantity else Decimal('0.00')
-        d_percent = obj.discount if obj.discount else Decimal('0.00')
-        
-        subtotal = q * p
-        discount_amount = subtotal * (d_percent / Decimal('100'))
-        total = subtotal - discount_amount
-        return f"${total:.2f}"
+        return f"${obj.row_total:.2f}"
     
     row_total_display.short_description = "Subtotal"
 
@@ -61,7 +58,7 @@ class SaleDetailInline(admin.TabularInline):
         return False if obj and obj.status == 'completed' else True
 
 @admin.register(Sale)
-class SaleAdmin(admin.ModelAdmin):
+class SaleAdmin(ReferenceChoicesMixin, admin.ModelAdmin):
     list_display = ('code', 'date', 'branch', 'client', 'sale_type', 'status', 'total_display')
     list_filter = ('status', 'sale_type', 'branch', 'date')
     search_fields = ('code', 'client__first_name', 'client__dui')
@@ -110,34 +107,44 @@ class SaleAdmin(admin.ModelAdmin):
         custom_urls = [
             path('get-products-by-branch/', self.admin_site.admin_view(self.get_products_by_branch), name='sale_get_products'),
             path('get-product-price/', self.admin_site.admin_view(self.get_product_price), name='sale_get_price'),
+            path('get-product-prices/', self.admin_site.admin_view(self.get_product_prices), name='sale_get_prices'),
         ]
         return custom_urls + urls
 
     def get_products_by_branch(self, request):
         branch_id = request.GET.get('branch_id')
-        if not branch_id: return JsonResponse({'products': []})
-        products = Inventory.objects.filter(branch_id=branch_id, quantity__gt=0, active=True)\
-            .select_related('product').values('product__id', 'product__name', 'product__code').distinct()
-        return JsonResponse({'products': [{'id': p['product__id'], 'name': f"{p['product__code']} - {p['product__name']}"} for p in products]})
+        if not branch_id or not branch_id.isdigit(): return JsonResponse({'products': []})
+
+        # El navegador revalida con If-None-Match; mientras no cambien los lotes de la sucursal se responde 304.
+        # La versión es compartida (base de datos), así que un cambio hecho en otro worker también invalida el ETag
+        version = branch_version(int(branch_id))
+        etag = branch_catalog_etag(int(branch_id), version)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = JsonResponse({'products': branch_catalog(int(branch_id), version)})
+        response.headers['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
     def get_product_price(self, request):
         branch_id = request.GET.get('branch_id')
         product_id = request.GET.get('product_id')
-        if not branch_id or not product_id: return JsonResponse({'price': '0.00'})
-        
-        oldest_batch = Inventory.objects.filter(
-            branch_id=branch_id, 
-            product_id=product_id, 
-            quantity__gt=0, 
-            active=True
-        ).order_by('created_at').first()
-        
-        if oldest_batch:
-            price = oldest_batch.cost * Decimal('1.20') 
-            price = price.quantize(Decimal('0.01'))
-            return JsonResponse({'price': str(price)})
-            
-        return JsonResponse({'price': '0.00'})
+        if not branch_id or not product_id or not branch_id.isdigit() or not product_id.isdigit():
+            return JsonResponse({'price': '0.00'})
+
+        prices = branch_prices(int(branch_id))
+        return JsonResponse({'price': prices.get(int(product_id), '0.00')})
+
+    def get_product_prices(self, request):
+        """Precios FIFO de varios productos (o de toda la sucursal si no se indican) en una sola respuesta."""
+        branch_id = request.GET.get('branch_id')
+        if not branch_id or not branch_id.isdigit(): return JsonResponse({'prices': {}})
+
+        prices = branch_prices(int(branch_id))
+        product_ids = [p for p in request.GET.get('product_ids', '').split(',') if p.isdigit()]
+        if product_ids:
+            prices = {int(p): prices.get(int(p), '0.00') for p in product_ids}
+        return JsonResponse({'prices': prices})
 
     def save_model(self, request, obj, form, change):
         if not change:
@@ -145,7 +152,8 @@ class SaleAdmin(admin.ModelAdmin):
         obj.modified_by = request.user
         
         if change:
-            obj._old_status = Sale.objects.get(pk=obj.pk).status
+            # Bloquea la venta: dos cajeros finalizando el mismo documento se atienden en fila
+            obj._old_status = Sale.objects.select_for_update().get(pk=obj.pk).status
         else:
             obj._old_status = 'draft'
 
@@ -193,78 +201,33 @@ class SaleAdmin(admin.ModelAdmin):
             self.calculate_totals(obj)
 
     def calculate_totals(self, sale):
-        details = sale.details.all()
-        raw_subtotal = Decimal('0.00') 
-        for d in details:
-            line_sub = d.quantity * d.price
-            discount_amount = line_sub * (d.discount / Decimal('100.00'))
-            raw_subtotal += (line_sub - discount_amount)
-
-        tax = Decimal('0.00')
-        if sale.sale_type == 'CCF':
-            tax = raw_subtotal * Decimal('0.13')
-            final_total = raw_subtotal
-        else:
-            final_total = raw_subtotal
-            
-        Sale.objects.filter(pk=sale.pk).update(subtotal=raw_subtotal, tax_amount=tax, total=final_total)
+        Sale.recalculate_totals(sale)
 
     def process_sale_inventory(self, request, sale):
         try:
-            move_sale = InventoryMovementType.objects.get(code='SALE')
+            move_sale = movement_types.get(code='SALE')
         except InventoryMovementType.DoesNotExist:
             raise ValidationError("No existe el tipo de movimiento 'SALE'.")
 
-        details = sale.details.all()
-        if not details.exists():
+        details = list(sale.details.select_related('product'))
+        if not details:
             raise ValidationError("No se puede finalizar una venta sin productos.")
 
+        allocations = deplete_fifo(
+            branch=sale.branch,
+            demands=[(detail.pk, detail.product, detail.quantity) for detail in details],
+            movement_type=move_sale,
+            transaction_id=sale.pk,
+            document_number=sale.code,
+            user=request.user
+        )
+
+        prices = sale_line_prices(details, allocations)
+        priced_details = []
         for detail in details:
-            qty_needed = detail.quantity
-            if qty_needed <= 0: continue
-
-            batches = Inventory.objects.filter(
-                branch=sale.branch,
-                product=detail.product,
-                quantity__gt=0,
-                active=True
-            ).order_by('created_at')
-
-            total_available = sum(b.quantity for b in batches)
-            if total_available < qty_needed:
-                raise ValidationError(f"Stock insuficiente para '{detail.product}'. Requerido: {qty_needed}, Disponible: {total_available}.")
+            if detail.pk not in prices: continue
+            detail.price = prices[detail.pk]
+            detail.line_total = detail.row_total
+            priced_details.append(detail)
 
-            qty_remaining = qty_needed
-            total_money_value_extracted = Decimal('0.00')
-
-            for batch_record in batches:
-                if qty_remaining <= 0: break
-
-                current_batch_sale_price = batch_record.cost * Decimal('1.20')
-                
-                to_take = min(batch_record.quantity, qty_remaining)
-
-                total_money_value_extracted += (to_take * current_batch_sale_price)
-
-                batch_record.quantity -= to_take
-                batch_record.modified_by = request.user
-                batch_record.save()
-
-                Kardex.objects.create(
-                    transaction_id=sale.pk,
-                    document_number=sale.code,
-                    movement_type=move_sale,
-                    inventory_entry=batch_record,
-                    branch=sale.branch,
-                    product=detail.product,
-                    batch=batch_record.batch,
-                    quantity=to_take * -1,
-                    cost=batch_record.cost,
-                    created_by=request.user
-                )
-                qty_remaining -= to_take
-
-            final_unit_price = total_money_value_extracted / detail.quantity
-            final_unit_price = final_unit_price.quantize(Decimal('0.01'))
-
-            SaleDetail.objects.filter(pk=detail.pk).update(price=final_unit_price)
\ No newline at end of file
+        SaleDetail.objects.bulk_update(priced_details, ['price', 'line_total'])
\ No newline at end of file
@@ -0,0 +1,60 @@
+# Generated by Django 5.2 on 2026-10-18 10:45
+
+from decimal import ROUND_HALF_UP, Decimal
+from django.db import migrations, models
+
+CHUNK_SIZE = 2000
+
+
+def backfill_totals(apps, schema_editor):
+    Sale = apps.get_model('sale', 'Sale')
+    SaleDetail = apps.get_model('sale', 'SaleDetail')
+
+    last_pk = 0
+    while True:
+        details = list(SaleDetail.objects.filter(pk__gt=last_pk).order_by('pk')[:CHUNK_SIZE])
+        if not details:
+            break
+        for detail in details:
+            subtotal = detail.quantity * detail.price
+            detail.line_total = (subtotal * (Decimal('1.00') - detail.discount / Decimal('100.00'))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        SaleDetail.objects.bulk_update(details, ['line_total'])
+        last_pk = details[-1].pk
+
+    subtotal = models.functions.Coalesce(
+        models.Subquery(
+            SaleDetail.objects.filter(sale=models.OuterRef('pk'))
+                .values('sale').annotate(total=models.Sum('line_total')).values('total')
+        ),
+        models.Value(Decimal('0.00')),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2)
+    )
+    tax = models.Case(
+        models.When(sale_type='CCF', then=models.functions.Round(subtotal * Decimal('0.13'), 2)),
+        default=models.Value(Decimal('0.00')),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2)
+    )
+    # Las ventas finalizadas ya se facturaron: sus totales no se tocan, solo se recalculan los borradores
+    last_pk = 0
+    while True:
+        pks = list(Sale.objects.filter(pk__gt=last_pk, status='draft').order_by('pk').values_list('pk', flat=True)[:CHUNK_SIZE])
+        if not pks:
+            break
+        Sale.objects.filter(pk__in=pks).update(subtotal=subtotal, tax_amount=tax, total=subtotal)
+        last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sale', '0004_alter_saledetail_discount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saledetail',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, default=0.0, editable=False, max_digits=12, verbose_name='total de línea'),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
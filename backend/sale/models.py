@@ -1,12 +1,24 @@
-from decimal import Decimal
+from decimal import ROUND_HALF_UP, Decimal
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from document_sequence.services import next_code
+from django.db.models import Case, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from client.models import Client
 from branch.models import Branch
 from product.models import Product
 
+TAX_RATE = Decimal('0.13')
+
+def compute_line_total(quantity, price, discount):
+    # (Cantidad * Precio) * (1 - (Descuento / 100))
+    subtotal = (quantity or Decimal('0.00')) * (price or Decimal('0.00'))
+    discount_factor = (discount or Decimal('0.00')) / Decimal('100.00')
+    # Medio centavo hacia arriba, como redondeaba MySQL los totales antes de guardar cada línea
+    return (subtotal * (Decimal('1.00') - discount_factor)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
 class Sale(models.Model):
     SALE_TYPE_CHOICES = (
         ('FCF', 'Factura Consumidor Final'),
@@ -51,12 +63,30 @@ class Sale(models.Model):
                 raise ValidationError("No se puede modificar una venta ya finalizada.")
 
     def save(self, *args, **kwargs):
-        if not self.pk:
+        with transaction.atomic():
+            if not self.code:
+                self.code = next_code('SLE', self.date, model=Sale)
             super().save(*args, **kwargs)
-            date_str = self.date.strftime('%Y%m%d')
-            self.code = f"SLE-{date_str}-{self.pk:05d}"
-            kwargs['force_insert'] = False
-        super().save(*args, **kwargs)
+
+    @classmethod
+    def recalculate_totals(cls, sales):
+        """Recalcula subtotal, IVA y total desde los totales de línea guardados, con un solo UPDATE."""
+        subtotal = Coalesce(
+            Subquery(
+                SaleDetail.objects.filter(sale=OuterRef('pk'))
+                    .values('sale').annotate(total=Sum('line_total')).values('total')
+            ),
+            Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2)
+        )
+        tax = Case(
+            When(sale_type='CCF', then=Round(subtotal * TAX_RATE, 2)),
+            default=Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2)
+        )
+        if isinstance(sales, cls):
+            sales = cls.objects.filter(pk=sales.pk)
+        return sales.update(subtotal=subtotal, tax_amount=tax, total=subtotal)
 
 class SaleDetail(models.Model):
     sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='details')
@@ -64,13 +94,18 @@ class SaleDetail(models.Model):
     quantity = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="cantidad")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="precio unitario", blank=True, default=0.00)
     discount = models.DecimalField(max_digits=5, decimal_places=2, default=0.00, verbose_name="descuento (%)")
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, default=0.00, editable=False, verbose_name="total de línea")
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
     
     @property
     def row_total(self):
-        # (Cantidad * Precio) * (1 - (Descuento / 100))
-        subtotal = self.quantity * self.price
-        discount_factor = self.discount / Decimal('100.00')
-        return subtotal * (Decimal('1.00') - discount_factor)
\ No newline at end of file
+        return compute_line_total(self.quantity, self.price, self.discount)
+
+    def save(self, *args, **kwargs):
+        self.line_total = self.row_total
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'line_total' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['line_total']
+        super().save(*args, **kwargs)
\ No newline at end of file
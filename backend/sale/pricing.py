@@ -0,0 +1,49 @@
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from inventory.cache import BRANCH_VERSION_KEY, get_versions
+from inventory.models import InventoryStock
+from inventory.services import weighted_price
+from price_history.cache import PRICE_VERSION_KEY, active_prices
+
+PRICE_CACHE_TIMEOUT = 60 * 60
+
+
+def fifo_markup():
+    """Margen sobre el costo FIFO para productos sin precio activo (SALE_FIFO_MARKUP, 1.20 por defecto)."""
+    return Decimal(str(getattr(settings, 'SALE_FIFO_MARKUP', '1.20')))
+
+
+def branch_prices(branch_id):
+    """
+    Precio de venta de cada producto con existencia en la sucursal: el precio activo del historial o,
+    si no tiene, el costo del lote más antiguo más el margen FIFO. Se calcula con una sola consulta y
+    queda en caché hasta que cambien los lotes de la sucursal o se publiquen precios.
+    """
+    # Ambas versiones salen de la base en una sola consulta, así que todos los workers invalidan a la vez
+    versions = get_versions(BRANCH_VERSION_KEY.format(branch_id), PRICE_VERSION_KEY)
+    key = "sale:prices:{}:{}:{}".format(branch_id, *versions)
+    prices = cache.get(key)
+    if prices is None:
+        markup = fifo_markup()
+        rows = InventoryStock.objects.filter(branch_id=branch_id, on_hand__gt=0, oldest_lot__isnull=False)\
+            .values_list('product_id', 'oldest_lot__cost', 'product__active_price__sale_price').order_by()
+        prices = {
+            product_id: str(active if active is not None else (cost * markup).quantize(Decimal('0.01')))
+            for product_id, cost, active in rows
+        }
+        cache.set(key, prices, PRICE_CACHE_TIMEOUT)
+    return prices
+
+
+def sale_line_prices(details, allocations):
+    """
+    Precio unitario de cada línea de una venta ya descontada: el precio activo del producto o, si no
+    tiene, el costo promedio de los lotes tomados más el margen FIFO. Devuelve {línea: precio}.
+    """
+    active = active_prices(detail.product_id for detail in details)
+    markup = fifo_markup()
+    return {
+        detail.pk: active.get(detail.product_id) or weighted_price(allocations[detail.pk], markup=markup)
+        for detail in details if detail.pk in allocations
+    }
@@ -1,3 +1,242 @@
-from django.test import TestCase
+import threading
+import uuid
+from importlib import import_module
+from decimal import Decimal
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.utils import timezone
 
-# Create your tests here.
+from branch.models import Branch
+from category.models import Category
+from client.models import Client
+from inventory.models import Inventory, InventoryStock
+from inventory.services import add_to_stock, lock_stock, save_stock
+from inventory_movement_type.models import InventoryMovementType
+from kardex.models import Kardex
+from product.models import Product
+from subcategory.models import Subcategory
+from transfers.admin import TransferAdmin
+from transfers.models import Transfer, TransferDetail
+from unit_of_measure.models import UnitOfMeasure
+from vehicle.models import Vehicle
+from .admin import SaleAdmin
+from .models import Sale, SaleDetail, compute_line_total
+
+
+class ConcurrentFinalizationTests(TransactionTestCase):
+    """Varios cajeros finalizando ventas (y traslados) contra los mismos lotes a la vez."""
+
+    THREADS = 8
+    SALES = 240
+    SALE_QUANTITY = Decimal('2.00')
+    LOTS = (Decimal('100.00'), Decimal('100.00'), Decimal('100.00'))
+
+    @property
+    def threads(self):
+        # SQLite no tiene SELECT FOR UPDATE ni escrituras concurrentes: ahí se finaliza en un solo hilo y
+        # se comprueba igual que el inventario cuadre y que se rechace lo que no alcanza
+        return self.THREADS if connection.features.has_select_for_update else 1
+
+    def setUp(self):
+        self.user = User.objects.create_user('cajero', password='x')
+        for code, flow in (('SALE', 'out'), ('TRANS-OUT', 'out'), ('TRANS-IN', 'in')):
+            InventoryMovementType.objects.create(name=code, code=code, flow=flow)
+
+        category = Category.objects.create(name='Pruebas')
+        subcategory = Subcategory.objects.create(name='Concurrencia', category=category)
+        unit = UnitOfMeasure.objects.create(name='Unidad', type='Conteo')
+        self.product = Product.objects.create(
+            sku='STRESS-1', name='Producto', size='U', presentation='Unidad',
+            category=category, subcategory=subcategory, purchase_unit=unit, sale_unit=unit
+        )
+        self.branch = Branch.objects.create(name='Central', address='-', municipality='San Salvador')
+        self.dest_branch = Branch.objects.create(name='Norte', address='-', municipality='San Salvador')
+        self.client_record = Client.objects.create(
+            first_name='Cliente', last_name='Prueba', dui='01234567-8', phone='2222-2222',
+            address='-', municipality='San Salvador'
+        )
+
+        with transaction.atomic():
+            stock = lock_stock([(self.branch.pk, self.product.pk)])
+            for quantity in self.LOTS:
+                lot = Inventory.objects.create(
+                    branch=self.branch, product=self.product, batch=uuid.uuid4(),
+                    original_quantity=quantity, quantity=quantity, cost=Decimal('10.00')
+                )
+                add_to_stock(stock[(self.branch.pk, self.product.pk)], lot, quantity, reopened=True)
+            save_stock(stock.values())
+
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def run_in_threads(self, jobs):
+        """Reparte los trabajos entre hilos; cada uno usa su propia conexión y transacción."""
+        results = {'ok': 0, 'rejected': 0, 'errors': []}
+        lock = threading.Lock()
+        barrier = threading.Barrier(self.threads)
+
+        def worker(chunk):
+            try:
+                barrier.wait()
+                for job in chunk:
+                    try:
+                        with transaction.atomic():
+                            job()
+                        outcome = 'ok'
+                    except ValidationError:
+                        outcome = 'rejected'
+                    with lock:
+                        results[outcome] += 1
+            except Exception as e:
+                with lock:
+                    results['errors'].append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(jobs[i::self.threads],)) for i in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def sale_job(self, sale):
+        sale_admin = SaleAdmin(Sale, admin.site)
+        return lambda: sale_admin.process_sale_inventory(self.request, sale)
+
+    def transfer_job(self, transfer):
+        transfer_admin = TransferAdmin(Transfer, admin.site)
+        return lambda: transfer_admin.process_inventory_transfer(self.request, transfer)
+
+    def create_sale(self):
+        sale = Sale.objects.create(client=self.client_record, branch=self.branch)
+        SaleDetail.objects.create(sale=sale, product=self.product, quantity=self.SALE_QUANTITY)
+        return sale
+
+    def create_transfer(self, quantity):
+        vehicle = Vehicle.objects.create(brand='Isuzu', model='NPR', year=2020, plate=f"T-{uuid.uuid4().hex[:6].upper()}")
+        transfer = Transfer.objects.create(
+            date=timezone.now(), source_branch=self.branch, dest_branch=self.dest_branch, vehicle=vehicle
+        )
+        TransferDetail.objects.create(transfer=transfer, product=self.product, required_quantity=quantity, sent_quantity=quantity)
+        return transfer
+
+    def assert_inventory_consistent(self):
+        self.assertFalse(Inventory.objects.filter(quantity__lt=0).exists())
+
+        initial = sum(self.LOTS)
+        for branch in (self.branch, self.dest_branch):
+            on_hand = Inventory.objects.filter(branch=branch, product=self.product).aggregate(total=Sum('quantity'))['total'] or 0
+            moved = Kardex.objects.filter(branch=branch, product=self.product).aggregate(total=Sum('quantity'))['total'] or 0
+            expected_on_hand = initial + moved if branch == self.branch else moved
+            self.assertEqual(on_hand, expected_on_hand)
+
+            stock = InventoryStock.objects.filter(branch=branch, product=self.product).first()
+            self.assertEqual(stock.on_hand if stock else 0, on_hand)
+
+    def test_parallel_sales_never_oversell(self):
+        jobs = [self.sale_job(self.create_sale()) for _ in range(self.SALES)]
+
+        results = self.run_in_threads(jobs)
+
+        self.assertEqual(results['errors'], [])
+        expected_ok = int(sum(self.LOTS) / self.SALE_QUANTITY)
+        self.assertEqual(results['ok'], expected_ok)
+        self.assertEqual(results['rejected'], self.SALES - expected_ok)
+        self.assert_inventory_consistent()
+
+    def test_parallel_sales_and_transfers_share_locks(self):
+        jobs = []
+        for i in range(self.SALES):
+            if i % 10 == 0:
+                jobs.append(self.transfer_job(self.create_transfer(5)))
+            else:
+                jobs.append(self.sale_job(self.create_sale()))
+
+        results = self.run_in_threads(jobs)
+
+        self.assertEqual(results['errors'], [])
+        self.assertGreater(results['ok'], 0)
+        self.assert_inventory_consistent()
+
+class RecalculateTotalsTests(TestCase):
+    """Totales de la venta a partir de los totales de línea, en un solo UPDATE."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Pruebas')
+        subcategory = Subcategory.objects.create(name='Totales', category=category)
+        unit = UnitOfMeasure.objects.create(name='Unidad', type='Conteo')
+        self.product = Product.objects.create(
+            sku='TOTAL-1', name='Producto', size='U', presentation='Unidad',
+            category=category, subcategory=subcategory, purchase_unit=unit, sale_unit=unit
+        )
+        self.branch = Branch.objects.create(name='Central', address='-', municipality='San Salvador')
+        self.client_record = Client.objects.create(
+            first_name='Cliente', last_name='Prueba', dui='01234567-8', phone='2222-2222',
+            address='-', municipality='San Salvador'
+        )
+
+    def create_sale(self, sale_type, *lines):
+        sale = Sale.objects.create(client=self.client_record, branch=self.branch, sale_type=sale_type)
+        for quantity, price, discount in lines:
+            SaleDetail.objects.create(
+                sale=sale, product=self.product, quantity=Decimal(quantity), price=Decimal(price), discount=Decimal(discount)
+            )
+        return sale
+
+    def test_consumer_invoice_has_no_tax(self):
+        sale = self.create_sale('FCF', ('2', '10.00', '0'), ('3', '5.00', '10'))
+        Sale.recalculate_totals(sale)
+
+        sale.refresh_from_db()
+        self.assertEqual((sale.subtotal, sale.tax_amount, sale.total), (Decimal('33.50'), Decimal('0.00'), Decimal('33.50')))
+
+    def test_tax_credit_invoice_rounds_the_tax(self):
+        sale = self.create_sale('CCF', ('1', '10.01', '0'), ('1', '0.99', '0'))
+        Sale.recalculate_totals(sale)
+
+        sale.refresh_from_db()
+        self.assertEqual((sale.subtotal, sale.tax_amount, sale.total), (Decimal('11.00'), Decimal('1.43'), Decimal('11.00')))
+
+    def test_sale_without_lines_is_zero(self):
+        sale = self.create_sale('FCF')
+        Sale.objects.filter(pk=sale.pk).update(subtotal=Decimal('9.99'), total=Decimal('9.99'))
+        Sale.recalculate_totals(sale)
+
+        sale.refresh_from_db()
+        self.assertEqual((sale.subtotal, sale.tax_amount, sale.total), (Decimal('0.00'), Decimal('0.00'), Decimal('0.00')))
+
+    def test_several_sales_in_one_query(self):
+        first = self.create_sale('FCF', ('1', '4.00', '0'))
+        second = self.create_sale('CCF', ('2', '50.00', '0'))
+        with self.assertNumQueries(1):
+            updated = Sale.recalculate_totals(Sale.objects.filter(pk__in=[first.pk, second.pk]))
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(
+            dict(Sale.objects.values_list('pk', 'tax_amount')),
+            {first.pk: Decimal('0.00'), second.pk: Decimal('13.00')}
+        )
+
+    def test_line_total_rounds_half_cents_up(self):
+        # 0.05 con 50% de descuento son 0.025: medio centavo hacia arriba, como los totales anteriores
+        self.assertEqual(compute_line_total(Decimal('1'), Decimal('0.05'), Decimal('50')), Decimal('0.03'))
+        self.assertEqual(compute_line_total(Decimal('3'), Decimal('0.35'), Decimal('50')), Decimal('0.53'))
+
+    def test_backfill_keeps_completed_invoices(self):
+        backfill = import_module('sale.migrations.0005_saledetail_line_total').backfill_totals
+        draft = self.create_sale('CCF', ('1', '10.00', '0'))
+        completed = self.create_sale('CCF', ('1', '10.00', '0'))
+        Sale.objects.filter(pk__in=[draft.pk, completed.pk]).update(subtotal=Decimal('9.99'), tax_amount=Decimal('1.30'), total=Decimal('9.99'))
+        Sale.objects.filter(pk=completed.pk).update(status='completed')
+        backfill(apps, None)
+
+        self.assertEqual(
+            dict(Sale.objects.values_list('pk', 'subtotal')),
+            {draft.pk: Decimal('10.00'), completed.pk: Decimal('9.99')}
+        )
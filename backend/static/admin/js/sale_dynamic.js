@@ -34,39 +34,93 @@ window.addEventListener('load', function() {
 
     // --- FUNCIONES AJAX ---
 
+    // Catálogo de la sucursal: una sola petición por sucursal; el navegador la revalida con ETag (304)
+    let catalogRequest = null;
+    let catalogBranchId = null;
+
+    function loadBranchCatalog() {
+        const branchId = $branchSelect.val();
+        if (catalogRequest && catalogBranchId === branchId) return catalogRequest;
+
+        catalogBranchId = branchId;
+        catalogRequest = $.ajax({
+            url: baseUrl + 'get-products-by-branch/',
+            data: { branch_id: branchId },
+            cache: true
+        });
+        catalogRequest.fail(function() {
+            catalogRequest = null;
+        });
+        return catalogRequest;
+    }
+
     function loadProductsForSelect($select) {
         const branchId = $branchSelect.val();
         if (!branchId) return;
 
-        const currentVal = $select.val();
         $select.css('background-color', '#f0f0f0');
 
-        $.ajax({
-            url: baseUrl + 'get-products-by-branch/',
+        loadBranchCatalog().done(function(data) {
+            const previousVal = $select.val();
+            $select.empty();
+            $select.append(new Option('---------', ''));
+            
+            data.products.forEach(function(item) {
+                $select.append(new Option(item.name, item.id));
+            });
+
+            if (previousVal) {
+                $select.val(previousVal);
+            }
+            $select.css('background-color', 'white');
+        }).fail(function(err) {
+            console.error("Error AJAX Productos:", err);
+            $select.css('background-color', '#ffcccc');
+        });
+    }
+
+    // Precios FIFO de toda la sucursal: se piden una vez al cargar y al cambiar de sucursal
+    let branchPrices = {};
+    let pricesRequest = null;
+
+    function loadBranchPrices(applyToRows) {
+        const branchId = $branchSelect.val();
+        branchPrices = {};
+        if (!branchId) return;
+
+        if (pricesRequest) pricesRequest.abort();
+        pricesRequest = $.ajax({
+            url: baseUrl + 'get-product-prices/',
             data: { branch_id: branchId },
             success: function(data) {
-                const previousVal = $select.val();
-                $select.empty();
-                $select.append(new Option('---------', ''));
-                
-                data.products.forEach(function(item) {
-                    $select.append(new Option(item.name, item.id));
+                branchPrices = data.prices;
+                // Sin applyToRows solo se completan las filas cuyo producto se eligió antes de que llegaran los precios
+                $(INLINE_CLASS).each(function() {
+                    const $row = $(this);
+                    if ($row.hasClass('empty-form')) return;
+                    if (applyToRows || isUnpriced($row)) {
+                        updateProductPrice($row);
+                    }
                 });
-
-                if (previousVal) {
-                    $select.val(previousVal);
-                }
-                $select.css('background-color', 'white');
             },
             error: function(err) {
-                console.error("Error AJAX Productos:", err);
-                $select.css('background-color', '#ffcccc');
+                if (err.statusText !== 'abort') {
+                    console.error("Error AJAX Precios:", err);
+                }
+            },
+            complete: function() {
+                pricesRequest = null;
             }
         });
     }
 
+    function isUnpriced($row) {
+        const productId = $row.find('.field-product select').val();
+        const price = parseFloat($row.find('.field-price input').val()) || 0;
+        return Boolean(productId) && price <= 0;
+    }
+
     function updateProductPrice($row) {
-        const branchId = $branchSelect.val();
         const productId = $row.find('.field-product select').val();
         const $priceInput = $row.find('.field-price input');
         
@@ -76,25 +130,13 @@ window.addEventListener('load', function() {
             debouncedGrandTotal();
             return;
         }
-        if (!branchId) return;
 
-        $priceInput.css('opacity', '0.5');
-
-        $.ajax({
-            url: baseUrl + 'get-product-price/',
-            data: { branch_id: branchId, product_id: productId },
-            success: function(data) {
-                if ($priceInput.val() !== data.price) {
-                    $priceInput.val(data.price);
-                }
-                $priceInput.css('opacity', '1');
-                calculateRowTotal($row);
-                debouncedGrandTotal();
-            },
-            error: function() {
-                $priceInput.css('opacity', '1');
-            }
-        });
+        const price = branchPrices[productId] || '0.00';
+        if ($priceInput.val() !== price) {
+            $priceInput.val(price);
+        }
+        calculateRowTotal($row);
+        debouncedGrandTotal();
     }
 
     // --- CÁLCULOS MATEMÁTICOS ---
@@ -143,6 +185,7 @@ window.addEventListener('load', function() {
     const debouncedGrandTotal = debounce(calculateGrandTotal, 100);
 
     $branchSelect.on('change', function() {
+        loadBranchPrices(true);
         $(INLINE_CLASS).each(function() {
             const $row = $(this);
             if (!$row.hasClass('empty-form')) {
@@ -155,8 +198,6 @@ window.addEventListener('load', function() {
 
     $(document).on('change', INLINE_CLASS + ' .field-product select', function() {
         const $row = $(this).closest(INLINE_CLASS);
-        const $priceInput = $row.find('.field-price input');
-
         updateProductPrice($row);
     });
 
@@ -177,6 +218,7 @@ window.addEventListener('load', function() {
     });
 
     if ($branchSelect.val()) {
+        loadBranchPrices(false);
         $(INLINE_CLASS).each(function() {
             const $row = $(this);
             const $select = $row.find('.field-product select');
@@ -1,8 +1,9 @@
 from django.contrib import admin
+from reference_data.forms import ReferenceChoicesMixin
 from subcategory.models import Subcategory
 
 @admin.register(Subcategory)
-class SubcategoryAdmin(admin.ModelAdmin):
+class SubcategoryAdmin(ReferenceChoicesMixin, admin.ModelAdmin):
 
     # --- Vista de Lista ---
     list_display = (
@@ -1,13 +1,18 @@
 from django.contrib import admin
 from django.contrib import messages
 from django.db import transaction
-from django.core.exceptions import ValidationError
-import uuid
-
-from .models import Transfer, TransferDetail
-from inventory.models import Inventory
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from .models import PickingLine, TransitLedger, Transfer, TransferDetail
+from .planning import plan_transfer_loads
+from .services import build_picking_list, dispatch_transfer, receive_transfer
 from inventory_movement_type.models import InventoryMovementType
-from kardex.models import Kardex
+from reference_data.caches import movement_types
+from reference_data.forms import ReferenceChoicesMixin
 
 class TransferDetailInline(admin.TabularInline):
     model = TransferDetail
@@ -27,11 +32,12 @@ class TransferDetailInline(admin.TabularInline):
         if obj.status == 'picking':
             return ['received_quantity']
 
+        # En tránsito solo se registra lo que llega; al recibir se liquida y ya no cambia
         if obj.status == 'transit':
-            return [f.name for f in self.model._meta.fields]
+            return [f.name for f in self.model._meta.fields if f.name not in ('received_quantity', 'comment')]
 
         if obj.status == 'received':
-            return ['product', 'required_quantity', 'sent_quantity']
+            return [f.name for f in self.model._meta.fields]
             
         return readonly_always
 
@@ -47,12 +53,13 @@ class TransferDetailInline(admin.TabularInline):
 
 
 @admin.register(Transfer)
-class TransferAdmin(admin.ModelAdmin):
+class TransferAdmin(ReferenceChoicesMixin, admin.ModelAdmin):
     list_display = ('code', 'date', 'source_branch', 'dest_branch', 'status', 'active')
     list_filter = ('status', 'source_branch', 'dest_branch')
     search_fields = ('code', 'source_branch__name')
     
     inlines = [TransferDetailInline]
+    actions = ['plan_vehicle_loads', 'generate_picking_lists']
 
     fieldsets = (
         ("Datos del Traslado", {
@@ -110,6 +117,64 @@ class TransferAdmin(admin.ModelAdmin):
             return False
         return super().has_delete_permission(request, obj)
 
+    @admin.action(description="Planificar carga de vehículos (traslados en preparación)")
+    def plan_vehicle_loads(self, request, queryset):
+        loads, unassigned, unweighted = plan_transfer_loads(queryset)
+        if not loads and not unassigned:
+            self.message_user(request, "No hay traslados en preparación entre los seleccionados.", level=messages.WARNING)
+            return
+
+        for load in loads:
+            self.message_user(request, f"{load.vehicle} ({load.weight:.2f} de {load.capacity:.2f} Kg): {load.item.code}")
+        for transfer, weight in unassigned:
+            self.message_user(request, f"{transfer.code} ({weight:.2f} Kg) no cabe en ningún vehículo disponible.", level=messages.WARNING)
+        for transfer, names in unweighted.items():
+            self.message_user(
+                request,
+                f"{transfer.code}: sin peso unitario registrado para {', '.join(names)}; se contaron como 0 Kg.",
+                level=messages.WARNING
+            )
+
+    @admin.action(description="Generar lista de picking (reserva lotes)")
+    def generate_picking_lists(self, request, queryset):
+        for transfer in queryset.filter(status='picking').select_related('source_branch'):
+            details = list(transfer.details.filter(active=True).select_related('product'))
+            if not details:
+                self.message_user(request, f"{transfer.code} no tiene productos.", level=messages.WARNING)
+                continue
+            try:
+                with transaction.atomic():
+                    lines = build_picking_list(transfer, details, request.user)
+            except ValidationError as e:
+                self.message_user(request, f"{transfer.code}: {e.message}", level=messages.ERROR)
+                continue
+            url = reverse('admin:transfers_transfer_picking', args=[transfer.pk])
+            self.message_user(request, format_html(
+                '{}: {} lote(s) apartados. <a href="{}" target="_blank">Imprimir lista de picking</a>', transfer.code, len(lines), url
+            ))
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('<int:pk>/picking/', self.admin_site.admin_view(self.picking_list), name='transfers_transfer_picking'),
+        ]
+        return custom_urls + urls
+
+    def picking_list(self, request, pk):
+        transfer = get_object_or_404(Transfer.objects.select_related('source_branch', 'dest_branch', 'vehicle'), pk=pk)
+        if not self.has_view_permission(request, transfer):
+            raise PermissionDenied
+        lines = PickingLine.objects.filter(transfer=transfer).select_related('product', 'lot')\
+            .order_by('product__name', 'lot__created_at', 'lot_id')
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f"Lista de picking {transfer.code}",
+            'opts': self.model._meta,
+            'transfer': transfer,
+            'lines': lines,
+        }
+        return TemplateResponse(request, 'admin/transfers/transfer/picking_list.html', context)
+
     def save_model(self, request, obj, form, change):
         if not change:
             obj.created_by = request.user
@@ -117,25 +182,34 @@ class TransferAdmin(admin.ModelAdmin):
 
         old_status = None
         if change:
-            old_obj = Transfer.objects.get(pk=obj.pk)
+            old_obj = Transfer.objects.select_for_update().get(pk=obj.pk)
             old_status = old_obj.status
         else:
             old_status = 'picking'
 
         super().save_model(request, obj, form, change)
-        
-        if old_status == 'picking' and obj.status == 'transit':
-            try:
-                with transaction.atomic():
-                    self.process_inventory_transfer(request, obj)
-            except ValidationError as e:
-                messages.set_level(request, messages.ERROR)
-                messages.error(request, f"Error al procesar traslado: {e.message}")
-                obj.status = 'picking'
-                obj.save(update_fields=['status', 'modified_by', 'updated_at'])
+        # El inventario se mueve en save_related, cuando los detalles (cantidades enviadas y recibidas) ya están guardados
+        obj._status_change = (old_status, obj.status)
 
-        elif old_status == 'transit' and obj.status == 'received':
-            pass
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        obj = form.instance
+        status_change = getattr(obj, '_status_change', None)
+
+        if status_change == ('picking', 'transit'):
+            self.apply_status_change(request, obj, self.process_inventory_transfer, 'picking', "Error al procesar traslado")
+        elif status_change == ('transit', 'received'):
+            self.apply_status_change(request, obj, self.process_transfer_receipt, 'transit', "Error al recibir traslado")
+
+    def apply_status_change(self, request, obj, process, previous_status, error_label):
+        try:
+            with transaction.atomic():
+                process(request, obj)
+        except ValidationError as e:
+            messages.set_level(request, messages.ERROR)
+            messages.error(request, f"{error_label}: {e.message}")
+            obj.status = previous_status
+            obj.save(update_fields=['status', 'modified_by', 'updated_at'])
 
     def save_formset(self, request, form, formset, change):
         instances = formset.save(commit=False)
@@ -155,90 +229,49 @@ class TransferAdmin(admin.ModelAdmin):
 
     def process_inventory_transfer(self, request, transfer):
         try:
-            move_out = InventoryMovementType.objects.get(code='TRANS-OUT')
-            move_in = InventoryMovementType.objects.get(code='TRANS-IN')
+            move_out = movement_types.get(code='TRANS-OUT')
         except InventoryMovementType.DoesNotExist:
-            raise ValidationError("Faltan tipos de movimiento (TRANS-OUT o TRANS-IN).")
+            raise ValidationError("No existe el tipo de movimiento 'TRANS-OUT'.")
 
-        details = transfer.details.filter(active=True)
-        if not details.exists():
+        details = list(transfer.details.filter(active=True).select_related('product'))
+        if not details:
             raise ValidationError("La transferencia no tiene productos.")
 
-        for detail in details:
-            qty_needed = detail.sent_quantity
-            if qty_needed <= 0: continue
-
-            source_batches = Inventory.objects.filter(
-                branch=transfer.source_branch,
-                product=detail.product,
-                quantity__gt=0,
-                active=True
-            ).order_by('created_at')
-
-            total_available = sum(b.quantity for b in source_batches)
-            if total_available < qty_needed:
-                raise ValidationError(f"Stock insuficiente de '{detail.product}' en origen. Se requieren {qty_needed}, hay {total_available}.")
-
-            qty_remaining = qty_needed
-
-            for batch_record in source_batches:
-                if qty_remaining <= 0: break
-                to_take = min(batch_record.quantity, qty_remaining)
-
-                batch_record.quantity -= to_take
-                batch_record.original_quantity -= to_take
-                batch_record.modified_by = request.user
-                batch_record.save()
-
-                #Kardex Salida
-                Kardex.objects.create(
-                    transaction_id=transfer.pk,
-                    document_number=transfer.code,
-                    movement_type=move_out,
-                    inventory_entry=batch_record,
-                    branch=transfer.source_branch,
-                    product=detail.product,
-                    batch=batch_record.batch,
-                    quantity=to_take * -1,
-                    cost=batch_record.cost,
-                    created_by=request.user
-                )
-
-                dest_inventory, created = Inventory.objects.get_or_create(
-                    branch=transfer.dest_branch,
-                    product=detail.product,
-                    batch=batch_record.batch,
-                    defaults={
-                        'entry_number': uuid.uuid4(),
-                        'original_quantity': 0,
-                        'quantity': 0,
-                        'cost': batch_record.cost,
-                        'created_by': request.user,
-                        'modified_by': request.user,
-                        'active': True
-                    }
-                )
-
-                dest_inventory.quantity += to_take
-                dest_inventory.original_quantity += to_take
-
-                if not created:
-                    dest_inventory.modified_by = request.user
-                
-                dest_inventory.save()
-
-                #Kardex Entrada
-                Kardex.objects.create(
-                    transaction_id=transfer.pk,
-                    document_number=transfer.code,
-                    movement_type=move_in,
-                    inventory_entry=dest_inventory,
-                    branch=transfer.dest_branch,
-                    product=detail.product,
-                    batch=dest_inventory.batch,
-                    quantity=to_take,
-                    cost=dest_inventory.cost,
-                    created_by=request.user
-                )
-
-                qty_remaining -= to_take
\ No newline at end of file
+        picking_lines = list(transfer.picking_lines.all())
+        if not dispatch_transfer(transfer, details, move_out, request.user, picking_lines) and picking_lines:
+            messages.warning(request, f"La lista de picking de {transfer.code} ya no coincidía con lo enviado o con el saldo de los lotes; se despachó por FIFO.")
+
+    def process_transfer_receipt(self, request, transfer):
+        try:
+            move_in = movement_types.get(code='TRANS-IN')
+        except InventoryMovementType.DoesNotExist:
+            raise ValidationError("No existe el tipo de movimiento 'TRANS-IN'.")
+
+        details = list(transfer.details.filter(active=True))
+        adjustment_types = {code: movement_types.first(code=code) for code in ('ADJ-POS', 'ADJ-NEG')}
+        if any(detail.received_quantity != detail.sent_quantity for detail in details) and not all(adjustment_types.values()):
+            raise ValidationError("Faltan tipos de movimiento (ADJ-POS o ADJ-NEG) para registrar las diferencias de recepción.")
+
+        if not receive_transfer(transfer, details, move_in, adjustment_types, request.user):
+            messages.warning(request, f"{transfer.code} se despachó antes del registro de tránsito; su inventario ya estaba en el destino.")
+
+
+@admin.register(TransitLedger)
+class TransitLedgerAdmin(admin.ModelAdmin):
+    list_display = ('transfer', 'vehicle', 'product', 'quantity', 'received_quantity', 'in_transit', 'created_at', 'settled_at')
+    list_filter = ('in_transit', 'vehicle', 'transfer__dest_branch')
+    search_fields = ('transfer__code', 'product__name', 'batch')
+    list_select_related = ('transfer', 'vehicle', 'product')
+
+    # Se mueve con los cambios de estado del traslado, solo lectura
+    def get_readonly_fields(self, request, obj=None):
+        return [f.name for f in self.model._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
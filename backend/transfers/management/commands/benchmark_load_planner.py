@@ -0,0 +1,48 @@
+import random
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from transfers.models import Transfer
+from transfers.planning import pack_loads, plan_transfer_loads
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el planificador de carga con traslados y vehículos sintéticos (en memoria) "
+        "y, si hay traslados en preparación, con los datos reales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transfers', default='100,300,1000', help="Cantidades de traslados sintéticos a medir.")
+        parser.add_argument('--vehicles', type=int, default=0, help="Vehículos sintéticos disponibles (0: uno por traslado).")
+        parser.add_argument('--repeat', type=int, default=5, help="Repeticiones por medición.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        self.stdout.write(f"{'traslados':>10} {'ms por plan':>12} {'cargas':>8} {'sin asignar':>12} {'ocupación':>10}")
+        for count in sorted(int(value) for value in options['transfers'].split(',')):
+            items = [(f"T{i}", Decimal(rng.randint(20, 2500))) for i in range(count)]
+            vehicles = [
+                (f"V{i}", Decimal(rng.choice((500, 1500, 3500, 8000)))) for i in range(options['vehicles'] or count)
+            ]
+
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                loads, unassigned = pack_loads(items, vehicles)
+            elapsed = (time.perf_counter() - start) * 1000 / options['repeat']
+
+            used = sum(load.capacity for load in loads)
+            occupancy = sum(load.weight for load in loads) / used * 100 if used else 0
+            self.stdout.write(f"{count:>10} {elapsed:>12.2f} {len(loads):>8} {len(unassigned):>12} {occupancy:>9.1f}%")
+
+        pending = Transfer.objects.filter(status='picking')
+        if pending.exists():
+            start = time.perf_counter()
+            loads, unassigned, unweighted = plan_transfer_loads(pending)
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stdout.write(
+                f"Datos reales: {pending.count()} traslados en preparación, {len(loads)} cargas, "
+                f"{len(unassigned)} sin asignar, {len(unweighted)} con productos sin peso, {elapsed:.2f} ms (incluye consultas)."
+            )
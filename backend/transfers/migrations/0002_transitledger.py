@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 10:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_alter_product_subcategory'),
+        ('transfers', '0001_initial'),
+        ('vehicle', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransitLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch', models.UUIDField(verbose_name='lote (batch)')),
+                ('cost', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='costo unitario')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='cantidad enviada')),
+                ('received_quantity', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='cantidad recibida')),
+                ('in_transit', models.BooleanField(default=True, verbose_name='en tránsito')),
+                ('settled_at', models.DateTimeField(blank=True, null=True, verbose_name='fecha de recepción')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='fecha de despacho')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='creado por')),
+                ('modified_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='modificado por')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='product.product', verbose_name='producto')),
+                ('transfer', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transit_lots', to='transfers.transfer', verbose_name='transferencia')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='vehicle.vehicle', verbose_name='vehículo')),
+            ],
+            options={
+                'verbose_name': 'Mercadería en Tránsito',
+                'verbose_name_plural': 'Mercadería en Tránsito',
+                'db_table': 'transfer_transit',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['in_transit', 'product'], name='transfer_transit_open_idx')],
+                'unique_together': {('transfer', 'product', 'batch')},
+            },
+        ),
+    ]
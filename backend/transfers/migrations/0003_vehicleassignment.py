@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 10:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def assign_active_vehicles(apps, schema_editor):
+    Transfer = apps.get_model('transfers', 'Transfer')
+    VehicleAssignment = apps.get_model('transfers', 'VehicleAssignment')
+    assignments = {}
+    # Si algún vehículo quedó en dos traslados activos, se conserva el más reciente
+    active = Transfer.objects.filter(status__in=['picking', 'transit']).order_by('-date', '-id').values_list('pk', 'vehicle_id')
+    for transfer_id, vehicle_id in active:
+        assignments.setdefault(vehicle_id, VehicleAssignment(vehicle_id=vehicle_id, transfer_id=transfer_id))
+    VehicleAssignment.objects.bulk_create(assignments.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfers', '0002_transitledger'),
+        ('vehicle', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleAssignment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assigned_at', models.DateTimeField(auto_now=True, verbose_name='fecha de asignación')),
+                ('transfer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='vehicle_assignment', to='transfers.transfer', verbose_name='transferencia')),
+                ('vehicle', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='assignment', to='vehicle.vehicle', verbose_name='vehículo')),
+            ],
+            options={
+                'verbose_name': 'Vehículo Ocupado',
+                'verbose_name_plural': 'Vehículos Ocupados',
+                'db_table': 'vehicle_assignment',
+            },
+        ),
+        migrations.RunPython(assign_active_vehicles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 11:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_averagecost'),
+        ('product', '0004_product_unit_weight_kg'),
+        ('transfers', '0003_vehicleassignment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PickingLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch', models.UUIDField(verbose_name='lote (batch)')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='cantidad a tomar')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='fecha de generación')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='creado por')),
+                ('detail', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='picking_lines', to='transfers.transferdetail', verbose_name='detalle')),
+                ('lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.inventory', verbose_name='lote')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='product.product', verbose_name='producto')),
+                ('transfer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='picking_lines', to='transfers.transfer', verbose_name='transferencia')),
+            ],
+            options={
+                'verbose_name': 'Línea de Picking',
+                'verbose_name_plural': 'Líneas de Picking',
+                'db_table': 'transfer_picking_line',
+                'unique_together': {('detail', 'lot')},
+            },
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Sum
+from document_sequence.services import next_code
 from branch.models import Branch
+from inventory.models import Inventory
 from product.models import Product
 from vehicle.models import Vehicle
 from django.core.exceptions import ValidationError
@@ -12,6 +15,9 @@ class Transfer(models.Model):
         ('received', 'Recibida Completa'),
     )
 
+    # Estados en los que el traslado ocupa su vehículo
+    ACTIVE_STATUSES = ('picking', 'transit')
+
     code = models.CharField(max_length=100, unique=True, editable=False, verbose_name="código")
     date = models.DateTimeField(verbose_name="fecha de traslado")
     
@@ -43,19 +49,19 @@ class Transfer(models.Model):
                 'dest_branch': "La sucursal de destino no puede ser la misma que la de origen."
             })
         
-        if self.status in ['picking', 'transit'] and self.vehicle:    
-            busy_transfer = Transfer.objects.filter(
-                vehicle=self.vehicle,
-                status__in=['picking', 'transit']
-            )
-
-            if self.pk:
-                busy_transfer = busy_transfer.exclude(pk=self.pk)
-
-            if busy_transfer.exists():
-                conflict_code = busy_transfer.first().code
+        if self.status in self.ACTIVE_STATUSES and self.vehicle_id:
+            assignments = VehicleAssignment.objects.filter(vehicle_id=self.vehicle_id).exclude(transfer_id=self.pk)
+            if transaction.get_connection().in_atomic_block:
+                # En el admin la validación y el guardado van en la misma transacción: con el vehículo bloqueado,
+                # dos despachadores que eligen el mismo vehículo se atienden en fila y el segundo recibe el error
+                # en el formulario. La lectura bloqueante ve lo confirmado, no la foto inicial de la transacción.
+                list(Vehicle.objects.select_for_update().filter(pk=self.vehicle_id).values_list('pk', flat=True))
+                assignments = assignments.select_for_update()
+            busy = assignments.values_list('transfer_id', flat=True).first()
+            if busy:
+                code = Transfer.objects.filter(pk=busy).values_list('code', flat=True).first()
                 raise ValidationError({
-                    'vehicle': f"El vehículo '{self.vehicle}' ya está ocupado en la transferencia {conflict_code}."
+                    'vehicle': f"El vehículo '{self.vehicle}' ya está ocupado en la transferencia {code}."
                 })
 
         if self.pk:
@@ -76,15 +82,26 @@ class Transfer(models.Model):
         if not self.pk:
             if self.status not in ['picking', 'transit']:
                 self.status = 'picking'
-                
-            super().save(*args, **kwargs)
-            # Generar código: TRF-20251124-0001
-            date_str = self.date.strftime('%Y%m%d')
-            self.code = f"TRF-{date_str}-{self.pk:04d}"
-            kwargs['force_insert'] = False
-            super().save(*args, **kwargs)
-        else:
+
+        with transaction.atomic():
+            if not self.code:
+                # Generar código: TRF-20251124-0001
+                self.code = next_code('TRF', self.date, width=4, model=Transfer)
             super().save(*args, **kwargs)
+            self.sync_vehicle_assignment()
+
+    def sync_vehicle_assignment(self):
+        """Mantiene la fila de vehículo ocupado; la restricción única la hace cumplir aunque dos despachadores guarden a la vez."""
+        if self.status not in self.ACTIVE_STATUSES or not self.vehicle_id:
+            VehicleAssignment.objects.filter(transfer_id=self.pk).delete()
+            return
+        try:
+            with transaction.atomic():
+                updated = VehicleAssignment.objects.filter(transfer_id=self.pk).update(vehicle_id=self.vehicle_id)
+                if not updated:
+                    VehicleAssignment.objects.create(transfer_id=self.pk, vehicle_id=self.vehicle_id)
+        except IntegrityError:
+            raise ValidationError({'vehicle': f"El vehículo '{self.vehicle}' ya está ocupado en otra transferencia."})
 
     class Meta:
         verbose_name = "Transferencia"
@@ -110,4 +127,96 @@ class TransferDetail(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.product.name} ({self.sent_quantity})"
\ No newline at end of file
+        return f"{self.product.name} ({self.sent_quantity})"
+
+
+class VehicleAssignment(models.Model):
+    """Vehículo ocupado por un traslado en preparación o en tránsito. Un vehículo solo puede tener una fila."""
+    vehicle = models.OneToOneField(Vehicle, on_delete=models.PROTECT, related_name='assignment', verbose_name="vehículo")
+    transfer = models.OneToOneField(Transfer, on_delete=models.CASCADE, related_name='vehicle_assignment', verbose_name="transferencia")
+    assigned_at = models.DateTimeField(auto_now=True, verbose_name="fecha de asignación")
+
+    class Meta:
+        db_table = 'vehicle_assignment'
+        verbose_name = "Vehículo Ocupado"
+        verbose_name_plural = "Vehículos Ocupados"
+
+    def __str__(self):
+        return f"{self.vehicle} -> {self.transfer.code}"
+
+
+class TransitLedger(models.Model):
+    """
+    Mercadería en camión: un registro por traslado y lote despachado.
+    Se acredita al pasar a tránsito y se liquida al recibir.
+    """
+    transfer = models.ForeignKey(Transfer, on_delete=models.PROTECT, related_name='transit_lots', verbose_name="transferencia")
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.PROTECT, related_name='+', verbose_name="vehículo")
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='+', verbose_name="producto")
+    batch = models.UUIDField(verbose_name="lote (batch)")
+    cost = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="costo unitario")
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="cantidad enviada")
+    received_quantity = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name="cantidad recibida")
+    in_transit = models.BooleanField(default=True, verbose_name="en tránsito")
+    settled_at = models.DateTimeField(null=True, blank=True, verbose_name="fecha de recepción")
+
+    # Auditoría
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='+', verbose_name="creado por")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="fecha de despacho")
+    modified_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='+', verbose_name="modificado por")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'transfer_transit'
+        verbose_name = "Mercadería en Tránsito"
+        verbose_name_plural = "Mercadería en Tránsito"
+        ordering = ['-created_at']
+        unique_together = ('transfer', 'product', 'batch')
+        indexes = [
+            models.Index(fields=['in_transit', 'product'], name='transfer_transit_open_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.transfer.code} - {self.product.name} ({self.quantity})"
+
+    @classmethod
+    def in_transit_by_product(cls, product_ids=None):
+        """Existencia en tránsito de toda la red por producto, en una sola consulta agregada."""
+        rows = cls.objects.filter(in_transit=True)
+        if product_ids is not None:
+            rows = rows.filter(product_id__in=product_ids)
+        return dict(rows.values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total').order_by())
+
+
+class PickingLine(models.Model):
+    """
+    Lote apartado para una línea de un traslado en preparación. Es una reserva blanda: las demás listas
+    de picking la respetan, las ventas no; al despachar se usa si los lotes aún tienen el saldo.
+    """
+    transfer = models.ForeignKey(Transfer, on_delete=models.CASCADE, related_name='picking_lines', verbose_name="transferencia")
+    detail = models.ForeignKey(TransferDetail, on_delete=models.CASCADE, related_name='picking_lines', verbose_name="detalle")
+    lot = models.ForeignKey(Inventory, on_delete=models.CASCADE, related_name='+', verbose_name="lote")
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='+', verbose_name="producto")
+    batch = models.UUIDField(verbose_name="lote (batch)")
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="cantidad a tomar")
+
+    # Auditoría
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='+', verbose_name="creado por")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="fecha de generación")
+
+    class Meta:
+        db_table = 'transfer_picking_line'
+        verbose_name = "Línea de Picking"
+        verbose_name_plural = "Líneas de Picking"
+        unique_together = ('detail', 'lot')
+
+    def __str__(self):
+        return f"{self.transfer.code} - {self.product.name} ({self.quantity})"
+
+    @classmethod
+    def reserved_by_lot(cls, lot_ids, exclude_transfer=None):
+        """Cantidad apartada de cada lote por las listas de picking vigentes, en una sola consulta agregada."""
+        rows = cls.objects.filter(lot_id__in=lot_ids)
+        if exclude_transfer is not None:
+            rows = rows.exclude(transfer=exclude_transfer)
+        return dict(rows.values('lot_id').annotate(total=Sum('quantity')).values_list('lot_id', 'total').order_by())
@@ -0,0 +1,90 @@
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+from django.db.models import Q
+from vehicle.models import Vehicle
+from .models import Transfer, TransferDetail
+
+
+@dataclass
+class Load:
+    vehicle: object
+    capacity: Decimal
+    item: object
+    weight: Decimal
+
+
+def pack_loads(items, vehicles):
+    """
+    Asigna cada carga de `items` [(clave, peso), ...] a un vehículo distinto de `vehicles`
+    [(vehículo, capacidad), ...]: de la más pesada a la más liviana, cada una toma el vehículo libre
+    más pequeño donde cabe. Un vehículo lleva un solo traslado activo, así que no se combinan cargas.
+    Devuelve (cargas, sin_asignar).
+    """
+    items = sorted(items, key=lambda item: item[1], reverse=True)
+    spare = sorted(vehicles, key=lambda vehicle: vehicle[1])
+    capacities = [capacity for _, capacity in spare]
+    loads = []
+    unassigned = []
+
+    for key, weight in items:
+        index = bisect_left(capacities, weight)
+        if index == len(spare):
+            unassigned.append((key, weight))
+            continue
+        vehicle, capacity = spare.pop(index)
+        capacities.pop(index)
+        loads.append(Load(vehicle=vehicle, capacity=capacity, item=key, weight=weight))
+    return loads, unassigned
+
+
+def transfer_weights(transfer_ids):
+    """
+    Peso de cada traslado: lo enviado (o lo solicitado si aún no se despacha) por el peso unitario del producto.
+    Devuelve (pesos, sin_peso); `sin_peso` tiene, por traslado, los productos sin peso unitario registrado.
+    """
+    weights = defaultdict(Decimal)
+    unweighted = defaultdict(set)
+    details = TransferDetail.objects.filter(transfer_id__in=transfer_ids, active=True).values_list(
+        'transfer_id', 'required_quantity', 'sent_quantity', 'product__unit_weight_kg', 'product__name'
+    )
+    for transfer_id, required, sent, unit_weight, product_name in details:
+        if not unit_weight:
+            unweighted[transfer_id].add(product_name)
+            continue
+        weights[transfer_id] += (sent or required) * unit_weight
+    return weights, unweighted
+
+
+def plan_transfer_loads(transfers=None):
+    """
+    Propone un vehículo para cada traslado en preparación, entre los libres o ya reservados por los
+    traslados que se planifican. Como un vehículo tiene un solo traslado activo, cada traslado va en
+    un vehículo distinto. Devuelve (cargas, sin_asignar, sin_peso); los productos sin peso unitario
+    cuentan como 0 Kg y se informan aparte.
+    """
+    if transfers is None:
+        transfers = Transfer.objects.filter(status='picking')
+    transfers = list(transfers.filter(status='picking'))
+    weights, unweighted = transfer_weights([transfer.pk for transfer in transfers])
+
+    vehicles = list(Vehicle.objects.filter(active=True, max_capacity_kg__gt=0).filter(
+        Q(assignment__isnull=True) | Q(assignment__transfer__in=[transfer.pk for transfer in transfers])
+    ))
+
+    # Si el vehículo que el traslado ya tiene reservado le alcanza, se conserva; así no hay intercambios entre traslados
+    by_id = {vehicle.pk: vehicle for vehicle in vehicles}
+    loads = []
+    pending = []
+    for transfer in transfers:
+        current = by_id.get(transfer.vehicle_id)
+        if current is not None and current.max_capacity_kg >= weights[transfer.pk]:
+            loads.append(Load(vehicle=current, capacity=current.max_capacity_kg, item=transfer, weight=weights[transfer.pk]))
+            del by_id[current.pk]
+        else:
+            pending.append((transfer, weights[transfer.pk]))
+
+    packed, unassigned = pack_loads(pending, [(vehicle, vehicle.max_capacity_kg) for vehicle in by_id.values()])
+    loads.extend(packed)
+    return loads, unassigned, {transfer: sorted(unweighted[transfer.pk]) for transfer in transfers if transfer.pk in unweighted}
@@ -0,0 +1,164 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from inventory.services import (
+    allocate_fifo, deplete_fifo, deplete_reserved, load_open_lots, lock_stock, record_movements, save_stock, upsert_lots
+)
+from kardex.models import Kardex
+from .models import PickingLine, TransitLedger, TransferDetail
+
+
+def build_picking_list(transfer, details, user):
+    """
+    Aparta por FIFO los lotes de origen para cada línea (lo enviado, o lo solicitado si aún no se
+    indica), sin tomar lo ya apartado por otros traslados. Reemplaza la lista anterior del traslado.
+    """
+    demands = [(detail.pk, detail.product, detail.sent_quantity or detail.required_quantity) for detail in details]
+    demands = [(key, product, qty) for key, product, qty in demands if qty > 0]
+    branch = transfer.source_branch
+    product_ids = {product.pk for _, product, _ in demands}
+
+    # Mismo orden de bloqueo que el despacho: dos listas no apartan a la vez el mismo saldo
+    lock_stock([(branch.pk, product_id) for product_id in product_ids])
+    lots_by_product = load_open_lots(branch, product_ids)
+    reserved = PickingLine.reserved_by_lot(
+        [lot.pk for lots in lots_by_product.values() for lot in lots], exclude_transfer=transfer
+    )
+    # Solo en memoria: la reserva no toca el saldo de los lotes
+    for lots in lots_by_product.values():
+        for lot in lots:
+            lot.quantity = max(lot.quantity - reserved.get(lot.pk, 0), 0)
+    allocations = allocate_fifo(lots_by_product, demands)
+
+    PickingLine.objects.filter(transfer=transfer).delete()
+    return PickingLine.objects.bulk_create([
+        PickingLine(
+            transfer=transfer, detail_id=key, lot=lot, product_id=lot.product_id, batch=lot.batch,
+            quantity=to_take, created_by=user
+        )
+        for key, _, _ in demands for lot, to_take in allocations[key]
+    ])
+
+
+def reserved_allocations(transfer, details, picking_lines, move_out, user):
+    """
+    Despacha con los lotes de la lista de picking. Devuelve None si la lista ya no cuadra con lo enviado
+    o algún lote perdió su saldo, para que el despacho vuelva a FIFO.
+    """
+    picked = defaultdict(Decimal)
+    for line in picking_lines:
+        picked[line.detail_id] += line.quantity
+    sent = {detail.pk: detail.sent_quantity for detail in details}
+    if picked.keys() - sent.keys() or any(picked[key] != qty for key, qty in sent.items()):
+        return None
+    return deplete_reserved(
+        transfer.source_branch,
+        [(line.detail_id, line.product_id, line.lot_id, line.quantity) for line in picking_lines],
+        move_out, transfer.pk, transfer.code, user
+    )
+
+
+def dispatch_transfer(transfer, details, move_out, user, picking_lines=()):
+    """
+    Despacha el traslado: descuenta en el origen (TRANS-OUT) los lotes de la lista de picking o, si no
+    hay o ya no sirve, por FIFO, y acredita los lotes tomados en el libro de tránsito. El destino no
+    recibe nada hasta liquidar la recepción. Devuelve True si se usó la lista de picking.
+    """
+    allocations = reserved_allocations(transfer, details, picking_lines, move_out, user) if picking_lines else None
+    from_picking = allocations is not None
+    if not from_picking:
+        allocations = deplete_fifo(
+            transfer.source_branch,
+            [(detail.pk, detail.product, detail.sent_quantity) for detail in details],
+            move_out, transfer.pk, transfer.code, user
+        )
+
+    ledger = {}
+    for detail in details:
+        for lot, to_take in allocations.get(detail.pk, []):
+            key = (lot.product_id, lot.batch)
+            if key in ledger:
+                ledger[key].quantity += to_take
+            else:
+                ledger[key] = TransitLedger(
+                    transfer=transfer, vehicle_id=transfer.vehicle_id, product_id=lot.product_id, batch=lot.batch,
+                    cost=lot.cost, quantity=to_take, created_by=user, modified_by=user
+                )
+        # Se asume que llega lo enviado; al recibir solo se corrigen las diferencias
+        detail.received_quantity = detail.sent_quantity
+    TransitLedger.objects.bulk_create(ledger.values())
+    TransferDetail.objects.bulk_update(details, ['received_quantity'])
+    PickingLine.objects.filter(transfer=transfer).delete()
+    return from_picking
+
+
+def receive_transfer(transfer, details, move_in, adjustment_types, user):
+    """
+    Liquida el tránsito del traslado en el destino: un TRANS-IN por lo enviado de cada lote y un ajuste
+    (ADJ-POS / ADJ-NEG, según `adjustment_types`) por la diferencia con lo recibido.
+    Devuelve False si el traslado no tiene tránsito registrado (despachado antes de existir el libro).
+    """
+    ledger = list(
+        TransitLedger.objects.select_for_update().filter(transfer=transfer, in_transit=True).order_by('product_id', 'id')
+    )
+    if not ledger:
+        return False
+
+    received = defaultdict(Decimal)
+    details_by_product = {}
+    for detail in details:
+        received[detail.product_id] += detail.received_quantity
+        details_by_product[detail.product_id] = detail
+
+    # Lo recibido se reparte entre los lotes en tránsito de cada producto; el sobrante va al último
+    rows_by_product = defaultdict(list)
+    for row in ledger:
+        rows_by_product[row.product_id].append(row)
+    # Sin lote en tránsito no hay costo ni lote de origen con que darle entrada a lo recibido
+    unsent = [details_by_product[product_id] for product_id, qty in received.items() if qty > 0 and product_id not in rows_by_product]
+    if unsent:
+        raise ValidationError(
+            "Se indicó cantidad recibida de productos que no se despacharon: "
+            f"{', '.join(str(detail.product) for detail in unsent)}. Regístrelos con un ajuste o en otro traslado."
+        )
+
+    for product_id, rows in rows_by_product.items():
+        remaining = received[product_id]
+        for row in rows:
+            row.received_quantity = min(row.quantity, remaining)
+            remaining -= row.received_quantity
+        rows[-1].received_quantity += remaining
+
+    dest = transfer.dest_branch
+    stock = lock_stock([(dest.pk, product_id) for product_id in rows_by_product])
+    # Un lote que no llegó no abre lote en el destino; su entrada y su ajuste quedan en el Kardex sin lote
+    lots = upsert_lots(
+        dest, [(row.product_id, row.batch, row.cost, row.received_quantity) for row in ledger if row.received_quantity > 0],
+        stock, user
+    )
+
+    now = timezone.now()
+    movements = []
+    for row in ledger:
+        lot = lots.get((row.product_id, row.batch))
+        movements.append(Kardex(
+            transaction_id=transfer.pk, document_number=transfer.code, movement_type=move_in, inventory_entry=lot,
+            branch=dest, product_id=row.product_id, batch=row.batch, quantity=row.quantity, cost=row.cost, created_by=user
+        ))
+        difference = row.received_quantity - row.quantity
+        if difference:
+            movements.append(Kardex(
+                transaction_id=transfer.pk, document_number=transfer.code,
+                movement_type=adjustment_types['ADJ-POS' if difference > 0 else 'ADJ-NEG'], inventory_entry=lot,
+                branch=dest, product_id=row.product_id, batch=row.batch, quantity=difference, cost=row.cost, created_by=user
+            ))
+        row.in_transit = False
+        row.settled_at = now
+        row.modified_by = user
+        row.updated_at = now
+
+    record_movements(stock, movements)
+    save_stock(stock.values())
+    TransitLedger.objects.bulk_update(ledger, ['received_quantity', 'in_transit', 'settled_at', 'modified_by', 'updated_at'])
+    return True
@@ -1,3 +1,312 @@
-from django.test import TestCase
+import uuid
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from branch.models import Branch
+from category.models import Category
+from inventory.models import Inventory, InventoryStock
+from inventory.services import add_to_stock, deplete_fifo, lock_stock, save_stock
+from inventory_movement_type.models import InventoryMovementType
+from kardex.models import Kardex
+from product.models import Product
+from subcategory.models import Subcategory
+from unit_of_measure.models import UnitOfMeasure
+from vehicle.models import Vehicle
+from .models import PickingLine, Transfer, TransferDetail, TransitLedger, VehicleAssignment
+from .planning import pack_loads, plan_transfer_loads
+from .services import build_picking_list, dispatch_transfer, receive_transfer
+
+
+class PackLoadsTests(SimpleTestCase):
+
+    def test_one_transfer_per_vehicle(self):
+        loads, unassigned = pack_loads(
+            [('T1', Decimal('40')), ('T2', Decimal('30')), ('T3', Decimal('20'))],
+            [('V1', Decimal('100')), ('V2', Decimal('100')), ('V3', Decimal('100'))]
+        )
+        self.assertEqual(sorted(load.item for load in loads), ['T1', 'T2', 'T3'])
+        self.assertEqual(len({load.vehicle for load in loads}), 3)
+        self.assertEqual(unassigned, [])
+
+    def test_each_load_takes_the_smallest_vehicle_that_fits(self):
+        loads, unassigned = pack_loads(
+            [('light', Decimal('90')), ('heavy', Decimal('400'))],
+            [('big', Decimal('500')), ('small', Decimal('100')), ('medium', Decimal('450'))]
+        )
+        self.assertEqual({load.item: load.vehicle for load in loads}, {'heavy': 'medium', 'light': 'small'})
+        self.assertEqual(unassigned, [])
+
+    def test_loads_that_do_not_fit_are_unassigned(self):
+        loads, unassigned = pack_loads(
+            [('T1', Decimal('80')), ('T2', Decimal('70')), ('T3', Decimal('600'))],
+            [('V1', Decimal('100'))]
+        )
+        self.assertEqual([(load.item, load.vehicle) for load in loads], [('T1', 'V1')])
+        self.assertEqual(sorted(key for key, _ in unassigned), ['T2', 'T3'])
+
+
+class PlanTransferLoadsTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Pruebas')
+        subcategory = Subcategory.objects.create(name='Carga', category=category)
+        unit = UnitOfMeasure.objects.create(name='Unidad', type='Conteo')
+        self.heavy, self.unweighted = [
+            Product.objects.create(
+                sku=sku, name=sku, size='U', presentation='Unidad', unit_weight_kg=weight,
+                category=category, subcategory=subcategory, purchase_unit=unit, sale_unit=unit
+            )
+            for sku, weight in (('PLAN-1', Decimal('10.00')), ('PLAN-2', Decimal('0')))
+        ]
+        source = Branch.objects.create(name='Central', address='-', municipality='San Salvador')
+        dest = Branch.objects.create(name='Norte', address='-', municipality='San Salvador')
+        self.small, self.medium, self.big = [
+            Vehicle.objects.create(brand='Isuzu', model='NPR', year=2020, plate=plate, max_capacity_kg=capacity)
+            for plate, capacity in (('C-1', Decimal('100')), ('C-2', Decimal('600')), ('C-3', Decimal('1000')))
+        ]
+        self.outgrown = Transfer.objects.create(date=timezone.now(), source_branch=source, dest_branch=dest, vehicle=self.small)
+        self.fitting = Transfer.objects.create(date=timezone.now(), source_branch=source, dest_branch=dest, vehicle=self.big)
+        TransferDetail.objects.create(transfer=self.outgrown, product=self.heavy, required_quantity=50)
+        TransferDetail.objects.create(transfer=self.fitting, product=self.heavy, required_quantity=5)
+        TransferDetail.objects.create(transfer=self.fitting, product=self.unweighted, required_quantity=5)
+
+    def test_keeps_a_vehicle_that_fits_and_moves_the_rest(self):
+        loads, unassigned, unweighted = plan_transfer_loads()
+
+        self.assertEqual({load.item: (load.vehicle, load.weight) for load in loads}, {
+            self.fitting: (self.big, Decimal('50.00')),
+            self.outgrown: (self.medium, Decimal('500.00')),
+        })
+        self.assertEqual(unassigned, [])
+        self.assertEqual(unweighted, {self.fitting: ['PLAN-2']})
+
+
+class TransferTestCase(TestCase):
+    """Dos lotes de camisas (10 a $2 y luego 10 a $3) y uno de pantalones en el origen."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('bodega', password='x')
+        self.types = {
+            code: InventoryMovementType.objects.create(name=code, code=code, flow=flow)
+            for code, flow in (('TRANS-OUT', 'out'), ('TRANS-IN', 'in'), ('ADJ-POS', 'in'), ('ADJ-NEG', 'out'))
+        }
+        category = Category.objects.create(name='Pruebas')
+        subcategory = Subcategory.objects.create(name='Traslados', category=category)
+        unit = UnitOfMeasure.objects.create(name='Unidad', type='Conteo')
+        self.shirt, self.pants = [
+            Product.objects.create(
+                sku=sku, name=sku, size='U', presentation='Unidad',
+                category=category, subcategory=subcategory, purchase_unit=unit, sale_unit=unit
+            )
+            for sku in ('TRF-1', 'TRF-2')
+        ]
+        self.source = Branch.objects.create(name='Central', address='-', municipality='San Salvador')
+        self.dest = Branch.objects.create(name='Norte', address='-', municipality='San Salvador')
+
+        stock = lock_stock([(self.source.pk, self.shirt.pk), (self.source.pk, self.pants.pk)])
+        for product, quantity, cost in ((self.shirt, '10', '2.00'), (self.shirt, '10', '3.00'), (self.pants, '10', '5.00')):
+            lot = Inventory.objects.create(
+                branch=self.source, product=product, batch=uuid.uuid4(),
+                original_quantity=Decimal(quantity), quantity=Decimal(quantity), cost=Decimal(cost)
+            )
+            add_to_stock(stock[(self.source.pk, product.pk)], lot, Decimal(quantity), reopened=True)
+        save_stock(stock.values())
+        self.shirt_lots = list(Inventory.objects.filter(product=self.shirt).order_by('created_at', 'id'))
+
+    def create_transfer(self, plate, shirts, pants):
+        vehicle = Vehicle.objects.create(brand='Isuzu', model='NPR', year=2020, plate=plate)
+        transfer = Transfer.objects.create(date=timezone.now(), source_branch=self.source, dest_branch=self.dest, vehicle=vehicle)
+        details = [
+            TransferDetail.objects.create(transfer=transfer, product=self.shirt, required_quantity=shirts, sent_quantity=shirts),
+            TransferDetail.objects.create(transfer=transfer, product=self.pants, required_quantity=pants, sent_quantity=pants),
+        ]
+        return transfer, details
+
+
+class ReceiveTransferTests(TransferTestCase):
+    """Liquidación del tránsito con diferencias entre lo enviado y lo recibido."""
+
+    def setUp(self):
+        super().setUp()
+        self.transfer, self.details = self.create_transfer('C-123', 12, 5)
+        dispatch_transfer(self.transfer, self.details, self.types['TRANS-OUT'], self.user)
+
+    def receive(self, shirts, pants):
+        for detail, received in zip(self.details, (shirts, pants)):
+            detail.received_quantity = received
+        return receive_transfer(
+            self.transfer, self.details, self.types['TRANS-IN'],
+            {'ADJ-POS': self.types['ADJ-POS'], 'ADJ-NEG': self.types['ADJ-NEG']}, self.user
+        )
+
+    def dest_movements(self, code):
+        return list(
+            Kardex.objects.filter(branch=self.dest, movement_type__code=code)
+                .order_by('product_id', 'cost').values_list('product_id', 'quantity', 'cost')
+        )
+
+    def test_dispatch_only_fills_the_transit_ledger(self):
+        self.assertEqual(
+            sorted(TransitLedger.objects.values_list('product_id', 'quantity', 'cost')),
+            sorted([(self.shirt.pk, Decimal('10.00'), Decimal('2.00')), (self.shirt.pk, Decimal('2.00'), Decimal('3.00')),
+                    (self.pants.pk, Decimal('5.00'), Decimal('5.00'))])
+        )
+        self.assertFalse(Inventory.objects.filter(branch=self.dest).exists())
+
+    def test_shortage_and_surplus_are_adjusted_per_lot(self):
+        self.assertTrue(self.receive(10, 6))
+
+        # Lo enviado entra completo como TRANS-IN; las diferencias quedan como ajustes sobre el lote que corresponde
+        self.assertEqual(self.dest_movements('TRANS-IN'), [
+            (self.shirt.pk, Decimal('10.00'), Decimal('2.00')), (self.shirt.pk, Decimal('2.00'), Decimal('3.00')),
+            (self.pants.pk, Decimal('5.00'), Decimal('5.00')),
+        ])
+        self.assertEqual(self.dest_movements('ADJ-NEG'), [(self.shirt.pk, Decimal('-2.00'), Decimal('3.00'))])
+        self.assertEqual(self.dest_movements('ADJ-POS'), [(self.pants.pk, Decimal('1.00'), Decimal('5.00'))])
+
+        lots = Inventory.objects.filter(branch=self.dest)
+        self.assertEqual(lots.filter(product=self.shirt).aggregate(total=Sum('quantity'))['total'], Decimal('10.00'))
+        self.assertEqual(lots.get(product=self.pants).quantity, Decimal('6.00'))
+        self.assertEqual(
+            dict(InventoryStock.objects.filter(branch=self.dest).values_list('product_id', 'on_hand')),
+            {self.shirt.pk: Decimal('10.00'), self.pants.pk: Decimal('6.00')}
+        )
+        self.assertFalse(TransitLedger.objects.filter(in_transit=True).exists())
+        self.assertEqual(
+            sorted(TransitLedger.objects.values_list('product_id', 'received_quantity')),
+            sorted([(self.shirt.pk, Decimal('10.00')), (self.shirt.pk, Decimal('0.00')), (self.pants.pk, Decimal('6.00'))])
+        )
+
+    def test_exact_receipt_has_no_adjustments(self):
+        self.assertTrue(self.receive(12, 5))
+        self.assertFalse(Kardex.objects.filter(branch=self.dest, movement_type__code__in=['ADJ-POS', 'ADJ-NEG']).exists())
+
+    def test_settled_transfer_is_not_received_twice(self):
+        self.receive(12, 5)
+        self.assertFalse(self.receive(12, 5))
+        self.assertEqual(Kardex.objects.filter(branch=self.dest, movement_type__code='TRANS-IN').count(), 3)
+
+    def test_lot_lost_in_transit_opens_no_lot(self):
+        self.assertTrue(self.receive(10, 5))
+
+        # El lote de $3 no llegó: su entrada y su ajuste quedan en el Kardex, pero no hay lote vacío en el destino
+        self.assertEqual(list(Inventory.objects.filter(branch=self.dest, product=self.shirt).values_list('cost', flat=True)), [Decimal('2.00')])
+        lost = Kardex.objects.filter(branch=self.dest, product=self.shirt, cost=Decimal('3.00'))
+        self.assertEqual(sorted(lost.values_list('quantity', 'inventory_entry')), [(Decimal('-2.00'), None), (Decimal('2.00'), None)])
+        self.assertEqual(InventoryStock.objects.get(branch=self.dest, product=self.shirt).lot_count, 1)
+
+    def test_received_product_that_was_not_sent_is_rejected(self):
+        socks = Product.objects.create(
+            sku='TRF-3', name='Calcetines', size='U', presentation='Unidad', category=self.shirt.category,
+            subcategory=self.shirt.subcategory, purchase_unit=self.shirt.purchase_unit, sale_unit=self.shirt.sale_unit
+        )
+        extra = TransferDetail.objects.create(
+            transfer=self.transfer, product=socks, required_quantity=3, sent_quantity=0, received_quantity=3
+        )
+
+        with self.assertRaisesMessage(ValidationError, 'Calcetines'):
+            receive_transfer(
+                self.transfer, self.details + [extra], self.types['TRANS-IN'],
+                {'ADJ-POS': self.types['ADJ-POS'], 'ADJ-NEG': self.types['ADJ-NEG']}, self.user
+            )
+        self.assertEqual(TransitLedger.objects.filter(in_transit=True).count(), 3)
+        self.assertFalse(Kardex.objects.filter(branch=self.dest).exists())
+
+
+class PickingListTests(TransferTestCase):
+
+    def picked(self, transfer):
+        return list(PickingLine.objects.filter(transfer=transfer, product=self.shirt).order_by('id').values_list('lot_id', 'quantity'))
+
+    def test_lists_reserve_the_oldest_lots_not_taken_by_other_lists(self):
+        first, first_details = self.create_transfer('C-1', 4, 0)
+        second, second_details = self.create_transfer('C-2', 8, 0)
+        build_picking_list(first, first_details, self.user)
+        build_picking_list(second, second_details, self.user)
+
+        older, newer = self.shirt_lots
+        self.assertEqual(self.picked(first), [(older.pk, Decimal('4.00'))])
+        self.assertEqual(self.picked(second), [(older.pk, Decimal('6.00')), (newer.pk, Decimal('2.00'))])
+        # Apartar no descuenta el saldo de los lotes
+        older.refresh_from_db()
+        self.assertEqual(older.quantity, Decimal('10.00'))
+
+    def test_rebuilding_a_list_replaces_its_reservation(self):
+        transfer, details = self.create_transfer('C-1', 4, 0)
+        build_picking_list(transfer, details, self.user)
+        details[0].sent_quantity = 12
+        build_picking_list(transfer, details, self.user)
+
+        older, newer = self.shirt_lots
+        self.assertEqual(self.picked(transfer), [(older.pk, Decimal('10.00')), (newer.pk, Decimal('2.00'))])
+
+    def test_dispatch_takes_the_reserved_lots(self):
+        first, first_details = self.create_transfer('C-1', 4, 0)
+        second, second_details = self.create_transfer('C-2', 8, 0)
+        build_picking_list(first, first_details, self.user)
+        build_picking_list(second, second_details, self.user)
+
+        lines = list(second.picking_lines.all())
+        self.assertTrue(dispatch_transfer(second, second_details, self.types['TRANS-OUT'], self.user, lines))
+
+        older, newer = self.shirt_lots
+        self.assertEqual(
+            sorted(TransitLedger.objects.filter(transfer=second).values_list('batch', 'quantity')),
+            sorted([(older.batch, Decimal('6.00')), (newer.batch, Decimal('2.00'))])
+        )
+        self.assertFalse(PickingLine.objects.filter(transfer=second).exists())
+
+    def test_dispatch_falls_back_to_fifo_when_a_reserved_lot_was_sold(self):
+        transfer, details = self.create_transfer('C-1', 4, 0)
+        build_picking_list(transfer, details, self.user)
+        sale = InventoryMovementType.objects.create(name='SALE', code='SALE', flow='out')
+        deplete_fifo(self.source, [('sale', self.shirt, Decimal('9'))], sale, 1, 'VTA-1', self.user)
+
+        lines = list(transfer.picking_lines.all())
+        self.assertFalse(dispatch_transfer(transfer, details, self.types['TRANS-OUT'], self.user, lines))
+
+        older, newer = self.shirt_lots
+        self.assertEqual(
+            sorted(TransitLedger.objects.filter(transfer=transfer).values_list('batch', 'quantity')),
+            sorted([(older.batch, Decimal('1.00')), (newer.batch, Decimal('3.00'))])
+        )
+
+
+class VehicleAssignmentTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('despacho', password='x'))
+        self.source = Branch.objects.create(name='Central', address='-', municipality='San Salvador')
+        self.dest = Branch.objects.create(name='Norte', address='-', municipality='San Salvador')
+        self.vehicle = Vehicle.objects.create(brand='Isuzu', model='NPR', year=2020, plate='C-123')
+        self.busy = Transfer.objects.create(date=timezone.now(), source_branch=self.source, dest_branch=self.dest, vehicle=self.vehicle)
+
+    def add_transfer(self, vehicle):
+        now = timezone.localtime()
+        return self.client.post(reverse('admin:transfers_transfer_add'), {
+            'status': 'picking', 'date_0': now.strftime('%Y-%m-%d'), 'date_1': now.strftime('%H:%M:%S'),
+            'source_branch': self.source.pk, 'dest_branch': self.dest.pk, 'vehicle': vehicle.pk, 'active': 'on',
+            'details-TOTAL_FORMS': '0', 'details-INITIAL_FORMS': '0',
+        })
+
+    def test_busy_vehicle_is_a_form_error(self):
+        response = self.add_transfer(self.vehicle)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.busy.code, str(response.context['adminform'].form.errors['vehicle']))
+        self.assertEqual(Transfer.objects.count(), 1)
+
+    def test_vehicle_is_released_when_the_transfer_is_received(self):
+        self.busy.status = 'received'
+        self.busy.save()
+        self.assertFalse(VehicleAssignment.objects.exists())
+
+        response = self.add_transfer(self.vehicle)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(VehicleAssignment.objects.get().transfer, Transfer.objects.exclude(pk=self.busy.pk).get())